@@ -0,0 +1,78 @@
+"""
+日志开销测试：比较多线程下同步写文件与队列异步写文件时，每条日志调用的耗时
+
+用法: python -m benchmarks.logging_overhead [--threads 8] [--records 20000]
+"""
+import os
+import sys
+import time
+import queue
+import logging
+import logging.handlers
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.common import JsonLineFormatter, NonBlockingQueueHandler
+
+
+def run_workers(test_logger, threads, records):
+    """多个线程同时写日志，返回每次调用的平均耗时（微秒）"""
+    durations = []
+
+    def worker(worker_id):
+        start = time.perf_counter()
+        for i in range(records):
+            test_logger.info("processed item", extra={'item_id': f"{worker_id}-{i}", 'stage': 'bench', 'duration': 0.001})
+        durations.append(time.perf_counter() - start)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return sum(durations) / (threads * records) * 1e6
+
+
+def make_logger(name, handler):
+    test_logger = logging.getLogger(name)
+    test_logger.propagate = False
+    test_logger.handlers = [handler]
+    test_logger.setLevel(logging.INFO)
+    return test_logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日志开销测试")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--records', type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # 同步写文件
+        file_handler = logging.FileHandler(os.path.join(temp_dir, 'sync.log'), encoding='utf-8')
+        file_handler.setFormatter(JsonLineFormatter())
+        sync_us = run_workers(make_logger('bench.sync', file_handler), args.threads, args.records)
+        file_handler.close()
+
+        # 队列 + 后台线程写文件
+        log_queue = queue.SimpleQueue()
+        file_handler = logging.FileHandler(os.path.join(temp_dir, 'queued.log'), encoding='utf-8')
+        file_handler.setFormatter(JsonLineFormatter())
+        listener = logging.handlers.QueueListener(log_queue, file_handler)
+        listener.start()
+        queued_us = run_workers(make_logger('bench.queued', NonBlockingQueueHandler(log_queue)),
+                                args.threads, args.records)
+        drain_start = time.perf_counter()
+        listener.stop()
+        drain_seconds = time.perf_counter() - drain_start
+        file_handler.close()
+
+    print(f"threads={args.threads} records/thread={args.records}")
+    print(f"sync FileHandler:   {sync_us:8.2f} us/call")
+    print(f"NonBlockingQueue:   {queued_us:8.2f} us/call (background drain {drain_seconds:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
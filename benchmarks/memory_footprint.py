@@ -0,0 +1,298 @@
+"""
+内存占用回归测试：测量导出和获取视频信息各路径的内存峰值，并与保存的基线比较
+
+每个测试在单独的子进程中运行两次：一次用tracemalloc测量Python对象分配峰值，
+一次不开tracemalloc测量进程RSS增长（tracemalloc本身会占用内存）。
+任一指标超过基线（允许一定比例和固定量的浮动）时以非零状态退出。
+
+用法:
+    python benchmarks/memory_footprint.py                      # 与基线比较
+    python benchmarks/memory_footprint.py --update-baseline    # 记录新基线
+    python benchmarks/memory_footprint.py --sizes 1000 10000 --page-mb 1 8
+    python benchmarks/memory_footprint.py --kinds export_streaming --update-baseline
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import urllib.parse
+import tracemalloc
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+try:
+    import resource
+except ImportError:
+    # Windows上没有resource模块，只测量tracemalloc峰值
+    resource = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'memory_baseline.json')
+METRICS = ('py_peak_mb', 'rss_growth_mb')
+CASE_KINDS = ('export_batch', 'export_single_item', 'export_streaming', 'fetch_page')
+
+# 新增的一批记录数（export_batch、export_streaming）
+BATCH_ROWS = 100
+
+
+def make_record(index):
+    """生成一条与实际数据大小相近的记录，字幕约一千字"""
+    rng = random.Random(index)
+    words = ['今天', '我们', '来看', '这个', '视频', '教程', '非常', '简单', '大家', '学会', '了吗', '记得', '点赞', '关注']
+    return {
+        'title': ''.join(rng.choice(words) for _ in range(12)),
+        'description': ''.join(rng.choice(words) for _ in range(30)),
+        'tags': ', '.join(rng.choice(words) for _ in range(4)),
+        'transcript': ''.join(rng.choice(words) for _ in range(500)),
+        'likes': rng.randint(0, 10 ** 7),
+        'comments': rng.randint(0, 10 ** 5),
+        'favorites': rng.randint(0, 10 ** 5),
+        'shares': rng.randint(0, 10 ** 5),
+        'author_name': f"作者{index % 997}",
+        'author_id': f"author_{index % 997}",
+        'source_url': f"https://www.douyin.com/video/{7000000000000000000 + index}",
+        'platform': 'douyin',
+        'video_id': str(7000000000000000000 + index),
+        'local_video_path': f"downloads/douyin/ab/cd/{7000000000000000000 + index}.mp4",
+        'local_audio_path': f"downloads/douyin/ab/cd/{7000000000000000000 + index}.mp3"
+    }
+
+
+def make_workbook(path, rows):
+    """生成已有rows行数据的Excel文件"""
+    import pandas as pd
+    from core.excel_exporter import ExcelExporter
+
+    columns = ExcelExporter(path).get_column_order()
+    pd.DataFrame([make_record(i) for i in range(rows)], columns=columns).to_excel(path, index=False)
+
+
+def make_page(path, size_mb):
+    """生成包含RENDER_DATA的抖音视频页面，数据块大小约为size_mb"""
+    video_id = '7000000000000000001'
+    comments = []
+    detail = {
+        'aweme_id': video_id,
+        'desc': '测试视频 #标签',
+        'statistics': {'digg_count': 1, 'comment_count': 2, 'collect_count': 3, 'share_count': 4},
+        'author': {'nickname': '作者', 'unique_id': 'author'},
+        'text_extra': [{'hashtag_name': '标签'}],
+        'video': {'play_addr': {'url_list': [f'https://cdn.example.com/{video_id}.mp4']}},
+        'comments': comments
+    }
+    # 页面数据中通常带有大量评论、推荐等与视频本身无关的内容
+    target = int(size_mb * 1024 * 1024)
+    comment = {'cid': '0', 'text': '评论内容' * 20, 'user': {'nickname': '用户', 'avatar': 'https://p3.example.com/' + 'a' * 60}}
+    comment_size = len(urllib.parse.quote(json.dumps(comment)))
+    for i in range(max(1, target // comment_size)):
+        comments.append(dict(comment, cid=str(i)))
+    render_data = urllib.parse.quote(json.dumps({'aweme_detail_1': {'detail': detail}}))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<html><head><title>测试</title></head><body>')
+        f.write(f'<script id="RENDER_DATA" type="application/json">{render_data}</script>')
+        f.write('<div>' + 'x' * 256 * 1024 + '</div></body></html>')
+
+
+def current_rss_mb():
+    """当前进程的常驻内存（MB），无法读取时返回None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def max_rss_mb():
+    """进程的常驻内存峰值（MB）"""
+    # Linux上ru_maxrss会从父进程继承，优先读取本进程的VmHWM
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS上单位为字节，Linux上为KB
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(case, use_tracemalloc):
+    """在子进程中运行一个测试，返回测量结果"""
+    from core.excel_exporter import ExcelExporter
+    from core.content_fetcher import ContentFetcher
+    from core.parse_pool import ParsePool
+
+    if case['kind'] in ('export_batch', 'export_single_item', 'export_streaming'):
+        work_path = os.path.join(os.getcwd(), 'work.xlsx')
+        shutil.copyfile(case['fixture'], work_path)
+        exporter = ExcelExporter(work_path, streaming=case['kind'] == 'export_streaming')
+        if case['kind'] in ('export_batch', 'export_streaming'):
+            items = [make_record(case['rows'] + i) for i in range(BATCH_ROWS)]
+            operation = partial(exporter.export_batch, items)
+        else:
+            operation = partial(exporter.export_single_item, make_record(case['rows']))
+    elif case['kind'] == 'fetch_page':
+        # 只在本进程中解析，测量的是抓取和解析本身，不包含解析子进程
+        fetcher = ContentFetcher(parse_pool=ParsePool(workers=0))
+        operation = partial(fetcher.fetch_douyin_video_info, '7000000000000000001', case['url'])
+    else:
+        raise ValueError(f"Unknown case kind: {case['kind']}")
+
+    rss_before = current_rss_mb() or max_rss_mb()
+    if use_tracemalloc:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = operation()
+    elapsed = time.perf_counter() - start
+    if not result:
+        raise RuntimeError(f"{case['name']} returned {result!r}")
+
+    measured = {'seconds': round(elapsed, 2)}
+    if use_tracemalloc:
+        measured['py_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+        tracemalloc.stop()
+    else:
+        peak = max_rss_mb()
+        if peak is not None and rss_before is not None:
+            measured['rss_growth_mb'] = round(peak - rss_before, 2)
+    return measured
+
+
+def measure(case, work_dir):
+    """启动两个子进程分别测量tracemalloc峰值和RSS增长"""
+    results = {'seconds': 0}
+    for use_tracemalloc in (True, False):
+        command = [sys.executable, os.path.abspath(__file__), '--child', json.dumps(case)]
+        if use_tracemalloc:
+            command.append('--tracemalloc')
+        completed = subprocess.run(command, cwd=work_dir, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"{case['name']} failed:\n{completed.stderr[-2000:]}")
+        measured = json.loads(completed.stdout.strip().splitlines()[-1])
+        # 耗时以不开tracemalloc的一次为准
+        seconds = measured.pop('seconds')
+        if not use_tracemalloc:
+            results['seconds'] = seconds
+        results.update(measured)
+    return results
+
+
+def compare(name, current, baseline, tolerance, slack_mb):
+    """与基线比较，返回超出基线的指标说明列表"""
+    failures = []
+    for metric in METRICS:
+        if metric not in current or metric not in baseline:
+            continue
+        limit = baseline[metric] * (1 + tolerance) + slack_mb
+        if current[metric] > limit:
+            failures.append(f"{name} {metric}: {current[metric]:.1f}MB > {limit:.1f}MB "
+                            f"(baseline {baseline[metric]:.1f}MB)")
+    return failures
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(directory):
+    """启动本地页面服务器，返回(服务器, 地址前缀)"""
+    handler = partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="内存占用回归测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="已有Excel数据的行数")
+    parser.add_argument('--page-mb', type=float, nargs='+', default=[1, 8, 32],
+                        help="合成页面中RENDER_DATA数据块的大小（MB）")
+    parser.add_argument('--kinds', nargs='+', default=list(CASE_KINDS), choices=CASE_KINDS,
+                        help="只运行指定类型的测试")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="基线文件路径")
+    parser.add_argument('--update-baseline', action='store_true', help="用本次结果更新基线")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="允许超出基线的比例")
+    parser.add_argument('--slack-mb', type=float, default=2.0, help="允许超出基线的固定量（MB）")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--tracemalloc', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_case(json.loads(args.child), args.tracemalloc)))
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get('cases', {})
+
+    results = {}
+    failures = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        server, base_url = start_server(temp_dir)
+        cases = []
+        export_kinds = [kind for kind in CASE_KINDS if kind.startswith('export') and kind in args.kinds]
+        for rows in args.sizes if export_kinds else []:
+            fixture = os.path.join(temp_dir, f'existing_{rows}.xlsx')
+            print(f"Generating workbook with {rows} rows...", file=sys.stderr)
+            make_workbook(fixture, rows)
+            for kind in export_kinds:
+                cases.append({'name': f"{kind}_{rows}", 'kind': kind, 'rows': rows, 'fixture': fixture})
+        for size_mb in args.page_mb if 'fetch_page' in args.kinds else []:
+            page_name = f'page_{size_mb:g}mb.html'
+            make_page(os.path.join(temp_dir, page_name), size_mb)
+            cases.append({'name': f"fetch_page_{size_mb:g}mb", 'kind': 'fetch_page', 'url': f"{base_url}/{page_name}"})
+
+        print(f"{'case':<28}{'seconds':>10}{'py_peak_mb':>14}{'rss_growth_mb':>16}{'baseline py/rss':>20}")
+        for case in cases:
+            work_dir = os.path.join(temp_dir, case['name'])
+            os.makedirs(work_dir)
+            current = measure(case, work_dir)
+            results[case['name']] = current
+            known = baseline.get(case['name'])
+            reference = f"{known['py_peak_mb']:.1f}/{known.get('rss_growth_mb', 0):.1f}" if known else 'new'
+            print(f"{case['name']:<28}{current['seconds']:>10.2f}{current['py_peak_mb']:>14.1f}"
+                  f"{current.get('rss_growth_mb', float('nan')):>16.1f}{reference:>20}")
+            if known:
+                failures.extend(compare(case['name'], current, known, args.tolerance, args.slack_mb))
+        server.shutdown()
+
+    if args.update_baseline:
+        merged = dict(baseline)
+        merged.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'updated': time.strftime('%Y-%m-%d'),
+                'cases': merged
+            }, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if failures:
+        print("\nMemory regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nNo memory regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
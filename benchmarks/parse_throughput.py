@@ -0,0 +1,71 @@
+"""
+页面解析吞吐量测试：多个线程同时获取大页面，比较在抓取线程中解析与交给解析进程池时
+每秒处理的页面数
+
+页面服务器运行在单独的进程中。进程池只有在多核机器上才有收益，单核时两者相近或进程池稍慢。
+
+用法: python -m benchmarks.parse_throughput [--page-mb 8] [--pages 32] [--threads 8]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.memory_footprint import make_page
+from benchmarks.download_throughput import serve
+from core.content_fetcher import ContentFetcher
+from core.parse_pool import ParsePool
+
+
+def run(workers, url, pages, threads):
+    """用指定的解析进程数获取pages个页面，返回(每秒页面数, CPU耗时)"""
+    pool = ParsePool(workers=workers, min_size=0)
+    fetcher = ContentFetcher(pool_size=threads, parse_pool=pool)
+    # 预先启动进程池，不计入测量时间
+    if workers:
+        fetcher.fetch_douyin_video_info('7000000000000000001', url)
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lambda _: fetcher.fetch_douyin_video_info('7000000000000000001', url),
+                                    range(pages)))
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    pool.shutdown()
+    if not all(result and result.get('play_url') for result in results):
+        raise RuntimeError("Some pages were not parsed")
+    return pages / elapsed, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="页面解析吞吐量测试")
+    parser.add_argument('--page-mb', type=float, default=8, help="RENDER_DATA数据块大小（MB）")
+    parser.add_argument('--pages', type=int, default=32, help="获取的页面数")
+    parser.add_argument('--threads', type=int, default=8, help="抓取线程数")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="解析进程数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        make_page(os.path.join(temp_dir, 'page.html'), args.page_mb)
+        port_queue = multiprocessing.Queue()
+        server = multiprocessing.Process(target=serve, args=(temp_dir, port_queue), daemon=True)
+        server.start()
+        url = f"http://127.0.0.1:{port_queue.get(timeout=10)}/page.html"
+        try:
+            inline = run(0, url, args.pages, args.threads)
+            pooled = run(args.workers, url, args.pages, args.threads)
+        finally:
+            server.terminate()
+            server.join()
+
+    print(f"page={args.page_mb:g}MB pages={args.pages} threads={args.threads} cpus={os.cpu_count()}")
+    print(f"{'parse in fetch threads':<30}{inline[0]:8.2f} pages/s  (fetch process CPU {inline[1]:.2f}s)")
+    print(f"{f'parse pool ({args.workers} processes)':<30}{pooled[0]:8.2f} pages/s  (fetch process CPU {pooled[1]:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
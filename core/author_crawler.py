@@ -0,0 +1,203 @@
+from concurrent.futures import ThreadPoolExecutor
+from utils.common import logger
+
+# 抖音作者作品列表接口，可替换为本地测试服务地址
+AUTHOR_POSTS_URL = 'https://www.douyin.com/aweme/v1/web/aweme/post/'
+# 话题作品列表接口，按发布时间从新到旧排序
+HASHTAG_POSTS_URL = 'https://www.douyin.com/aweme/v1/web/challenge/aweme/'
+# 支持的作品列表来源
+SOURCE_TYPES = ('author', 'hashtag')
+VIDEO_URL_TEMPLATE = 'https://www.douyin.com/video/{video_id}'
+
+
+def is_not_newer(video_id, high_water):
+    """判断视频是否不比上次采集到的最新视频更新（抖音作品ID随发布时间递增）"""
+    if video_id.isdigit() and str(high_water).isdigit():
+        return int(video_id) <= int(high_water)
+    return video_id == str(high_water)
+
+
+class AuthorCrawler:
+    def __init__(self, content_fetcher, record_store=None, listing_url=AUTHOR_POSTS_URL,
+                 page_size=18, max_pages=None, hashtag_url=HASHTAG_POSTS_URL):
+        """
+        初始化作者作品采集器，也可采集话题下的作品
+
+        Args:
+            content_fetcher: ContentFetcher实例，复用其会话和cookies
+            record_store: RecordStore实例，用于保存每个作者或话题的采集进度
+            listing_url: 作者作品列表接口地址
+            page_size: 每页作品数
+            max_pages: 最多翻页数，不提供时翻到最后一页
+            hashtag_url: 话题作品列表接口地址
+        """
+        self.content_fetcher = content_fetcher
+        self.record_store = record_store
+        self.listing_url = listing_url
+        self.hashtag_url = hashtag_url
+        self.page_size = page_size
+        self.max_pages = max_pages
+
+    def fetch_page(self, source_id, cursor=0, source_type='author'):
+        """
+        获取作者或话题作品列表的一页
+
+        Args:
+            source_id: 作者ID（sec_user_id）或话题ID（ch_id）
+            cursor: 翻页游标
+            source_type: 'author' 或 'hashtag'
+
+        Returns:
+            {'items': 作品数据列表, 'has_more': 是否还有下一页, 'cursor': 下一页游标}
+        """
+        if source_type == 'author':
+            url = self.listing_url
+            params = {'sec_user_id': source_id, 'max_cursor': cursor, 'count': self.page_size}
+        elif source_type == 'hashtag':
+            url = self.hashtag_url
+            params = {'ch_id': source_id, 'cursor': cursor, 'count': self.page_size, 'sort_type': 1}
+        else:
+            raise ValueError(f"Unknown source type: {source_type}")
+        response = self.content_fetcher.session.get(url, params=params, timeout=10)
+        response.raise_for_status()
+        self.content_fetcher.bandwidth.consume_metadata(len(response.content))
+        data = response.json()
+        return {
+            'items': data.get('aweme_list') or [],
+            'has_more': bool(data.get('has_more')),
+            'cursor': data.get('max_cursor', data.get('cursor', 0))
+        }
+
+    def iter_videos(self, author_id, stop_at=None, state=None, source_type='author', max_pages=None):
+        """
+        逐个返回作者（或话题）的作品信息，从新到旧
+
+        处理当前页的作品时在后台线程中预取下一页；遇到不比stop_at更新的作品时停止。
+        当前页已包含不比stop_at更新的作品时不预取，没有新作品的来源每次只请求一页。
+
+        Args:
+            author_id: 作者ID（sec_user_id），source_type为'hashtag'时为话题ID
+            stop_at: 上次采集到的最新作品ID
+            state: 可选字典，结束时写入'complete'，表示是否已翻到末页或到达stop_at；
+                   因max_pages停止时写入'limited'
+            source_type: 'author' 或 'hashtag'
+            max_pages: 本次最多翻页数，不提供时使用self.max_pages
+        """
+        max_pages = max_pages or self.max_pages
+        if state is not None:
+            state['complete'] = False
+            state['limited'] = False
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(self.fetch_page, author_id, 0, source_type)
+            pages = 0
+            while future is not None:
+                page = future.result()
+                pages += 1
+
+                # 先发出下一页请求，再处理当前页
+                future = None
+                reaches_known = stop_at and any(
+                    not aweme.get('is_top') and is_not_newer(str(aweme.get('aweme_id') or ''), stop_at)
+                    for aweme in page['items'] if aweme.get('aweme_id'))
+                if page['has_more'] and not reaches_known:
+                    if not max_pages or pages < max_pages:
+                        future = executor.submit(self.fetch_page, author_id, page['cursor'], source_type)
+                    elif state is not None:
+                        state['limited'] = True
+
+                for aweme in page['items']:
+                    video_id = str(aweme.get('aweme_id') or '')
+                    if not video_id:
+                        continue
+                    # 置顶作品可能比新作品旧，不作为停止依据
+                    if stop_at and not aweme.get('is_top') and is_not_newer(video_id, stop_at):
+                        logger.info(f"Reached known video {video_id} of {source_type} {author_id}")
+                        if state is not None:
+                            state['complete'] = True
+                        if future is not None:
+                            future.cancel()
+                        return
+
+                    url = VIDEO_URL_TEMPLATE.format(video_id=video_id)
+                    video_info = self.content_fetcher.build_douyin_video_info(aweme, url)
+                    video_info['platform'] = 'douyin'
+                    video_info['video_id'] = video_id
+                    video_info['is_top'] = bool(aweme.get('is_top'))
+                    yield video_info
+
+                if not page['has_more'] and state is not None:
+                    state['complete'] = True
+
+    def crawl(self, author_id, process_video, incremental=True, source_type='author', max_pages=None):
+        """
+        采集作者（或话题）的作品
+
+        Args:
+            author_id: 作者ID（sec_user_id），source_type为'hashtag'时为话题ID
+            process_video: 处理单个作品的函数，参数为视频信息字典，返回处理结果
+            incremental: 是否只采集上次之后发布的新作品
+            source_type: 'author' 或 'hashtag'
+            max_pages: 最多翻页数；达到页数限制时同样推进采集进度，更早的作品不再采集
+
+        增量采集时跳过已保存在record_store中的作品：上次有作品失败时采集进度停在失败作品之前，
+        重新遍历会再次列出其后已成功的作品，不再重复处理和导出。
+
+        Returns:
+            统计字典：found 新发现的作品数，success 处理成功数，skipped 已保存而跳过的作品数，
+            complete 是否完整遍历，error 是否因请求失败中断
+        """
+        stop_at = None
+        if incremental and self.record_store:
+            stop_at = self.record_store.get_high_water(source_type, author_id)
+
+        found = 0
+        success = 0
+        skipped = 0
+        succeeded = []
+        oldest_failed = None
+        state = {}
+        error = False
+        try:
+            for video_info in self.iter_videos(author_id, stop_at, state, source_type, max_pages):
+                if incremental and self.record_store and self.record_store.exists(
+                        video_info['platform'], video_info['video_id']):
+                    skipped += 1
+                    if not video_info['is_top']:
+                        # 已保存的作品与处理成功的作品一样推进采集进度
+                        succeeded.append(video_info['video_id'])
+                    continue
+                found += 1
+                processed = process_video(video_info)
+                if processed:
+                    success += 1
+                if video_info['is_top']:
+                    # 置顶作品每次都会重新列出，不影响采集进度
+                    continue
+                if processed:
+                    succeeded.append(video_info['video_id'])
+                elif oldest_failed is None or is_not_newer(video_info['video_id'], oldest_failed):
+                    oldest_failed = video_info['video_id']
+        except Exception as e:
+            logger.error(f"Error crawling {source_type} {author_id}: {e}")
+            error = True
+
+        # 采集进度只推进到比所有失败作品都旧的成功作品，失败的作品下次重新采集
+        newest = None
+        for video_id in succeeded:
+            if oldest_failed is not None and (video_id == oldest_failed or not is_not_newer(video_id, oldest_failed)):
+                continue
+            if newest is None or not is_not_newer(video_id, newest):
+                newest = video_id
+        if oldest_failed is not None:
+            logger.warning(f"{found - success} videos of {source_type} {author_id} failed, "
+                           f"they will be retried on the next crawl")
+
+        # 只有完整遍历（或按max_pages有意截断）后才推进采集进度，中途失败时下次重新检查
+        finished = state.get('complete') or (max_pages and state.get('limited'))
+        if finished and not error and newest and self.record_store:
+            self.record_store.set_high_water(source_type, author_id, newest)
+
+        summary = {'found': found, 'success': success, 'skipped': skipped,
+                   'complete': bool(state.get('complete')), 'error': error}
+        logger.info(f"{source_type.capitalize()} {author_id} crawl finished: {summary}")
+        return summary
@@ -0,0 +1,145 @@
+import time
+import heapq
+import itertools
+import threading
+from utils.common import logger
+
+
+class BandwidthLimiter:
+    def __init__(self, rate=None, metadata_share=0.1, burst_seconds=0.25):
+        """
+        全局带宽限制（令牌桶），所有下载和元数据请求共用
+
+        视频下载按公平排队取得令牌：每个下载（默认以线程区分）按已取得的字节数排序，
+        数据块大小不同的下载也能平分带宽；
+        元数据请求（视频页面、作品列表）有单独保留的一份带宽，不必排在视频下载后面，
+        它消耗的流量同时从总令牌中扣除，总速率保持在上限附近。
+
+        Args:
+            rate: 总速率上限（字节/秒），None或0表示不限速
+            metadata_share: 为元数据请求保留的比例
+            burst_seconds: 令牌桶容量，按多少秒的流量计算
+        """
+        self.condition = threading.Condition()
+        self.metadata_share = metadata_share
+        self.burst_seconds = burst_seconds
+        self.rate = 0
+        self.tokens = 0.0
+        self.metadata_tokens = 0.0
+        self.updated_at = time.monotonic()
+        # 视频下载的公平排队：按各下载的虚拟开始时间（累计字节数）取得令牌
+        self.waiting = []
+        self.counter = itertools.count()
+        self.virtual_time = 0
+        self.stream_tags = {}
+        self.bytes_total = 0
+        self.bytes_metadata = 0
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """修改速率上限，正在进行的下载立即按新速率执行"""
+        with self.condition:
+            self._refill(time.monotonic())
+            self.rate = max(0, rate or 0)
+            self.tokens = min(self.tokens, self._capacity())
+            self.metadata_tokens = min(self.metadata_tokens, self._capacity() * self.metadata_share)
+            self.condition.notify_all()
+        logger.info(f"Bandwidth limit set to {self.rate / 1024 / 1024:.2f} MB/s" if self.rate else
+                    "Bandwidth limit disabled")
+
+    def get_rate(self):
+        return self.rate
+
+    def _capacity(self):
+        # 令牌桶容量至少能放下一个较大的数据块
+        return max(self.rate * self.burst_seconds, 64 * 1024)
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        if self.rate:
+            capacity = self._capacity()
+            self.tokens = min(capacity, self.tokens + elapsed * self.rate)
+            self.metadata_tokens = min(capacity * self.metadata_share,
+                                       self.metadata_tokens + elapsed * self.rate * self.metadata_share)
+
+    def consume(self, size, stream=None):
+        """
+        视频下载读取size字节后调用，超过速率时阻塞
+
+        Args:
+            size: 字节数
+            stream: 下载标识，默认为当前线程
+        """
+        if not self.rate:
+            self.bytes_total += size
+            return
+        with self.condition:
+            key = stream if stream is not None else threading.get_ident()
+            start = max(self.virtual_time, self.stream_tags.get(key, 0))
+            self.stream_tags[key] = start + size
+            entry = (start, next(self.counter))
+            heapq.heappush(self.waiting, entry)
+            while self.rate:
+                if self.waiting[0] is entry:
+                    self._refill(time.monotonic())
+                    if self.tokens > 0:
+                        # 允许欠账，数据块大于令牌桶容量时也能通过，之后的请求等待补足
+                        self.tokens -= size
+                        break
+                    self.condition.wait(-self.tokens / self.rate + 0.001)
+                else:
+                    self.condition.wait()
+            self.waiting.remove(entry)
+            heapq.heapify(self.waiting)
+            self.virtual_time = max(self.virtual_time, start)
+            if len(self.stream_tags) > 256:
+                # 清理已经结束的下载
+                self.stream_tags = {k: v for k, v in self.stream_tags.items() if v > self.virtual_time}
+            self.bytes_total += size
+            self.condition.notify_all()
+
+    def consume_metadata(self, size):
+        """元数据请求读取size字节时调用，只受保留的那部分带宽限制"""
+        if self.metadata_share <= 0:
+            self.consume(size)
+            self.bytes_metadata += size
+            return
+        if not self.rate:
+            self.bytes_total += size
+            self.bytes_metadata += size
+            return
+        with self.condition:
+            while self.rate:
+                self._refill(time.monotonic())
+                if self.metadata_tokens > 0:
+                    self.metadata_tokens -= size
+                    # 元数据流量同样计入总速率，视频下载相应放慢
+                    self.tokens -= size
+                    break
+                self.condition.wait(-self.metadata_tokens / (self.rate * self.metadata_share) + 0.001)
+            self.bytes_total += size
+            self.bytes_metadata += size
+
+    def get_stats(self):
+        """累计流量统计"""
+        with self.condition:
+            return {
+                'rate': self.rate,
+                'bytes_total': self.bytes_total,
+                'bytes_metadata': self.bytes_metadata,
+                'waiting': len(self.waiting)
+            }
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_bandwidth_limiter():
+    """获取进程内共享的带宽限制器，默认不限速"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = BandwidthLimiter()
+        return _shared_limiter
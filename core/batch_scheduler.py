@@ -0,0 +1,280 @@
+import time
+import heapq
+import itertools
+import threading
+from utils.common import logger
+from core.media_jobs import PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+
+# 链接前加此标记表示优先处理
+URGENT_MARK = '!'
+
+
+class OperationCancelled(Exception):
+    """处理被取消或超出时间预算"""
+    def __init__(self, reason='cancelled'):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    def __init__(self, parent=None):
+        """
+        协作式取消标记
+
+        处理代码在数据块之间和阶段之间调用raise_if_cancelled()；
+        阻塞中的操作（网络读取、ffmpeg进程）通过on_cancel注册回调，取消时立即中断。
+
+        Args:
+            parent: 上级标记，上级取消时本标记随之取消
+        """
+        self.reason = None
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.callbacks = []
+        self.timer = None
+        self.parent = parent
+        self.parent_callback = None
+        if parent is not None:
+            self.parent_callback = lambda: self.cancel(parent.reason)
+            parent.on_cancel(self.parent_callback)
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self, reason='cancelled'):
+        """取消，并调用已注册的回调"""
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.reason = reason
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancel callback failed: {e}")
+
+    def cancel_after(self, seconds, reason='timeout'):
+        """超过seconds秒后自动取消"""
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = threading.Timer(seconds, self.cancel, args=(reason,))
+        self.timer.daemon = True
+        self.timer.start()
+
+    def on_cancel(self, callback):
+        """注册取消时调用的函数（无参数）；已取消时立即调用"""
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        """阻塞操作结束后注销回调"""
+        with self.lock:
+            if callback in self.callbacks:
+                self.callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        if self.event.is_set():
+            raise OperationCancelled(self.reason)
+
+    def close(self):
+        """停止计时并与上级标记解除关联"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.parent is not None:
+            self.parent.remove_callback(self.parent_callback)
+
+
+def wait_cancellable(func, cancel_token, discard=None):
+    """
+    在另一个线程中执行不能中断的阻塞调用（例如等待响应头，此时还没有可以关闭的连接），
+    取消时不再等待，立即抛出OperationCancelled；被放弃的调用结束后把结果交给discard（例如关闭响应）
+
+    没有cancel_token时直接在当前线程中调用
+    """
+    if cancel_token is None:
+        return func()
+    cancel_token.raise_if_cancelled()
+    outcome = {}
+    lock = threading.Lock()
+    finished = threading.Event()
+    woken = threading.Event()
+
+    def target():
+        try:
+            outcome['result'] = func()
+        except BaseException as e:
+            outcome['error'] = e
+        with lock:
+            finished.set()
+            abandoned = outcome.get('abandoned')
+        woken.set()
+        if abandoned and discard and 'result' in outcome:
+            try:
+                discard(outcome['result'])
+            except Exception as e:
+                logger.debug(f"Discarding abandoned result failed: {e}")
+
+    threading.Thread(target=target, daemon=True).start()
+    cancel_token.on_cancel(woken.set)
+    try:
+        woken.wait()
+    finally:
+        cancel_token.remove_callback(woken.set)
+    with lock:
+        if not finished.is_set():
+            outcome['abandoned'] = True
+            raise OperationCancelled(cancel_token.reason)
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+def parse_priority(link_text):
+    """
+    解析链接的优先级：以 ! 开头的链接优先处理
+
+    Returns:
+        (去掉标记后的链接, 优先级)
+    """
+    text = link_text.strip()
+    if text.startswith(URGENT_MARK):
+        return text[len(URGENT_MARK):].strip(), PRIORITY_HIGH
+    return text, PRIORITY_NORMAL
+
+
+class BatchScheduler:
+    def __init__(self, item_budget=300, batch_budget=None, max_attempts=2, slow_budget_factor=3):
+        """
+        批量处理调度器：按优先级处理条目，支持随时取消和时间预算
+
+        超出预算的条目被中断后以低优先级放回队列末尾，先处理其余条目，
+        再给它更长的预算重试，避免一个慢条目阻塞整批。
+
+        Args:
+            item_budget: 每个条目的时间预算（秒），None表示不限制
+            batch_budget: 整批的时间预算（秒），超出后取消剩余条目
+            max_attempts: 每个条目最多尝试次数，超出预算的条目会被推迟重试
+            slow_budget_factor: 推迟后重试时预算的倍数
+        """
+        self.item_budget = item_budget
+        self.batch_budget = batch_budget
+        self.max_attempts = max_attempts
+        self.slow_budget_factor = slow_budget_factor
+        self.lock = threading.Lock()
+        self.batch_token = None
+        self.queue = []
+        self.counter = itertools.count()
+
+    def cancel(self):
+        """取消正在运行的批次，正在处理的条目在一秒内中断"""
+        with self.lock:
+            token = self.batch_token
+        if token is not None:
+            logger.info("Batch cancelled by user")
+            token.cancel('cancelled')
+
+    def is_running(self):
+        with self.lock:
+            return self.batch_token is not None
+
+    def add(self, index, payload, priority=PRIORITY_NORMAL, attempt=0):
+        """加入一个条目，可在批次运行中调用（例如插入紧急链接）"""
+        with self.lock:
+            heapq.heappush(self.queue, (priority, next(self.counter), index, payload, attempt))
+
+    def _next(self):
+        with self.lock:
+            if not self.queue:
+                return None
+            return heapq.heappop(self.queue)
+
+    def run(self, items, handler, on_item_done=None):
+        """
+        处理一批条目，阻塞直到全部完成或批次被取消
+
+        Args:
+            items: [(payload, priority), ...]
+            handler: 处理函数，参数为(payload, cancel_token)，返回处理结果；
+                     被取消或超时时抛出OperationCancelled
+            on_item_done: 每个条目有最终结果时调用，参数为(序号, 结果)，失败或取消时结果为None
+
+        Returns:
+            统计字典：success, failed, deferred（被推迟过的条目数）, cancelled, results（序号到结果）
+        """
+        batch_token = CancelToken()
+        if self.batch_budget:
+            batch_token.cancel_after(self.batch_budget, 'batch_timeout')
+        deadline = time.monotonic() + self.batch_budget if self.batch_budget else None
+        with self.lock:
+            self.batch_token = batch_token
+            self.queue = []
+        for index, (payload, priority) in enumerate(items):
+            self.add(index, payload, priority)
+
+        summary = {'success': 0, 'failed': 0, 'deferred': 0, 'cancelled': 0, 'results': {}}
+        deferred = set()
+
+        def finish(index, result):
+            summary['results'][index] = result
+            if on_item_done:
+                on_item_done(index, result)
+
+        try:
+            while True:
+                entry = self._next()
+                if entry is None:
+                    break
+                priority, _, index, payload, attempt = entry
+                if batch_token.cancelled:
+                    summary['cancelled'] += 1
+                    finish(index, None)
+                    continue
+
+                token = CancelToken(parent=batch_token)
+                budget = self.item_budget * (self.slow_budget_factor ** attempt) if self.item_budget else None
+                if deadline is not None:
+                    remaining = max(0.0, deadline - time.monotonic())
+                    budget = min(budget, remaining) if budget else remaining
+                if budget:
+                    token.cancel_after(budget, 'timeout')
+
+                try:
+                    result = handler(payload, token)
+                except OperationCancelled as e:
+                    if batch_token.cancelled:
+                        summary['cancelled'] += 1
+                        finish(index, None)
+                    elif e.reason == 'timeout' and attempt + 1 < self.max_attempts:
+                        logger.warning(f"Item {index} exceeded its {budget:.1f}s budget, deferring")
+                        deferred.add(index)
+                        self.add(index, payload, PRIORITY_LOW, attempt + 1)
+                    else:
+                        logger.error(f"Item {index} cancelled: {e.reason}")
+                        summary['failed'] += 1
+                        finish(index, None)
+                    continue
+                finally:
+                    token.close()
+
+                if result:
+                    summary['success'] += 1
+                else:
+                    summary['failed'] += 1
+                finish(index, result)
+        finally:
+            batch_token.close()
+            with self.lock:
+                self.batch_token = None
+                self.queue = []
+
+        summary['deferred'] = len(deferred)
+        logger.info(f"Batch finished: success={summary['success']} failed={summary['failed']} "
+                    f"deferred={summary['deferred']} cancelled={summary['cancelled']}")
+        return summary
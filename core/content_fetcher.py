@@ -1,12 +1,14 @@
 import requests
-import json
-import re
-import time
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from utils.common import logger
+from core.bandwidth import get_bandwidth_limiter
+from core.parse_pool import get_parse_pool
+from core.batch_scheduler import OperationCancelled, wait_cancellable
+from core.downloader import abort_response
+from core.page_parser import RENDER_DATA_START, SCRIPT_END, check_login_status, build_douyin_video_info
 
 class ContentFetcher:
-    def __init__(self, cookies=None):
+    def __init__(self, cookies=None, pool_size=16, bandwidth_limiter=None, parse_pool=None):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -18,6 +20,17 @@ class ContentFetcher:
         self.cookies = cookies if cookies else {}
         self.session = requests.Session()
         self.session.headers.update(self.headers)
+        # 连接池大小需要与并发线程数匹配，否则高并发刷新时连接会被反复丢弃重建
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # 页面请求使用带宽限制器中为元数据保留的部分，不会被视频下载挤占
+        self.bandwidth = bandwidth_limiter or get_bandwidth_limiter()
+        # 页面解析在子进程中进行，网络读取和解析不再争用同一个GIL
+        self.parse_pool = parse_pool or get_parse_pool()
+        # 页面缓存，默认关闭
+        self.cache = None
+        self.offline = False
         if self.cookies:
             self.session.cookies.update(self.cookies)
     
@@ -26,120 +39,154 @@ class ContentFetcher:
         self.cookies.update(cookies)
         self.session.cookies.update(cookies)
     
-    def check_login_status(self, response):
-        """检查是否需要登录"""
-        # 根据响应内容判断是否需要登录
-        if '登录' in response.text and '密码' in response.text:
-            return False
-        return True
+    def check_login_status(self, content):
+        """检查是否需要登录，content为页面内容（bytes）"""
+        return check_login_status(content)
     
-    def fetch_douyin_video_info(self, video_id, url):
-        """获取抖音视频信息"""
+    def stream_render_data(self, response, chunk_size=16384):
+        """
+        流式读取页面，找到RENDER_DATA脚本块后立即停止
+        
+        Returns:
+            (已读取的字节, 数据块起始位置, 数据块结束位置)；未找到时位置为-1，
+            此时已读取的字节即完整页面
+        """
+        buffer = bytearray()
+        start = -1
+        search_from = 0
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if not chunk:
+                continue
+            self.bandwidth.consume_metadata(len(chunk))
+            buffer += chunk
+            if start < 0:
+                # 从上次搜索位置往回退一个标记长度，防止标记被切在两个数据块之间
+                index = buffer.find(RENDER_DATA_START, max(0, search_from - len(RENDER_DATA_START)))
+                if index < 0:
+                    search_from = len(buffer)
+                    continue
+                start = index + len(RENDER_DATA_START)
+                search_from = start
+            end = buffer.find(SCRIPT_END, max(start, search_from - len(SCRIPT_END)))
+            if end >= 0:
+                return buffer, start, end
+            search_from = len(buffer)
+        return buffer, -1, -1
+    
+    def build_douyin_video_info(self, video_info, url):
+        """将抖音接口中的单个作品数据（aweme）转换为统一的视频信息字典"""
+        return build_douyin_video_info(video_info, url)
+    
+    def set_cache(self, cache, offline=False):
+        """
+        设置页面缓存（core.http_cache.ResponseCache），传入None关闭缓存
+        
+        Args:
+            cache: 缓存实例
+            offline: 离线模式，只使用缓存，不访问网络
+        """
+        self.cache = cache
+        self.offline = offline
+    
+    def parse_douyin_page(self, content, url, encoding='utf-8', cancel_token=None):
+        """从页面内容（bytes，可以只包含到RENDER_DATA结束的部分）解析视频信息，大页面交给解析进程"""
+        result = self.parse_pool.parse(content, url, encoding, cancel_token)
+        if result and result.get('login_required'):
+            logger.warning("Login required to access this video")
+        return result
+    
+    def fetch_douyin_video_info(self, video_id, url, revalidate=False, cancel_token=None):
+        """
+        获取抖音视频信息
+        
+        revalidate为True时即使缓存未过期也向服务器验证（刷新互动数据时使用，不能使用缓存中的旧数据）
+        cancel_token被取消时放弃等待响应、关闭连接中断读取，并抛出OperationCancelled
+        """
         try:
-            # 尝试直接获取视频页面
-            response = self.session.get(url, timeout=10)
-            
-            # 检查是否需要登录
-            login_required = not self.check_login_status(response)
-            if login_required:
-                logger.warning("Login required to access this video")
-                return {'login_required': True}
+            cached = self.cache.get(url, self.session.cookies) if self.cache else None
+            if cached and ((cached['fresh'] and not revalidate) or self.offline):
+                # 缓存命中，不访问网络
+                return self.parse_douyin_page(cached['body'], url, cached['encoding'])
+            if self.offline:
+                logger.warning(f"Page not in cache (offline mode): {url}")
+                return None
             
-            # 从网页内容中提取视频信息
-            html_content = response.text
+            # 缓存过期时带上验证信息，内容未变化时服务器返回304
+            headers = {}
+            if cached and cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached and cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
             
-            # 提取视频信息的模式可能需要根据抖音网页结构调整
-            # 尝试从HTML中提取JSON数据
-            render_data_pattern = r'<script id="RENDER_DATA" type="application/json">(.*?)</script>'
-            render_data_match = re.search(render_data_pattern, html_content)
+            # 流式获取视频页面，读到需要的数据块后立即关闭连接
+            response = wait_cancellable(
+                lambda: self.session.get(url, timeout=10, stream=True, headers=headers),
+                cancel_token, discard=lambda abandoned: abandoned.close())
+            abort = lambda: abort_response(response)
+            if cancel_token:
+                # 取消时关闭连接，正在进行的读取立即返回
+                cancel_token.on_cancel(abort)
+            try:
+                with response:
+                    if response.status_code == 304 and cached:
+                        self.cache.touch(url, self.session.cookies)
+                        return self.parse_douyin_page(cached['body'], url, cached['encoding'], cancel_token)
+                    content, start, end = self.stream_render_data(response)
+                    if end >= 0:
+                        # 只保留到数据块结束的部分，重新解析时不需要后面的内容
+                        del content[end + len(SCRIPT_END):]
+                    encoding = response.encoding or 'utf-8'
+                    status_code = response.status_code
+                    etag = response.headers.get('ETag')
+                    last_modified = response.headers.get('Last-Modified')
+            finally:
+                if cancel_token:
+                    cancel_token.remove_callback(abort)
+            # 读取被中断时已读取的内容不完整，不解析也不缓存
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
             
-            if render_data_match:
-                json_data = render_data_match.group(1)
-                # 解码URL编码的JSON
-                import urllib.parse
-                decoded_data = urllib.parse.unquote(json_data)
-                data = json.loads(decoded_data)
-                
-                # 从解析的数据中提取视频信息
-                # 注意：这里的路径需要根据实际的数据结构调整
-                video_info = None
-                for key in data:
-                    if 'aweme' in key and 'detail' in data[key]:
-                        video_info = data[key]['detail']
-                        break
-                
-                if video_info:
-                    # 提取有用的信息
-                    result = {
-                        'title': video_info.get('desc', ''),
-                        'description': video_info.get('desc', ''),
-                        'tags': [],
-                        'stats': {
-                            'likes': video_info.get('statistics', {}).get('digg_count', 0),
-                            'comments': video_info.get('statistics', {}).get('comment_count', 0),
-                            'favorites': video_info.get('statistics', {}).get('collect_count', 0),
-                            'shares': video_info.get('statistics', {}).get('share_count', 0)
-                        },
-                        'author': {
-                            'name': video_info.get('author', {}).get('nickname', ''),
-                            'id': video_info.get('author', {}).get('unique_id', '')
-                        },
-                        'source_url': url,
-                        'play_url': ''
-                    }
-                    
-                    # 提取标签
-                    if 'text_extra' in video_info:
-                        for tag_info in video_info['text_extra']:
-                            if 'hashtag_name' in tag_info and tag_info['hashtag_name']:
-                                result['tags'].append(tag_info['hashtag_name'])
-                    
-                    # 提取视频播放地址
-                    if 'video' in video_info and 'play_addr' in video_info['video']:
-                        play_addr_list = video_info['video']['play_addr'].get('url_list', [])
-                        if play_addr_list:
-                            result['play_url'] = play_addr_list[0]
-                    
-                    return result
-            
-            # 如果无法提取结构化数据，尝试使用BeautifulSoup解析页面
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            title = soup.select_one('title').text if soup.select_one('title') else ''
-            description = soup.select_one('meta[name="description"]')
-            description = description['content'] if description else ''
-            
-            # 尝试从页面中找到视频播放地址
-            video_tag = soup.select_one('video')
-            play_url = video_tag['src'] if video_tag and 'src' in video_tag.attrs else ''
-            
-            # 构建基本返回结果
-            return {
-                'title': title,
-                'description': description,
-                'tags': [],  # 需要更精确的解析方法提取标签
-                'stats': {
-                    'likes': 0,
-                    'comments': 0,
-                    'favorites': 0,
-                    'shares': 0
-                },
-                'author': {
-                    'name': '',
-                    'id': ''
-                },
-                'source_url': url,
-                'play_url': play_url
-            }
+            result = self.parse_douyin_page(content, url, encoding, cancel_token)
+            # 只缓存成功解析的正常页面，不缓存登录页
+            if self.cache and status_code == 200 and result and not result.get('login_required'):
+                self.cache.put(url, self.session.cookies, content, encoding, etag, last_modified)
+            return result
             
+        except OperationCancelled:
+            raise
         except Exception as e:
+            if cancel_token and cancel_token.cancelled:
+                # 连接被关闭导致的读取错误
+                raise OperationCancelled(cancel_token.reason)
             logger.error(f"Error fetching Douyin video info: {e}")
             return None
     
-    def fetch_video_info(self, platform, video_id, url):
-        """根据平台获取视频信息"""
+    def replay_cache(self):
+        """
+        离线重放：用当前的解析代码重新解析全部缓存页面
+        
+        Returns:
+            生成器，逐个返回(url, 解析结果)
+        """
+        if not self.cache:
+            return
+        for url, body, encoding in self.cache.iter_entries():
+            try:
+                result = self.parse_douyin_page(body, url, encoding)
+            except Exception as e:
+                logger.error(f"Error parsing cached page {url}: {e}")
+                result = None
+            yield url, result
+    
+    def fetch_video_info(self, platform, video_id, url, revalidate=False, cancel_token=None):
+        """根据平台获取视频信息，revalidate和cancel_token见fetch_douyin_video_info"""
         if platform == 'douyin':
-            return self.fetch_douyin_video_info(video_id, url)
+            result = self.fetch_douyin_video_info(video_id, url, revalidate, cancel_token)
+            # 记录平台和视频ID，供下载、导出和增量刷新使用
+            if result and not result.get('login_required'):
+                result['platform'] = platform
+                result['video_id'] = video_id
+            return result
         else:
             logger.info(f"Fetching for platform {platform} not yet implemented")
             return None
\ No newline at end of file
@@ -1,6 +1,33 @@
 import os
 from utils.common import logger
 
+# 计数列
+COUNT_COLUMNS = ['likes', 'comments', 'favorites', 'shares']
+
+# enrich()添加的派生列
+DERIVED_COLUMNS = [
+    'interactions', 'comment_like_ratio', 'favorite_like_ratio', 'share_like_ratio',
+    'engagement_rate', 'author_likes_percentile', 'tag_count'
+]
+
+# 分位数汇总使用的百分位
+AGGREGATE_QUANTILE = 0.9
+
+
+def split_tags(tags):
+    """
+    拆分逗号分隔的标签列，每种不同的标签字符串只拆分一次
+    
+    Args:
+        tags: 标签字符串的Series
+    
+    Returns:
+        (各行在uniques中的序号, 每种标签字符串拆分后的列表)
+    """
+    import pandas as pd
+    codes, uniques = pd.factorize(tags)
+    return codes, [[tag.strip() for tag in value.split(',') if tag.strip()] for value in uniques]
+
 class DataProcessor:
     def __init__(self):
         pass
@@ -62,4 +89,108 @@ class DataProcessor:
             if processed_item:
                 processed_items.append(processed_item)
         
-        return processed_items
\ No newline at end of file
+        return processed_items
+    
+    def enrich(self, columns):
+        """
+        批量计算派生指标，按列整体计算，不逐行处理
+        
+        派生列：
+            interactions: 点赞、评论、收藏、分享之和
+            comment_like_ratio / favorite_like_ratio / share_like_ratio: 与点赞数之比，点赞为0时为0
+            engagement_rate: 互动总数相对该作者平均互动数的倍数（数据中没有播放量）
+            author_likes_percentile: 点赞数在该作者全部视频中的百分位（0到1）
+            tag_count: 标签数
+        
+        Args:
+            columns: 列名到数组的字典，或DataFrame（一批新记录或数据库中的全部记录）
+        
+        Returns:
+            添加了派生列的DataFrame
+        """
+        import numpy as np
+        import pandas as pd
+        
+        df = columns.copy() if isinstance(columns, pd.DataFrame) else pd.DataFrame(columns)
+        for column in COUNT_COLUMNS:
+            values = df[column] if column in df else pd.Series(0, index=df.index)
+            df[column] = pd.to_numeric(values, errors='coerce').fillna(0).astype('int64')
+        for column in ('author_id', 'tags'):
+            df[column] = df[column].fillna('').astype(str) if column in df else ''
+        
+        counts = {column: df[column].to_numpy(dtype='float64') for column in COUNT_COLUMNS}
+        likes = counts['likes']
+        interactions = likes + counts['comments'] + counts['favorites'] + counts['shares']
+        df['interactions'] = interactions.astype('int64')
+        for column in ('comments', 'favorites', 'shares'):
+            df[f"{column[:-1]}_like_ratio"] = np.divide(counts[column], likes, out=np.zeros_like(likes), where=likes > 0)
+        
+        by_author = df.groupby('author_id', sort=False)
+        author_mean = by_author['interactions'].transform('mean').to_numpy(dtype='float64')
+        df['engagement_rate'] = np.divide(interactions, author_mean, out=np.zeros_like(interactions), where=author_mean > 0)
+        df['author_likes_percentile'] = by_author['likes'].rank(pct=True, method='max')
+        
+        codes, split = split_tags(df['tags'])
+        df['tag_count'] = np.array([len(values) for values in split], dtype='int64')[codes] if split else 0
+        return df
+    
+    def author_aggregates(self, enriched):
+        """
+        按作者汇总enrich()的结果
+        
+        Returns:
+            每个作者一行的DataFrame，按点赞总数从高到低
+        """
+        df = enriched[enriched['author_id'] != '']
+        grouped = df.groupby('author_id', sort=False)
+        summary = grouped.agg(
+            author_name=('author_name', 'last') if 'author_name' in df else ('author_id', 'last'),
+            video_count=('likes', 'size'),
+            total_likes=('likes', 'sum'),
+            mean_likes=('likes', 'mean'),
+            median_likes=('likes', 'median'),
+            total_interactions=('interactions', 'sum'),
+            mean_interactions=('interactions', 'mean'),
+            mean_share_like_ratio=('share_like_ratio', 'mean')
+        )
+        summary.insert(5, f"p{int(AGGREGATE_QUANTILE * 100)}_likes", grouped['likes'].quantile(AGGREGATE_QUANTILE))
+        return summary.sort_values('total_likes', ascending=False).reset_index()
+    
+    def tag_aggregates(self, enriched):
+        """
+        按标签汇总enrich()的结果，一个视频的每个标签各计一次
+        
+        Returns:
+            每个标签一行的DataFrame，按视频数从高到低
+        """
+        import numpy as np
+        import pandas as pd
+        
+        # 按标签字符串的种类展开，再用数组下标映射回各行，不对每行做字符串处理
+        codes, split = split_tags(enriched['tags'])
+        lengths = np.array([len(values) for values in split], dtype='int64')
+        offsets = np.concatenate([[0], np.cumsum(lengths)])[:-1]
+        tag_ids, tag_names = pd.factorize(pd.Series([tag for values in split for tag in values], dtype=object))
+        row_lengths = lengths[codes] if len(codes) else np.zeros(0, dtype='int64')
+        rows = np.repeat(np.arange(len(codes)), row_lengths)
+        positions = np.arange(len(rows)) - np.repeat(np.cumsum(row_lengths) - row_lengths, row_lengths)
+        exploded = pd.DataFrame({
+            'tag': pd.Categorical.from_codes(tag_ids[offsets[codes[rows]] + positions], tag_names)
+            if len(rows) else pd.Categorical([]),
+            'author_id': enriched['author_id'].to_numpy()[rows],
+            'likes': enriched['likes'].to_numpy()[rows],
+            'interactions': enriched['interactions'].to_numpy()[rows],
+            'engagement_rate': enriched['engagement_rate'].to_numpy()[rows]
+        })
+        grouped = exploded.groupby('tag', sort=False, observed=True)
+        summary = grouped.agg(
+            video_count=('likes', 'size'),
+            author_count=('author_id', 'nunique'),
+            total_likes=('likes', 'sum'),
+            mean_likes=('likes', 'mean'),
+            median_likes=('likes', 'median'),
+            mean_interactions=('interactions', 'mean'),
+            mean_engagement_rate=('engagement_rate', 'mean')
+        )
+        summary.insert(5, f"p{int(AGGREGATE_QUANTILE * 100)}_likes", grouped['likes'].quantile(AGGREGATE_QUANTILE))
+        return summary.sort_values(['video_count', 'total_likes'], ascending=False).reset_index()
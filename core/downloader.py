@@ -1,16 +1,102 @@
 import os
+import time
+import socket
+import hashlib
+import itertools
+import threading
 import requests
 import subprocess
 import tempfile
 from utils.common import logger, clean_filename, create_directory
+from core.media_jobs import get_media_scheduler, PRIORITY_NORMAL
+from core.batch_scheduler import OperationCancelled
+from core.mirror_selector import MirrorSelector
+from core.bandwidth import get_bandwidth_limiter
+
+# 读取响应体的数据块大小范围，按实际速度在其间调整，使每次读取约TARGET_READ_SECONDS秒
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+TARGET_READ_SECONDS = 0.05
+
+# 边下载边分离音频时，超过这么多秒没有数据写入ffmpeg即放弃（不限制总时长，限速时大文件需要很久）
+STREAM_IDLE_TIMEOUT = 60
+
+# 只获取音频时保存的格式：抖音视频的音频为AAC，直接复制到m4a不需要转码
+AUDIO_ONLY_FORMAT = 'm4a'
+
+
+def abort_response(response):
+    """关闭响应的底层连接，让另一个线程中阻塞的读取立即返回"""
+    connection = getattr(response.raw, 'connection', None)
+    sock = getattr(connection, 'sock', None)
+    if sock is None:
+        # urllib3 2.x读取响应体时连接对象不再持有socket，只能从响应的文件对象中取得
+        fp = getattr(getattr(response.raw, '_fp', None), 'fp', None)
+        sock = getattr(getattr(fp, 'raw', None), '_sock', None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+def preallocate(f, size):
+    """按Content-Length预先分配文件空间，减少写入时的碎片和元数据更新"""
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except AttributeError:
+        # Windows上没有posix_fallocate，设置文件长度即分配空间
+        f.truncate(size)
+    except OSError as e:
+        logger.debug(f"Cannot preallocate {size} bytes: {e}")
+
+
+def is_identity(response):
+    """响应体未经压缩编码"""
+    return response.headers.get('Content-Encoding', 'identity').lower() in ('', 'identity')
+
+
+def temp_media_path(path):
+    """
+    在目标目录中创建唯一的临时文件，保留扩展名供ffmpeg判断输出格式
+    
+    同一视频同时被多个任务处理时，各自写入不同的临时文件，不会互相覆盖或删除
+    """
+    base, ext = os.path.splitext(path)
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(base) + '.', suffix='.part' + ext,
+                                     dir=os.path.dirname(path) or '.')
+    os.close(fd)
+    return temp_path
+
+
+def write_all(f, data):
+    """写入全部数据（无缓冲文件的一次write可能只写入一部分）"""
+    view = memoryview(data)
+    while view:
+        written = f.write(view)
+        view = view[written:]
+
 
 class Downloader:
-    def __init__(self, download_dir='downloads'):
+    def __init__(self, download_dir='downloads', media_scheduler=None, bandwidth_limiter=None):
         self.download_dir = download_dir
+        # ffmpeg任务与字幕提取共用同一个调度器，统一限制CPU占用
+        self.media_scheduler = media_scheduler or get_media_scheduler()
+        # 所有下载与页面请求共用同一个带宽限制器
+        self.bandwidth = bandwidth_limiter or get_bandwidth_limiter()
         create_directory(download_dir)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
         }
+        # 在多个CDN镜像之间选择最快的一个，统计数据在整个运行期间保留
+        self.mirror_selector = MirrorSelector(self.headers)
+        # 每个下载线程复用一块读取缓冲区
+        self.buffers = threading.local()
+        # 进度报告器，为None时不报告进度
+        self.progress_reporter = None
+        # 只获取音频，不下载视频文件
+        self.audio_only = False
         # 检查ffmpeg是否可用
         try:
             subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -19,78 +105,371 @@ class Downloader:
             logger.warning("ffmpeg not found. Audio extraction will be unavailable.")
             self.ffmpeg_available = False
     
-    def download_file(self, url, save_path, chunk_size=8192):
-        """下载文件到指定路径"""
+    def set_progress_reporter(self, reporter):
+        """设置进度报告器（core.progress.ProgressReporter），传入None关闭进度报告"""
+        self.progress_reporter = reporter
+    
+    def set_audio_only(self, audio_only):
+        """
+        设置只获取音频：页面提供单独的音频流地址时直接下载音频，
+        否则边下载边由ffmpeg分离音频（复制音频流，不转码），视频文件不写入磁盘
+        """
+        self.audio_only = audio_only
+    
+    def get_media_path(self, platform, video_id, ext):
+        """
+        根据平台和视频ID生成媒体文件路径
+        
+        路径格式为 <下载目录>/<平台>/<哈希前2位>/<哈希3-4位>/<视频ID>.<扩展名>，
+        两级哈希目录让每个目录中的文件数保持在较小规模，
+        以视频ID命名保证不同视频不会互相覆盖。
+        """
+        safe_id = clean_filename(str(video_id), max_length=128)
+        digest = hashlib.md5(safe_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.download_dir, platform, digest[:2], digest[2:4], f"{safe_id}.{ext}")
+    
+    def get_buffer(self):
+        """当前线程的读取缓冲区"""
+        buffer = getattr(self.buffers, 'buffer', None)
+        if buffer is None:
+            buffer = self.buffers.buffer = memoryview(bytearray(MAX_CHUNK_SIZE))
+        return buffer
+    
+    def iter_body(self, response, chunk_size=MIN_CHUNK_SIZE):
+        """
+        逐块读取响应体
+        
+        未压缩的响应直接读入复用的缓冲区（readinto），返回的是缓冲区的切片，
+        必须在取下一块之前用完；数据块大小按读取和写入的耗时在MIN_CHUNK_SIZE和MAX_CHUNK_SIZE之间调整。
+        经过压缩的响应需要解码，使用iter_content。
+        """
+        raw = getattr(response.raw, '_fp', None)
+        if raw is None or not hasattr(raw, 'readinto') or not is_identity(response):
+            yield from response.iter_content(chunk_size=chunk_size)
+            return
+        
+        buffer = self.get_buffer()
+        size = chunk_size
+        while True:
+            started = time.perf_counter()
+            count = raw.readinto(buffer[:size])
+            if not count:
+                return
+            yield buffer[:count]
+            # 耗时包括调用方写入文件和限速等待的时间
+            elapsed = time.perf_counter() - started
+            if count == size and elapsed < TARGET_READ_SECONDS / 2 and size < MAX_CHUNK_SIZE:
+                size *= 2
+            elif elapsed > TARGET_READ_SECONDS * 2 and size > MIN_CHUNK_SIZE:
+                size //= 2
+    
+    def open_response(self, url, mirrors=None, cancel_token=None):
+        """
+        打开流式响应，有多个镜像时使用最快的一个
+        
+        Returns:
+            (响应, 实际使用的地址, 已读取的开头部分)；选择镜像时已读取的试探数据块需要先写入
+        """
+        candidates = [url] + [mirror for mirror in mirrors or [] if mirror != url]
+        if len(candidates) > 1:
+            # 各镜像的失败已在选择时记录
+            return self.mirror_selector.open(candidates, timeout=30, cancel_token=cancel_token)
+        try:
+            return requests.get(url, headers=self.headers, stream=True, timeout=30), url, b''
+        except Exception:
+            self.mirror_selector.record_failure(url)
+            raise
+    
+    def download_file(self, url, save_path, chunk_size=MIN_CHUNK_SIZE, cancel_token=None, mirrors=None):
+        """
+        下载文件到指定路径，先写入临时文件，完成后原子重命名
+        
+        提供mirrors（同一文件的其他地址）时，在各镜像之间对冲请求，使用最先读完试探数据块的一个；
+        提供cancel_token时，取消会关闭连接中断正在进行的读取，并抛出OperationCancelled
+        """
+        temp_path = None
+        transfer = None
+        downloaded = 0
+        response = None
+        abort = None
         try:
-            response = requests.get(url, headers=self.headers, stream=True, timeout=30)
+            response, url, probe = self.open_response(url, mirrors, cancel_token)
+            started_at = time.perf_counter()
+            if cancel_token:
+                abort = lambda: abort_response(response)
+                cancel_token.on_cancel(abort)
             response.raise_for_status()
             
             total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
             
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=chunk_size):
+            # 没有进度报告器时阈值为无穷大，每个数据块只多一次比较
+            next_report = float('inf')
+            if self.progress_reporter:
+                transfer = self.progress_reporter.start_file(save_path, total_size)
+                next_report = transfer.next_report
+            
+            # 在目标目录中创建唯一的临时文件，保证重命名在同一文件系统内完成
+            fd, temp_path = tempfile.mkstemp(suffix='.part', dir=os.path.dirname(save_path) or '.')
+            # 压缩的响应Content-Length是压缩后的大小，不能用来预分配和校验
+            expected_size = total_size if is_identity(response) else 0
+            # 不经过Python的写缓冲，数据块直接从读取缓冲区写入文件
+            with os.fdopen(fd, 'wb', buffering=0) as f:
+                if expected_size:
+                    preallocate(f, expected_size)
+                if probe:
+                    self.bandwidth.consume(len(probe))
+                    write_all(f, probe)
+                    downloaded += len(probe)
+                for chunk in self.iter_body(response, chunk_size):
+                    if cancel_token and cancel_token.cancelled:
+                        break
                     if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        # 计算下载进度
-                        progress = (downloaded / total_size * 100) if total_size > 0 else 0
-                        # 这里可以添加进度回调函数
+                        size = len(chunk)
+                        self.bandwidth.consume(size)
+                        write_all(f, chunk)
+                        downloaded += size
+                        if downloaded >= next_report:
+                            next_report = transfer.update(downloaded)
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            # 直接从http.client读取时连接提前断开不会报错，需要自己检查长度
+            if expected_size and downloaded != expected_size:
+                raise IOError(f"Incomplete download: {downloaded}/{expected_size} bytes")
             
+            os.replace(temp_path, save_path)
+            self.mirror_selector.record_transfer(url, downloaded, time.perf_counter() - started_at)
+            if transfer:
+                transfer.finish(downloaded)
             logger.info(f"Successfully downloaded: {save_path}")
             return save_path
         except Exception as e:
+            if transfer:
+                transfer.finish(downloaded, success=False)
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+            # 连接被取消操作关闭时，读取抛出的是连接错误，统一转换为取消
+            if cancel_token and cancel_token.cancelled:
+                logger.info(f"Download cancelled ({cancel_token.reason}): {save_path}")
+                raise OperationCancelled(cancel_token.reason)
+            # 没有得到响应时的失败已在打开时记录，这里只记录选定镜像之后的失败（状态码、读取中断等）
+            if response is not None:
+                self.mirror_selector.record_failure(url)
             logger.error(f"Error downloading file: {e}")
-            if os.path.exists(save_path):
-                os.remove(save_path)
             return None
+        finally:
+            if abort:
+                cancel_token.remove_callback(abort)
+            if response is not None:
+                response.close()
     
-    def extract_audio(self, video_path, audio_format='mp3'):
+    def extract_audio(self, video_path, audio_format='mp3', cancel_token=None):
         """从视频中提取音频"""
         if not self.ffmpeg_available:
             logger.error("Cannot extract audio: ffmpeg not available")
             return None
         
+        temp_path = None
         try:
             audio_path = os.path.splitext(video_path)[0] + f".{audio_format}"
+            if os.path.exists(audio_path):
+                return audio_path
+            
+            temp_path = temp_media_path(audio_path)
             cmd = [
                 'ffmpeg',
                 '-i', video_path,
                 '-q:a', '0',  # 最高音质
                 '-map', 'a',   # 只提取音频
                 '-y',          # 覆盖已存在的文件
-                audio_path
+                temp_path
             ]
             
-            process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            if process.returncode != 0:
-                logger.error(f"FFmpeg error: {process.stderr.decode()}")
+            process = self.media_scheduler.run(cmd, priority=PRIORITY_NORMAL, cancel_token=cancel_token)
+            if cancel_token and cancel_token.cancelled:
+                raise OperationCancelled(cancel_token.reason)
+            if process['returncode'] != 0:
+                logger.error(f"FFmpeg error: {process['stderr'].decode(errors='replace')}")
                 return None
             
+            os.replace(temp_path, audio_path)
             logger.info(f"Successfully extracted audio: {audio_path}")
             return audio_path
+        except OperationCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error extracting audio: {e}")
             return None
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def run_audio_job(self, cmd, audio_path, cancel_token=None, input_stream=None):
+        """
+        执行只复制音频流的ffmpeg命令（cmd不含输出文件），成功后将临时文件重命名为audio_path
+        
+        Returns:
+            (是否成功, MediaJobScheduler.run的结果字典)
+        """
+        temp_path = temp_media_path(audio_path)
+        try:
+            process = self.media_scheduler.run(cmd + [temp_path], priority=PRIORITY_NORMAL,
+                                               cancel_token=cancel_token, input_stream=input_stream,
+                                               limited=False, name=os.path.basename(audio_path),
+                                               idle_timeout=STREAM_IDLE_TIMEOUT if input_stream else None)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        failed = process['returncode'] != 0 or process['input_error'] is not None
+        if failed or (cancel_token and cancel_token.cancelled):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            if process['input_error'] is not None:
+                logger.error(f"Error streaming video to ffmpeg: {process['input_error']}")
+            elif not process['timed_out']:
+                logger.warning(f"FFmpeg error: {process['stderr'].decode(errors='replace')[-500:]}")
+            return False, process
+        os.replace(temp_path, audio_path)
+        return True, process
+    
+    def stream_audio(self, url, audio_path, mirrors=None, cancel_token=None):
+        """
+        边下载视频边交给ffmpeg分离音频（-vn，音频流直接复制），视频数据只经过管道，不写入磁盘
+        
+        视频的索引（moov）在文件末尾时ffmpeg无法从管道中读取，改为由ffmpeg直接读取视频地址
+        （可以按需跳转读取，但不经过带宽限制和镜像选择）；下载中断或超时时不这样重试，避免重新下载整个视频。
+        
+        Returns:
+            音频文件路径，失败时返回None；cancel_token被取消时抛出OperationCancelled
+        """
+        if not self.ffmpeg_available:
+            logger.error("Cannot stream audio: ffmpeg not available")
+            return None
+        
+        transfer = None
+        downloaded = 0
+        response = None
+        probe = b''
+        abort = None
+        expected_size = 0
+        
+        def body():
+            nonlocal downloaded
+            next_report = transfer.next_report if transfer else float('inf')
+            for chunk in itertools.chain([probe] if probe else [], self.iter_body(response)):
+                if cancel_token and cancel_token.cancelled:
+                    break
+                size = len(chunk)
+                self.bandwidth.consume(size)
+                yield chunk
+                downloaded += size
+                if downloaded >= next_report:
+                    next_report = transfer.update(downloaded)
+            # 连接提前断开时ffmpeg只会看到输入结束，需要自己检查长度
+            if expected_size and downloaded != expected_size and not (cancel_token and cancel_token.cancelled):
+                raise IOError(f"Incomplete download: {downloaded}/{expected_size} bytes")
+        
+        try:
+            response, url, probe = self.open_response(url, mirrors, cancel_token)
+            started_at = time.perf_counter()
+            if cancel_token:
+                abort = lambda: abort_response(response)
+                cancel_token.on_cancel(abort)
+            response.raise_for_status()
+            total_size = int(response.headers.get('content-length', 0))
+            expected_size = total_size if is_identity(response) else 0
+            if self.progress_reporter:
+                transfer = self.progress_reporter.start_file(audio_path, total_size)
+            
+            cmd = ['ffmpeg', '-i', 'pipe:0', '-vn', '-c:a', 'copy', '-y']
+            streamed, process = self.run_audio_job(cmd, audio_path, cancel_token, input_stream=body())
+            if transfer:
+                transfer.finish(downloaded, success=streamed)
+            if streamed:
+                self.mirror_selector.record_transfer(url, downloaded, time.perf_counter() - started_at)
+            elif process['input_error'] is not None:
+                self.mirror_selector.record_failure(url)
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            if transfer:
+                transfer.finish(downloaded, success=False)
+            if cancel_token and cancel_token.cancelled:
+                raise OperationCancelled(cancel_token.reason)
+            if response is not None:
+                self.mirror_selector.record_failure(url)
+            logger.error(f"Error streaming audio: {e}")
+            return None
+        finally:
+            if abort:
+                cancel_token.remove_callback(abort)
+            if response is not None:
+                response.close()
+        
+        if not streamed:
+            if process['input_error'] is not None or process['timed_out']:
+                # 下载本身失败，不是ffmpeg无法解析，直接读取地址同样会失败
+                return None
+            logger.info(f"Cannot demux audio from stream, letting ffmpeg read the URL: {url}")
+            cmd = ['ffmpeg', '-user_agent', self.headers['User-Agent'], '-i', url,
+                   '-vn', '-c:a', 'copy', '-y']
+            if not self.run_audio_job(cmd, audio_path, cancel_token)[0]:
+                return None
+        logger.info(f"Successfully extracted audio: {audio_path}")
+        return audio_path
+    
+    def download_audio(self, video_info, platform, video_id, cancel_token=None):
+        """只获取音频，不下载视频文件"""
+        audio_path = self.get_media_path(platform, video_id, AUDIO_ONLY_FORMAT)
+        os.makedirs(os.path.dirname(audio_path), exist_ok=True)
+        
+        if os.path.exists(audio_path):
+            logger.info(f"Audio already downloaded: {audio_path}")
+            downloaded_audio = audio_path
+        else:
+            downloaded_audio = None
+            audio_urls = video_info.get('audio_urls')
+            if audio_urls:
+                # 页面提供了单独的音频流，只下载音频
+                downloaded_audio = self.download_file(audio_urls[0], audio_path, cancel_token=cancel_token,
+                                                      mirrors=audio_urls)
+            if not downloaded_audio:
+                downloaded_audio = self.stream_audio(video_info['play_url'], audio_path,
+                                                     video_info.get('play_urls'), cancel_token)
+        if not downloaded_audio:
+            return None
+        
+        return {
+            'video_path': None,
+            'audio_path': downloaded_audio
+        }
     
-    def download_video(self, video_info, extract_audio=True):
-        """下载视频并可选提取音频"""
+    def download_video(self, video_info, extract_audio=True, cancel_token=None):
+        """下载视频并可选提取音频，cancel_token用于中途取消；只获取音频时（set_audio_only）返回的video_path为None"""
         if not video_info or 'play_url' not in video_info or not video_info['play_url']:
             logger.error("No valid video URL provided")
             return None
         
-        # 创建平台特定的下载目录
-        platform_dir = os.path.join(self.download_dir, video_info.get('platform', 'unknown'))
-        create_directory(platform_dir)
+        # 按平台和视频ID确定存储位置，标题只保存在元数据中
+        platform = video_info.get('platform') or 'unknown'
+        video_id = video_info.get('video_id')
+        if not video_id:
+            # 没有视频ID时用播放地址的哈希代替，避免同名覆盖
+            video_id = hashlib.sha1(video_info['play_url'].encode('utf-8')).hexdigest()[:16]
+        if self.audio_only:
+            return self.download_audio(video_info, platform, video_id, cancel_token)
         
-        # 生成文件名
-        title = video_info.get('title', 'untitled')
-        clean_title = clean_filename(title)
-        video_filename = f"{clean_title}.mp4"
-        video_path = os.path.join(platform_dir, video_filename)
+        video_path = self.get_media_path(platform, video_id, 'mp4')
+        os.makedirs(os.path.dirname(video_path), exist_ok=True)
         
-        # 下载视频
-        downloaded_video = self.download_file(video_info['play_url'], video_path)
+        # 已下载过的视频直接复用
+        if os.path.exists(video_path):
+            logger.info(f"Video already downloaded: {video_path}")
+            downloaded_video = video_path
+        else:
+            downloaded_video = self.download_file(video_info['play_url'], video_path, cancel_token=cancel_token,
+                                                  mirrors=video_info.get('play_urls'))
         if not downloaded_video:
             return None
         
@@ -101,6 +480,6 @@ class Downloader:
         
         # 如果需要，提取音频
         if extract_audio and self.ffmpeg_available:
-            result['audio_path'] = self.extract_audio(downloaded_video)
+            result['audio_path'] = self.extract_audio(downloaded_video, cancel_token=cancel_token)
         
         return result
\ No newline at end of file
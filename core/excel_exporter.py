@@ -1,15 +1,330 @@
 import os
+import re
+import zipfile
+import xml.etree.ElementTree as ET
 import pandas as pd
+from openpyxl import Workbook
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import from_excel
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
 from utils.common import logger, create_directory
 
+# Excel工作表的行数上限（含表头）和单元格的字符数上限
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_CELL_CHARS = 32767
+
+# 超长文本写入单独文件后，单元格中保留的开头字数
+SPILL_EXCERPT_CHARS = 200
+
+ROLLOVER_MODES = ('sheet', 'file')
+
+# xlsx文件中的XML命名空间
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIP_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+
+def part_path(path, part):
+    """按文件分割时第part个文件的路径，第一个文件即path本身"""
+    if part <= 1:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_{part}{ext}"
+
+
+def existing_parts(path):
+    """按文件分割时已存在的全部文件路径（path、<文件名>_2.xlsx...），path不存在时为空列表"""
+    paths = []
+    while os.path.exists(part_path(path, len(paths) + 1)):
+        paths.append(part_path(path, len(paths) + 1))
+    return paths
+
+
+def column_index(reference):
+    """单元格引用（如"AB12"）的列序号，从0开始"""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+
+def element_text(element):
+    """字符串单元格的文本：普通文本或富文本各段合并，不包括注音"""
+    parts = [node.text or '' for node in element.findall(SHEET_NS + 't')]
+    parts += [node.text or '' for node in element.findall(f'{SHEET_NS}r/{SHEET_NS}t')]
+    return ''.join(parts)
+
+
+def date_styles(archive):
+    """日期格式的单元格样式序号集合"""
+    if 'xl/styles.xml' not in archive.namelist():
+        return set()
+    styles = ET.fromstring(archive.read('xl/styles.xml'))
+    formats = dict(BUILTIN_FORMATS)
+    for num_fmt in styles.iter(SHEET_NS + 'numFmt'):
+        formats[int(num_fmt.get('numFmtId'))] = num_fmt.get('formatCode', '')
+    cell_xfs = styles.find(SHEET_NS + 'cellXfs')
+    if cell_xfs is None:
+        return set()
+    return {index for index, xf in enumerate(cell_xfs.findall(SHEET_NS + 'xf'))
+            if is_date_format(formats.get(int(xf.get('numFmtId', 0)), ''))}
+
+
+def cell_value(cell, shared_strings, dates):
+    cell_type = cell.get('t', 'n')
+    if cell_type == 'inlineStr':
+        inline = cell.find(SHEET_NS + 'is')
+        return element_text(inline) if inline is not None else None
+    value = cell.find(SHEET_NS + 'v')
+    if value is None or value.text is None:
+        return None
+    text = value.text
+    if cell_type == 's':
+        return shared_strings[int(text)]
+    if cell_type == 'b':
+        return text == '1'
+    if cell_type in ('str', 'e', 'd'):
+        return text
+    try:
+        number = int(text)
+    except ValueError:
+        number = float(text)
+    if int(cell.get('s', 0)) in dates:
+        return from_excel(number)
+    return number
+
+
+def iter_xlsx_rows(path):
+    """
+    逐行读取xlsx文件全部工作表的单元格值
+    
+    openpyxl的只读模式读取时仍保留已读过的行元素，内存随行数增长；这里每读完一行即从树中移除。
+    只返回单元格的值，日期格式的数字转换为datetime。
+    
+    Returns:
+        生成器，逐行返回(工作表名称, 单元格值列表)
+    """
+    with zipfile.ZipFile(path) as archive:
+        shared_strings = []
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            with archive.open('xl/sharedStrings.xml') as f:
+                for _, element in ET.iterparse(f):
+                    if element.tag == SHEET_NS + 'si':
+                        shared_strings.append(element_text(element))
+                        element.clear()
+        dates = date_styles(archive)
+
+        relationships = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): rel.get('Target') for rel in relationships}
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        for sheet in workbook.iter(SHEET_NS + 'sheet'):
+            target = targets[sheet.get(RELATIONSHIP_ID)]
+            member = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+            with archive.open(member) as f:
+                sheet_data = None
+                for event, element in ET.iterparse(f, events=('start', 'end')):
+                    if event == 'start':
+                        if element.tag == SHEET_NS + 'sheetData':
+                            sheet_data = element
+                        continue
+                    if element.tag != SHEET_NS + 'row':
+                        continue
+                    values = []
+                    for cell in element.findall(SHEET_NS + 'c'):
+                        reference = cell.get('r')
+                        index = column_index(reference) if reference else len(values)
+                        values.extend([None] * (index - len(values)))
+                        values.append(cell_value(cell, shared_strings, dates))
+                    # 读完的行从父元素中移除，内存占用与行数无关
+                    sheet_data.clear()
+                    yield sheet.get('name'), values
+
+
+class StreamingExcelWriter:
+    def __init__(self, path, columns, max_rows=EXCEL_MAX_ROWS - 1, rollover='sheet', sheet_name='videos',
+                 max_cell_chars=EXCEL_MAX_CELL_CHARS, spill_dir=None, first_part=1):
+        """
+        逐行写入xlsx文件（openpyxl只写模式），内存占用与行数无关
+
+        工作表写满max_rows行数据后换到新的工作表（rollover='sheet'，名称为videos_2、videos_3...）
+        或新的文件（rollover='file'，文件名为<文件名>_2.xlsx...）。
+        超过单元格字符数上限的文本写入spill_dir下的文本文件，单元格中保留开头部分和文件的相对路径。
+        每个文件先写入.part临时文件，完成后重命名。
+
+        Args:
+            path: 输出文件路径
+            columns: 列名列表
+            max_rows: 每个工作表的数据行数上限
+            rollover: 'sheet' 或 'file'
+            sheet_name: 工作表名称
+            max_cell_chars: 单元格的字符数上限
+            spill_dir: 超长文本的保存目录，默认为<文件名>_cells
+            first_part: 第一个输出文件的序号（按文件分割时续写已有的文件序列）
+        """
+        if rollover not in ROLLOVER_MODES:
+            raise ValueError(f"Unknown rollover mode: {rollover}")
+        self.path = path
+        self.columns = list(columns)
+        self.max_rows = max(1, min(max_rows, EXCEL_MAX_ROWS - 1))
+        self.rollover = rollover
+        self.sheet_name = sheet_name
+        self.max_cell_chars = max_cell_chars
+        self.spill_dir = spill_dir or os.path.splitext(path)[0] + '_cells'
+        self.part = first_part - 1
+        self.sheets = 0
+        self.workbook = None
+        self.sheet = None
+        self.sheet_rows = 0
+        self.rows = 0
+        self.spilled = 0
+        self.files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def current_path(self):
+        return part_path(self.path, self.part)
+
+    def _save(self):
+        """保存当前文件：先写临时文件再重命名"""
+        if self.workbook is None:
+            return
+        path = self.current_path()
+        temp_path = path + '.part'
+        self.workbook.save(temp_path)
+        os.replace(temp_path, path)
+        self.files.append(path)
+        self.workbook = None
+        self.sheet = None
+
+    def _new_sheet(self):
+        if self.workbook is None or self.rollover == 'file':
+            self._save()
+            self.workbook = Workbook(write_only=True)
+            self.part += 1
+            self.sheets = 0
+        self.sheets += 1
+        title = self.sheet_name if self.sheets == 1 else f"{self.sheet_name}_{self.sheets}"
+        self.sheet = self.workbook.create_sheet(title)
+        self.sheet.append(self.columns)
+        self.sheet_rows = 0
+
+    def _spill(self, record, column, text):
+        """将超长文本写入单独的文件，返回单元格中保留的内容"""
+        os.makedirs(self.spill_dir, exist_ok=True)
+        key = f"{record.get('platform') or 'row'}_{record.get('video_id') or self.rows + 1}_{column}"
+        file_path = os.path.join(self.spill_dir, re.sub(r'[\\/:*?"<>|\s]+', '_', key) + '.txt')
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        self.spilled += 1
+        reference = os.path.relpath(file_path, os.path.dirname(os.path.abspath(self.path)))
+        return f"{text[:SPILL_EXCERPT_CHARS]}… [全文: {reference}]"
+
+    def _cell(self, record, column):
+        value = record.get(column)
+        if isinstance(value, str):
+            # openpyxl拒绝写入控制字符
+            value = ILLEGAL_CHARACTERS_RE.sub('', value)
+            if len(value) > self.max_cell_chars:
+                value = self._spill(record, column, value)
+        elif isinstance(value, (list, tuple, dict)):
+            value = str(value)
+        return value
+
+    def write(self, record):
+        """写入一行，record为列名到值的字典"""
+        if self.sheet is None or self.sheet_rows >= self.max_rows:
+            self._new_sheet()
+        self.sheet.append([self._cell(record, column) for column in self.columns])
+        self.sheet_rows += 1
+        self.rows += 1
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def append_sheet(self, title, columns, records):
+        """
+        在最后一个文件中追加一个单独的工作表（例如汇总表），在写完全部数据行之后调用
+
+        汇总表不分割，超过工作表行数上限的部分不写入。
+
+        Returns:
+            写入的行数
+        """
+        if self.workbook is None:
+            self._new_sheet()
+        sheet = self.workbook.create_sheet(title)
+        sheet.append(list(columns))
+        rows = 0
+        for record in records:
+            if rows >= EXCEL_MAX_ROWS - 1:
+                logger.warning(f"Sheet {title} truncated at {rows} rows")
+                break
+            sheet.append([self._cell(record, column) for column in columns])
+            rows += 1
+        return rows
+
+    def copy_from(self, source_path):
+        """
+        逐行复制已有文件中全部工作表的数据，不整体载入内存
+
+        必须在写入任何数据之前调用；已有文件中多出的列追加到列名列表末尾。
+        """
+        current_sheet = None
+        header = None
+        for sheet_name, values in iter_xlsx_rows(source_path):
+            if sheet_name != current_sheet:
+                # 每个工作表的第一行是表头
+                current_sheet = sheet_name
+                header = [str(name) if name is not None else None for name in values]
+                if self.rows == 0 and self.sheet is None:
+                    self.columns += [name for name in header if name and name not in self.columns]
+                continue
+            if any(value is not None for value in values):
+                self.write({name: value for name, value in zip(header, values) if name})
+
+    def close(self):
+        """
+        保存最后一个文件
+
+        Returns:
+            写入的文件路径列表
+        """
+        if self.workbook is None and not self.files:
+            # 没有任何数据时也写出只有表头的文件
+            self._new_sheet()
+        self._save()
+        return self.files
+
+    def abort(self):
+        """放弃当前未保存的文件"""
+        self.workbook = None
+        self.sheet = None
+
+
 class ExcelExporter:
-    def __init__(self, excel_path=None):
+    def __init__(self, excel_path=None, streaming=False, max_rows=EXCEL_MAX_ROWS - 1, rollover='sheet'):
         """
         初始化Excel导出器
         
         Args:
             excel_path: Excel文件路径，如果不提供则使用默认路径
+            streaming: 使用逐行写入（StreamingExcelWriter），内存占用不随已有行数增长，
+                       并按max_rows分割工作表或文件、将超长字幕写入单独文件
+            max_rows: 流式写入时每个工作表的数据行数上限
+            rollover: 流式写入时超出行数后 'sheet' 新建工作表，'file' 新建文件
         """
+        self.streaming = streaming
+        self.max_rows = max_rows
+        self.rollover = rollover
         if excel_path:
             self.excel_path = excel_path
         else:
@@ -22,6 +337,45 @@ class ExcelExporter:
         """设置Excel文件路径"""
         self.excel_path = excel_path
     
+    def set_streaming(self, streaming, max_rows=None, rollover=None):
+        """切换流式写入，并可修改分割的行数和方式"""
+        if rollover is not None and rollover not in ROLLOVER_MODES:
+            raise ValueError(f"Unknown rollover mode: {rollover}")
+        self.streaming = streaming
+        if max_rows:
+            self.max_rows = max_rows
+        if rollover:
+            self.rollover = rollover
+    
+    def export_streaming(self, data_items):
+        """
+        流式追加数据项：逐行复制已有文件的数据，再写入新数据
+        
+        按文件分割时已写满的文件保持不变，只重写最后一个文件。
+        
+        Returns:
+            是否成功导出
+        """
+        last_part = 1
+        if self.rollover == 'file':
+            while os.path.exists(part_path(self.excel_path, last_part + 1)):
+                last_part += 1
+        existing_path = part_path(self.excel_path, last_part)
+        writer = StreamingExcelWriter(self.excel_path, self.get_column_order(), self.max_rows,
+                                      self.rollover, first_part=last_part)
+        try:
+            with writer:
+                if os.path.exists(existing_path):
+                    writer.copy_from(existing_path)
+                writer.write_many(data_items)
+        except Exception as e:
+            logger.error(f"Error exporting data to Excel: {e}")
+            return False
+        if writer.spilled:
+            logger.info(f"{writer.spilled} oversized cells written to {writer.spill_dir}")
+        logger.info(f"Data exported to {', '.join(writer.files)}")
+        return True
+    
     def export_single_item(self, data):
         """
         导出单个数据项到Excel
@@ -32,6 +386,8 @@ class ExcelExporter:
         Returns:
             是否成功导出
         """
+        if self.streaming:
+            return self.export_streaming([data])
         try:
             # 将数据转换为DataFrame
             df = pd.DataFrame([data])
@@ -68,6 +424,8 @@ class ExcelExporter:
         if not data_items:
             logger.warning("No data items to export")
             return False
+        if self.streaming:
+            return self.export_streaming(data_items)
         
         try:
             # 将数据转换为DataFrame
@@ -0,0 +1,176 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from utils.common import logger
+
+# 决定页面内容的登录相关cookies，登录身份不同的页面分开缓存
+IDENTITY_COOKIES = ('sessionid', 'sessionid_ss', 'sid_tt', 'uid_tt', 'passport_auth_status')
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    encoding TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_access ON entries (last_access);
+"""
+
+
+def normalize_url(url):
+    """规范化URL：协议和域名小写，去掉片段，查询参数排序"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    path = parts.path or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ''))
+
+
+def cookie_identity(cookies):
+    """根据登录相关cookies计算身份标识，未登录时为空字符串"""
+    if not cookies:
+        return ''
+    # 遍历cookie jar而不是按名称取值：不同域名设置了同名cookie时，jar.get()会抛出CookieConflictError
+    pairs = cookies.items() if isinstance(cookies, dict) else ((cookie.name, cookie.value) for cookie in cookies)
+    values = sorted({f"{name}={value}" for name, value in pairs if name in IDENTITY_COOKIES and value})
+    if not values:
+        return ''
+    return hashlib.sha256('&'.join(values).encode('utf-8')).hexdigest()[:16]
+
+
+class ResponseCache:
+    def __init__(self, cache_dir='cache', ttl=3600, max_bytes=512 * 1024 * 1024):
+        """
+        元数据页面的磁盘缓存
+
+        页面内容用zlib压缩后按键的哈希分目录保存，索引保存在SQLite中；
+        超过容量上限时按最近访问时间淘汰。
+
+        Args:
+            cache_dir: 缓存目录
+            ttl: 缓存有效期（秒），过期后需要向服务器重新验证
+            max_bytes: 压缩后内容的总容量上限
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(cache_dir, 'index.db'), check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(INDEX_SCHEMA)
+
+    def make_key(self, url, cookies=None):
+        """缓存键：规范化URL加登录身份"""
+        raw = normalize_url(url) + '|' + cookie_identity(cookies)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _body_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.z')
+
+    def get(self, url, cookies=None):
+        """
+        读取缓存
+
+        Returns:
+            {'body', 'encoding', 'etag', 'last_modified', 'fresh'}，没有缓存时返回None
+        """
+        key = self.make_key(url, cookies)
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            self.connection.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.connection.commit()
+        try:
+            with open(self._body_path(key), 'rb') as f:
+                body = zlib.decompress(f.read())
+        except (OSError, zlib.error) as e:
+            logger.warning(f"Cache entry for {url} is unreadable: {e}")
+            self.delete(key)
+            return None
+        return {
+            'body': body,
+            'encoding': row['encoding'],
+            'etag': row['etag'],
+            'last_modified': row['last_modified'],
+            'fresh': time.time() - row['stored_at'] < self.ttl
+        }
+
+    def put(self, url, cookies, body, encoding=None, etag=None, last_modified=None):
+        """写入缓存，已存在时覆盖"""
+        key = self.make_key(url, cookies)
+        path = self._body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = zlib.compress(bytes(body), 6)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (key, url, size, encoding, etag, last_modified, stored_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, normalize_url(url), len(data), encoding, etag, last_modified, now, now))
+            self.connection.commit()
+        self.evict()
+
+    def touch(self, url, cookies=None):
+        """服务器确认内容未变化（304）时，重新开始计算有效期"""
+        key = self.make_key(url, cookies)
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                "UPDATE entries SET stored_at = ?, last_access = ? WHERE key = ?", (now, now, key))
+            self.connection.commit()
+
+    def delete(self, key):
+        """删除一条缓存"""
+        with self.lock:
+            self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.connection.commit()
+        try:
+            os.remove(self._body_path(key))
+        except OSError:
+            pass
+
+    def total_size(self):
+        """缓存内容总字节数（压缩后）"""
+        with self.lock:
+            return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self):
+        """超过容量上限时，按最近访问时间从旧到新淘汰"""
+        excess = self.total_size() - self.max_bytes
+        if excess <= 0:
+            return
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT key, size FROM entries ORDER BY last_access").fetchall()
+        for row in rows:
+            if excess <= 0:
+                break
+            self.delete(row['key'])
+            excess -= row['size']
+
+    def iter_entries(self):
+        """遍历全部缓存，返回(url, body, encoding)，用于离线重放"""
+        with self.lock:
+            rows = self.connection.execute("SELECT key, url, encoding FROM entries ORDER BY stored_at").fetchall()
+        for row in rows:
+            try:
+                with open(self._body_path(row['key']), 'rb') as f:
+                    body = zlib.decompress(f.read())
+            except (OSError, zlib.error):
+                continue
+            yield row['url'], body, row['encoding']
@@ -1,9 +1,23 @@
 import re
+import threading
 import requests
 from urllib.parse import urlparse, parse_qs
+from core.batch_scheduler import OperationCancelled, wait_cancellable
+
+# 分享文本中的链接
+URL_PATTERN = re.compile(r'https?://[^\s<>"\'，。！]+')
+
+# 抖音作品的数字ID：页面地址 /video/<ID>、分享页 /share/video/<ID>、以及 modal_id 等参数
+DOUYIN_ID_PATTERNS = [
+    re.compile(r'douyin\.com/(?:share/)?(?:video|note)/(\d+)'),
+    re.compile(r'[?&](?:modal_id|vid|aweme_id|item_ids)=(\d+)'),
+]
 
 class LinkParser:
     def __init__(self):
+        # 短链接解析结果，同一个短链接只请求一次
+        self.resolved = {}
+        self.resolved_lock = threading.Lock()
         # 各平台的链接正则表达式
         self.patterns = {
             'douyin': r'(?:https?://)?(?:www\.)?(?:v\.douyin\.com|douyin\.com)/(?:[^/]+/)?([^/\s?]+)',
@@ -12,26 +26,40 @@ class LinkParser:
             'weishi': r'(?:https?://)?(?:www\.)?weishi\.qq\.com/(?:\w+/)?([^/\s?]+)'
         }
     
-    def parse_link(self, link):
+    def parse_link(self, link, cancel_token=None):
         """
         解析链接，返回平台名称和视频ID
+
+        cancel_token被取消时不再等待短链接跳转，抛出OperationCancelled
         """
         # 清理链接，去除多余空格和换行符
         link = link.strip()
         
+        # 分享文本（标题、话题和链接混在一起）中只取链接
+        match = URL_PATTERN.search(link)
+        if match:
+            link = match.group(0)
+        
         # 检查是否是短链接并需要重定向
         if 'v.douyin.com' in link or any(domain in link for domain in ['t.cn', 'b23.tv', 'dwz.cn']):
-            try:
-                response = requests.head(link, allow_redirects=True, timeout=10)
-                link = response.url
-            except Exception as e:
-                raise Exception(f"解析短链接失败: {str(e)}")
+            link = self.resolve_short_link(link, cancel_token)
         
         # 识别平台
         platform = None
         video_id = None
         
+        # 抖音的同一作品有多种链接形式，优先取数字ID，保证不同形式的链接得到同一个ID
+        if 'douyin.com' in link:
+            for pattern in DOUYIN_ID_PATTERNS:
+                match = pattern.search(link)
+                if match:
+                    platform = 'douyin'
+                    video_id = match.group(1)
+                    break
+        
         for platform_name, pattern in self.patterns.items():
+            if video_id:
+                break
             match = re.search(pattern, link)
             if match:
                 platform = platform_name
@@ -61,6 +89,21 @@ class LinkParser:
             'original_url': link
         }
     
+    def resolve_short_link(self, link, cancel_token=None):
+        """请求短链接得到跳转后的地址，结果在本解析器中保留"""
+        with self.resolved_lock:
+            if link in self.resolved:
+                return self.resolved[link]
+        try:
+            response = wait_cancellable(lambda: requests.head(link, allow_redirects=True, timeout=10), cancel_token)
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            raise Exception(f"解析短链接失败: {str(e)}")
+        with self.resolved_lock:
+            self.resolved[link] = response.url
+        return response.url
+    
     def batch_parse_links(self, links):
         """
         批量解析多个链接
@@ -0,0 +1,259 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+import subprocess
+from utils.common import logger
+
+# 任务优先级，数值越小越先执行
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+
+class MediaJobScheduler:
+    def __init__(self, max_slots=None, threads_per_job=None, default_timeout=600):
+        """
+        ffmpeg任务调度器，限制同时运行的ffmpeg进程数和每个进程的线程数
+
+        Args:
+            max_slots: 同时运行的进程数，默认按CPU核数和每个任务的线程数计算
+            threads_per_job: 每个ffmpeg进程使用的线程数
+            default_timeout: 默认超时秒数，超时后结束进程
+        """
+        cpu_count = os.cpu_count() or 1
+        self.threads_per_job = threads_per_job or max(1, min(4, cpu_count // 2))
+        self.max_slots = max_slots or max(1, cpu_count // self.threads_per_job)
+        self.default_timeout = default_timeout
+
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.running = 0
+        self.sequence = itertools.count()
+
+        # 运行统计
+        self.job_count = 0
+        self.timeout_count = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+    def _acquire_slot(self, priority, cancel_token=None):
+        """按优先级等待空闲的进程名额，同优先级先到先得；cancel_token取消时放弃等待并抛出OperationCancelled"""
+        ticket = (priority, next(self.sequence))
+        if cancel_token:
+            cancel_token.on_cancel(self._wake_waiters)
+        try:
+            with self.condition:
+                heapq.heappush(self.waiting, ticket)
+                while self.running >= self.max_slots or self.waiting[0] != ticket:
+                    if cancel_token and cancel_token.cancelled:
+                        # 离开队列，让排在后面的任务继续检查
+                        self.waiting.remove(ticket)
+                        heapq.heapify(self.waiting)
+                        self.condition.notify_all()
+                        cancel_token.raise_if_cancelled()
+                    self.condition.wait()
+                heapq.heappop(self.waiting)
+                self.running += 1
+                # 还有空闲名额时让下一个等待的任务继续检查
+                self.condition.notify_all()
+        finally:
+            if cancel_token:
+                cancel_token.remove_callback(self._wake_waiters)
+
+    def _wake_waiters(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def _release_slot(self):
+        with self.condition:
+            self.running -= 1
+            self.condition.notify_all()
+
+    def add_thread_limit(self, cmd, threads):
+        """在ffmpeg命令中加入解码和编码线程数限制"""
+        if '-threads' in cmd:
+            return list(cmd)
+        return [cmd[0], '-threads', str(threads)] + list(cmd[1:-1]) + ['-threads', str(threads), cmd[-1]]
+
+    def _communicate(self, process, timeout, activity=None, idle_timeout=None):
+        """
+        等待进程结束并读取输出，超时时结束进程；返回(stdout, stderr, 是否超时)
+
+        提供activity（{'last': 最近一次写入输入的时间}）和idle_timeout时，超过idle_timeout秒没有写入也结束进程
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            now = time.monotonic()
+            waits = []
+            if deadline is not None:
+                waits.append(deadline - now)
+            if activity is not None and idle_timeout:
+                waits.append(activity['last'] + idle_timeout - now)
+            wait = min(waits) if waits else None
+            if wait is not None and wait <= 0:
+                break
+            try:
+                stdout, stderr = process.communicate(timeout=wait)
+                return stdout, stderr, False
+            except subprocess.TimeoutExpired:
+                # 期间有新的输入时继续等待
+                continue
+        process.kill()
+        try:
+            stdout, stderr = process.communicate(timeout=5)
+        except subprocess.TimeoutExpired:
+            # 子进程仍占用输出管道时放弃读取剩余输出
+            stdout, stderr = b'', b''
+        return stdout, stderr, True
+
+    def _feed(self, process, input_stream, fd, activity):
+        """
+        在调用线程中把input_stream的数据块写入进程的标准输入，写完后关闭管道；每次写入后更新activity['last']
+
+        Returns:
+            读取输入时的异常，没有异常时为None
+        """
+        try:
+            for chunk in input_stream:
+                view = memoryview(chunk)
+                while view:
+                    view = view[os.write(fd, view):]
+                    activity['last'] = time.monotonic()
+        except BrokenPipeError:
+            # 进程已退出（出错、超时或被取消），不再读取输入，结果以退出码为准
+            pass
+        except Exception as e:
+            # 输入不完整时ffmpeg仍可能正常生成截断的文件，结束进程让任务失败
+            process.kill()
+            return e
+        finally:
+            os.close(fd)
+            # 输入结束后ffmpeg写完输出的时间同样受idle_timeout限制
+            activity['last'] = time.monotonic()
+        return None
+
+    def run(self, cmd, priority=PRIORITY_NORMAL, timeout=None, threads=None, name=None, cancel_token=None,
+            input_stream=None, limited=True, idle_timeout=None):
+        """
+        排队执行一个ffmpeg命令，阻塞直到执行结束
+
+        Args:
+            cmd: 命令参数列表，最后一个参数为输出文件
+            priority: 优先级，数值越小越先执行
+            timeout: 超时秒数，超时后结束进程；不提供时使用default_timeout，
+                     有input_stream时不限制总时长（运行时间取决于输入速度，例如限速下载），由idle_timeout限制
+            threads: ffmpeg线程数，默认使用threads_per_job
+            name: 任务名称，用于日志
+            cancel_token: 取消标记（core.batch_scheduler.CancelToken），排队时取消抛出OperationCancelled，
+                          运行时取消结束进程
+            input_stream: 写入进程标准输入的数据块（bytes或memoryview）迭代器，在调用线程中读取，
+                          命令中的输入应为pipe:0
+            limited: 是否占用进程名额；只复制数据流、不转码的任务几乎不占CPU，
+                     运行时间取决于输入速度，可以不排队
+            idle_timeout: 有input_stream时，超过这么多秒没有写入输入就结束进程，默认为default_timeout
+
+        Returns:
+            结果字典：returncode, stdout, stderr, timed_out, wait_time, run_time,
+            input_error（读取input_stream时的异常，没有时为None）
+        """
+        cmd = self.add_thread_limit(cmd, threads or self.threads_per_job)
+        if input_stream is None:
+            timeout = timeout or self.default_timeout
+        else:
+            idle_timeout = idle_timeout or self.default_timeout
+        name = name or os.path.basename(cmd[-1])
+
+        queued_at = time.perf_counter()
+        if limited:
+            self._acquire_slot(priority, cancel_token)
+        started_at = time.perf_counter()
+        input_error = None
+        process = None
+        try:
+            if input_stream is None:
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            else:
+                read_fd, write_fd = os.pipe()
+                try:
+                    process = subprocess.Popen(cmd, stdin=read_fd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                except Exception:
+                    os.close(write_fd)
+                    raise
+                finally:
+                    os.close(read_fd)
+            if cancel_token:
+                cancel_token.on_cancel(process.kill)
+            if input_stream is None:
+                stdout, stderr, timed_out = self._communicate(process, timeout)
+            else:
+                # 另一个线程读取输出，避免输出管道写满时进程停止读取输入
+                outputs = []
+                activity = {'last': time.monotonic()}
+                reader = threading.Thread(
+                    target=lambda: outputs.extend(self._communicate(process, timeout, activity, idle_timeout)),
+                    daemon=True)
+                reader.start()
+                input_error = self._feed(process, input_stream, write_fd, activity)
+                reader.join()
+                stdout, stderr, timed_out = outputs
+        finally:
+            if cancel_token and process is not None:
+                cancel_token.remove_callback(process.kill)
+            if limited:
+                self._release_slot()
+        finished_at = time.perf_counter()
+
+        result = {
+            'returncode': process.returncode,
+            'stdout': stdout,
+            'stderr': stderr,
+            'timed_out': timed_out,
+            'wait_time': started_at - queued_at,
+            'run_time': finished_at - started_at,
+            'input_error': input_error
+        }
+        with self.condition:
+            self.job_count += 1
+            self.timeout_count += int(timed_out)
+            self.total_wait += result['wait_time']
+            self.total_run += result['run_time']
+
+        if timed_out:
+            if input_stream is not None:
+                limit = f"no input for {idle_timeout}s" + (f" or {timeout}s total" if timeout else "")
+                logger.error(f"FFmpeg job {name} killed: {limit}")
+            else:
+                logger.error(f"FFmpeg job {name} killed after {timeout}s timeout")
+        logger.info(f"FFmpeg job {name}: waited {result['wait_time']:.2f}s, ran {result['run_time']:.2f}s",
+                    extra={'item_id': name, 'stage': 'ffmpeg', 'duration': round(result['run_time'], 4)})
+        return result
+
+    def get_stats(self):
+        """获取排队和运行耗时统计"""
+        with self.condition:
+            count = self.job_count
+            return {
+                'max_slots': self.max_slots,
+                'threads_per_job': self.threads_per_job,
+                'jobs': count,
+                'timeouts': self.timeout_count,
+                'running': self.running,
+                'queued': len(self.waiting),
+                'avg_wait': self.total_wait / count if count else 0.0,
+                'avg_run': self.total_run / count if count else 0.0
+            }
+
+
+_shared_scheduler = None
+_shared_lock = threading.Lock()
+
+
+def get_media_scheduler():
+    """获取进程内共享的ffmpeg任务调度器"""
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None:
+            _shared_scheduler = MediaJobScheduler()
+        return _shared_scheduler
@@ -0,0 +1,276 @@
+import os
+import csv
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from openpyxl import load_workbook
+from core.link_parser import LinkParser
+from core.excel_exporter import existing_parts, iter_xlsx_rows
+from utils.common import logger
+
+# 需要刷新的互动数据列
+STAT_COLUMNS = ['likes', 'comments', 'favorites', 'shares']
+
+# 各平台视频详情页地址模板
+VIDEO_URL_TEMPLATES = {
+    'douyin': 'https://www.douyin.com/video/{video_id}'
+}
+
+
+class MetricsRefresher:
+    def __init__(self, content_fetcher, link_parser=None, record_store=None, max_workers=16):
+        """
+        初始化互动数据刷新器
+
+        Args:
+            content_fetcher: 用于获取视频信息的ContentFetcher实例
+            link_parser: 用于补全旧数据中缺失视频ID的LinkParser实例
+            record_store: 本地数据库（RecordStore），提供时同步更新其中的互动数据
+            max_workers: 并发获取视频信息的线程数
+        """
+        self.content_fetcher = content_fetcher
+        self.link_parser = link_parser or LinkParser()
+        self.record_store = record_store
+        self.max_workers = max_workers
+
+    def get_history_path(self, excel_path):
+        """获取互动数据时间序列文件路径（与Excel文件同目录）"""
+        return os.path.splitext(excel_path)[0] + '_metrics.csv'
+
+    def build_video_url(self, platform, video_id, source_url=''):
+        """根据平台和视频ID构造详情页地址"""
+        template = VIDEO_URL_TEMPLATES.get(platform)
+        if template and video_id:
+            return template.format(video_id=video_id)
+        return source_url
+
+    def resolve_key(self, platform, video_id, source_url):
+        """确定(platform, video_id)，旧数据缺失时从源链接解析"""
+        if platform and platform != 'unknown' and video_id:
+            return platform, str(video_id)
+        if not source_url:
+            return None
+        try:
+            link_info = self.link_parser.parse_link(source_url)
+            return link_info['platform'], str(link_info['video_id'])
+        except Exception as e:
+            logger.warning(f"Cannot resolve video id from {source_url}: {e}")
+            return None
+
+    def load_history(self, history_path):
+        """读取每个视频最近一次记录的互动数据"""
+        latest = {}
+        if not os.path.exists(history_path):
+            return latest
+        try:
+            with open(history_path, 'r', newline='', encoding='utf-8') as f:
+                for row in csv.DictReader(f):
+                    key = (row['platform'], row['video_id'])
+                    latest[key] = {col: _to_int(row.get(col)) for col in STAT_COLUMNS}
+        except Exception as e:
+            logger.error(f"Error reading metrics history: {e}")
+        return latest
+
+    def append_history(self, history_path, records):
+        """追加互动数据记录，每条只包含一个视频一次变化后的计数"""
+        if not records:
+            return
+        write_header = not os.path.exists(history_path)
+        with open(history_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if write_header:
+                writer.writerow(['timestamp', 'platform', 'video_id'] + STAT_COLUMNS)
+            for timestamp, (platform, video_id), stats in records:
+                writer.writerow([timestamp, platform, video_id] + [stats[col] for col in STAT_COLUMNS])
+
+    def fetch_stats(self, targets, progress_callback=None):
+        """
+        并发获取视频的最新互动数据，只请求元数据，不下载视频
+
+        Args:
+            targets: {(platform, video_id): url} 字典
+            progress_callback: 每完成一个视频调用一次，参数为(已完成数, 总数)
+
+        Returns:
+            {(platform, video_id): stats} 字典，获取失败的视频不包含在内
+        """
+        results = {}
+        total = len(targets)
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.content_fetcher.fetch_video_info, platform, video_id, url,
+                                revalidate=True): (platform, video_id)
+                for (platform, video_id), url in targets.items()
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                done += 1
+                try:
+                    video_info = future.result()
+                except Exception as e:
+                    logger.error(f"Error refreshing {key}: {e}")
+                    video_info = None
+                if video_info and not video_info.get('login_required') and 'stats' in video_info:
+                    results[key] = {col: _to_int(video_info['stats'].get(col)) for col in STAT_COLUMNS}
+                if progress_callback:
+                    progress_callback(done, total)
+        return results
+
+    def header_columns(self, header):
+        """根据表头得到{列名: 列序号}和缺少的列"""
+        columns = {name: index for index, name in enumerate(header) if name}
+        missing = [col for col in STAT_COLUMNS + ['source_url'] if col not in columns]
+        return columns, missing
+
+    def row_key(self, values, columns, resolved):
+        """确定一行数据对应的(platform, video_id)，从源链接解析的结果保存在resolved中，第二次读取时不再解析"""
+        source_url = _cell(values, columns, 'source_url') or ''
+        platform = _cell(values, columns, 'platform')
+        video_id = _cell(values, columns, 'video_id')
+        if platform and platform != 'unknown' and video_id:
+            return platform, str(video_id)
+        if source_url not in resolved:
+            resolved[source_url] = self.resolve_key(platform, video_id, source_url)
+        return resolved[source_url]
+
+    def refresh(self, excel_path, progress_callback=None):
+        """
+        刷新Excel中已采集视频的互动数据
+
+        只修改数据发生变化的单元格，未变化的行保持不动；
+        每个视频的计数变化追加到时间序列文件中。
+        按文件分割导出的后续文件（<文件名>_2.xlsx...）一起刷新：先逐行读取全部文件收集视频，
+        同一视频只请求一次，再逐个文件更新，同一时间只有一个文件在内存中。
+
+        Args:
+            excel_path: 已有的Excel文件路径
+            progress_callback: 进度回调，参数为(已完成数, 总数)
+
+        Returns:
+            刷新结果统计字典，失败时返回None
+        """
+        if not os.path.exists(excel_path):
+            logger.error(f"Excel file not found: {excel_path}")
+            return None
+
+        try:
+            paths = existing_parts(excel_path)
+            # 收集需要刷新的视频，同一视频的多行只请求一次
+            targets = {}
+            resolved = {}
+            skipped = {}
+            qualified = 0
+            for path in paths:
+                # 数据超过行数上限时分布在多个工作表中，逐个处理包含所需列的工作表
+                current_sheet = None
+                columns = None
+                for sheet_name, values in iter_xlsx_rows(path):
+                    if sheet_name != current_sheet:
+                        # 工作表的第一行为表头
+                        current_sheet = sheet_name
+                        columns, missing = self.header_columns(values)
+                        if missing:
+                            skipped[f"{os.path.basename(path)}/{sheet_name}"] = missing
+                            columns = None
+                        else:
+                            qualified += 1
+                        continue
+                    if columns is None:
+                        continue
+                    key = self.row_key(values, columns, resolved)
+                    if key and key not in targets:
+                        targets[key] = self.build_video_url(key[0], key[1],
+                                                            _cell(values, columns, 'source_url') or '')
+            if not qualified:
+                logger.error(f"Excel file is missing columns: {skipped}")
+                return None
+            if skipped:
+                logger.info(f"Skipping sheets without metrics columns: {skipped}")
+
+            logger.info(f"Refreshing metrics for {len(targets)} videos in {len(paths)} file(s)")
+            fresh_stats = self.fetch_stats(targets, progress_callback)
+
+            # 逐个文件只更新变化的单元格，没有变化的文件不重新保存
+            changed_rows = 0
+            for path in paths:
+                if not fresh_stats:
+                    break
+                workbook = load_workbook(path)
+                try:
+                    file_changed_rows = 0
+                    for sheet in workbook.worksheets:
+                        header = next(sheet.iter_rows(min_row=1, max_row=1, values_only=True), ())
+                        columns, missing = self.header_columns(header)
+                        if missing:
+                            continue
+                        for row in sheet.iter_rows(min_row=2):
+                            key = self.row_key([cell.value for cell in row], columns, resolved)
+                            stats = fresh_stats.get(key) if key else None
+                            if stats is not None and self.update_row(row, columns, key, stats):
+                                file_changed_rows += 1
+                    if file_changed_rows:
+                        workbook.save(path)
+                    changed_rows += file_changed_rows
+                finally:
+                    workbook.close()
+
+            # 只记录与上一次不同的计数，保持时间序列紧凑
+            history_path = self.get_history_path(excel_path)
+            latest = self.load_history(history_path)
+            timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+            new_records = [
+                (timestamp, key, stats) for key, stats in fresh_stats.items()
+                if latest.get(key) != stats
+            ]
+            self.append_history(history_path, new_records)
+
+            # 同步更新本地数据库中有变化的记录
+            if self.record_store:
+                for _, (platform, video_id), stats in new_records:
+                    self.record_store.update_stats(platform, video_id, stats)
+
+            summary = {
+                'files': len(paths),
+                'total': len(targets),
+                'fetched': len(fresh_stats),
+                'failed': len(targets) - len(fresh_stats),
+                'changed_rows': changed_rows,
+                'history_records': len(new_records)
+            }
+            logger.info(f"Metrics refresh finished: {summary}")
+            return summary
+        except Exception as e:
+            logger.error(f"Error refreshing metrics: {e}")
+            return None
+
+    def update_row(self, row, columns, key, stats):
+        """把最新计数写入一行中变化的单元格，返回该行是否有修改"""
+        row_changed = False
+        for col in STAT_COLUMNS:
+            cell = row[columns[col]]
+            if _to_int(cell.value) != stats[col]:
+                cell.value = stats[col]
+                row_changed = True
+        if 'platform' in columns and row[columns['platform']].value != key[0]:
+            row[columns['platform']].value = key[0]
+            row_changed = True
+        if 'video_id' in columns and str(row[columns['video_id']].value or '') != key[1]:
+            row[columns['video_id']].value = key[1]
+            row_changed = True
+        return row_changed
+
+
+def _cell(values, columns, name):
+    """按列名取一行中的值；只读方式读取时末尾为空的单元格不在行数据中，按None处理"""
+    index = columns.get(name)
+    if index is None or index >= len(values):
+        return None
+    return values[index]
+
+
+def _to_int(value):
+    """将单元格中的计数转换为整数，无法转换时返回0"""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
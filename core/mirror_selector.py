@@ -0,0 +1,238 @@
+import time
+import threading
+import requests
+from urllib.parse import urlsplit
+from utils.common import logger
+
+
+def mirror_host(url):
+    """镜像地址的主机名，统计数据按主机汇总"""
+    return urlsplit(url).netloc.lower()
+
+
+def read_probe(response, size):
+    """
+    读取响应体开头的size字节（不足时读到结束），与之后按同样方式继续读取的数据首尾相接
+
+    未压缩的响应直接从http.client读取（Downloader.iter_body之后也从这里读取），压缩的响应经过解码。
+    """
+    fp = getattr(response.raw, '_fp', None)
+    if fp is not None and response.headers.get('Content-Encoding', 'identity').lower() in ('', 'identity'):
+        read = fp.read
+    else:
+        read = lambda amount: response.raw.read(amount, decode_content=True)
+    data = bytearray()
+    while len(data) < size:
+        chunk = read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+class MirrorStats:
+    """单个CDN主机的统计：读完试探数据块的耗时和吞吐量的指数移动平均，以及失败率"""
+    def __init__(self, smoothing=0.3):
+        self.smoothing = smoothing
+        self.latency = None
+        self.throughput = None
+        self.failure_rate = 0.0
+        self.requests = 0
+        self.wins = 0
+
+    def _average(self, current, value):
+        if current is None:
+            return value
+        return current + self.smoothing * (value - current)
+
+    def record_latency(self, seconds):
+        self.requests += 1
+        self.latency = self._average(self.latency, seconds)
+        self.failure_rate = self._average(self.failure_rate, 0.0)
+
+    def record_throughput(self, bytes_per_second):
+        self.throughput = self._average(self.throughput, bytes_per_second)
+
+    def record_failure(self):
+        self.requests += 1
+        self.failure_rate = self._average(self.failure_rate, 1.0)
+
+    def expected_time(self, size, default_latency):
+        """下载size字节的预计耗时，失败率越高越长；还没有成功请求过时延迟按default_latency计算"""
+        seconds = self.latency if self.latency is not None else default_latency
+        if self.throughput:
+            seconds += size / self.throughput
+        return seconds / max(0.05, 1.0 - self.failure_rate)
+
+
+class MirrorSelector:
+    def __init__(self, headers=None, max_hedges=3, hedge_delay=0.5, min_hedge_delay=0.1,
+                 typical_size=8 * 1024 * 1024, probe_size=256 * 1024):
+        """
+        在多个CDN镜像地址之间选择下载地址
+
+        先请求排名最高的镜像，在hedge_delay内没有读完开头的试探数据块时再请求下一个，
+        最先读完试探数据块的请求胜出（响应快但传输慢的镜像不会胜出），继续在它上面下载，其余请求关闭。
+        各主机的延迟、吞吐量和失败率在整个运行期间累计，用于给后续下载的镜像排序。
+
+        Args:
+            headers: 请求头
+            max_hedges: 每次下载最多同时尝试的镜像数
+            hedge_delay: 没有统计数据时，等待多久后请求下一个镜像（秒）
+            min_hedge_delay: 根据统计数据调整等待时间时的下限（秒）
+            typical_size: 排序时假设的文件大小（字节）
+            probe_size: 试探数据块大小（字节），胜出请求读到的部分交给调用方写入
+        """
+        self.headers = headers or {}
+        self.max_hedges = max_hedges
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.typical_size = typical_size
+        self.probe_size = probe_size
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def _stats(self, url):
+        host = mirror_host(url)
+        if host not in self.stats:
+            self.stats[host] = MirrorStats()
+        return self.stats[host]
+
+    def rank(self, urls):
+        """
+        按预计下载耗时排序，同等情况下保持原顺序
+
+        没有统计数据的主机按延迟等于hedge_delay估计：排在已知较快的主机之后，
+        但在已知较慢或经常失败的主机之前。
+        """
+        unique = list(dict.fromkeys(url for url in urls if url))
+        with self.lock:
+            estimates = {url: self._stats(url).expected_time(self.typical_size, self.hedge_delay)
+                         for url in unique}
+        return sorted(unique, key=lambda url: estimates[url])
+
+    def get_hedge_delay(self, url):
+        """请求下一个镜像前的等待时间：该主机通常读完试探数据块耗时的两倍"""
+        with self.lock:
+            latency = self._stats(url).latency
+        if latency is None:
+            return self.hedge_delay
+        return max(self.min_hedge_delay, min(self.hedge_delay, latency * 2))
+
+    def record_transfer(self, url, size, seconds):
+        """下载完成后记录吞吐量"""
+        if size <= 0 or seconds <= 0:
+            return
+        with self.lock:
+            self._stats(url).record_throughput(size / seconds)
+
+    def record_failure(self, url):
+        with self.lock:
+            self._stats(url).record_failure()
+
+    def open(self, urls, timeout=30, cancel_token=None):
+        """
+        对镜像发起对冲请求，返回最先读完试探数据块的一个
+
+        Args:
+            urls: 候选地址列表
+            timeout: 单个请求的超时（秒）
+            cancel_token: 取消标记，取消时放弃等待并抛出OperationCancelled
+
+        Returns:
+            (response, url, probe)，response为已开始的流式响应，probe为已读取的开头部分，
+            调用方从response继续读取其余部分
+
+        Raises:
+            requests.RequestException: 所有镜像都失败
+        """
+        candidates = self.rank(urls)[:self.max_hedges]
+        if not candidates:
+            raise requests.RequestException("No mirror URL")
+
+        lock = threading.Lock()
+        changed = threading.Event()
+        race = {'winner': None, 'done': False, 'launched': 0, 'finished': 0, 'errors': []}
+
+        def attempt(url):
+            start = time.perf_counter()
+            response = None
+            try:
+                response = requests.get(url, headers=self.headers, stream=True, timeout=timeout)
+                response.raise_for_status()
+                probe = read_probe(response, self.probe_size)
+            except Exception as e:
+                if response is not None:
+                    response.close()
+                with lock:
+                    abandoned = race['done']
+                # 已有其他镜像胜出后被关闭的请求不算失败
+                if not abandoned:
+                    self.record_failure(url)
+                with lock:
+                    race['finished'] += 1
+                    race['errors'].append(f"{mirror_host(url)}: {e}")
+                changed.set()
+                return
+            with self.lock:
+                self._stats(url).record_latency(time.perf_counter() - start)
+            with lock:
+                race['finished'] += 1
+                if not race['done']:
+                    race['winner'] = (response, url, probe)
+                    race['done'] = True
+                    changed.set()
+                    return
+            # 已有其他镜像胜出或下载已取消
+            response.close()
+
+        def launch(url):
+            with lock:
+                race['launched'] += 1
+            threading.Thread(target=attempt, args=(url,), daemon=True).start()
+
+        launch(candidates[0])
+        next_index = 1
+        while True:
+            if next_index < len(candidates):
+                wait = self.get_hedge_delay(candidates[next_index - 1])
+            else:
+                wait = 0.5
+            changed.wait(wait)
+            changed.clear()
+            with lock:
+                winner = race['winner']
+                idle = race['finished'] == race['launched']
+                if cancel_token and cancel_token.cancelled and not winner:
+                    race['done'] = True
+            if winner:
+                break
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            if next_index < len(candidates):
+                # 等待超时或已发出的请求都失败了，请求下一个镜像
+                launch(candidates[next_index])
+                next_index += 1
+            elif idle:
+                raise requests.RequestException("All mirrors failed: " + "; ".join(race['errors']))
+
+        response, url, probe = winner
+        with self.lock:
+            self._stats(url).wins += 1
+        if url != candidates[0] or race['launched'] > 1:
+            logger.info(f"Mirror {mirror_host(url)} was fastest among {race['launched']} requests")
+        return response, url, probe
+
+    def get_stats(self):
+        """各主机的统计数据"""
+        with self.lock:
+            return {
+                host: {
+                    'requests': stats.requests,
+                    'wins': stats.wins,
+                    'latency': stats.latency,
+                    'throughput': stats.throughput,
+                    'failure_rate': round(stats.failure_rate, 3)
+                }
+                for host, stats in self.stats.items()
+            }
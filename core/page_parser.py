@@ -0,0 +1,169 @@
+import json
+import urllib.parse
+from multiprocessing import shared_memory
+from bs4 import BeautifulSoup
+
+# 页面中包含视频数据的脚本块
+RENDER_DATA_START = b'<script id="RENDER_DATA" type="application/json">'
+SCRIPT_END = b'</script>'
+
+# 登录页面的特征文字
+LOGIN_MARK = '登录'.encode('utf-8')
+PASSWORD_MARK = '密码'.encode('utf-8')
+
+# 本模块只做页面解析，不访问网络，也不导入日志等有初始化动作的模块，解析进程只需导入本模块
+
+
+def check_login_status(content):
+    """检查是否需要登录，content为页面内容（bytes）"""
+    # 根据响应内容判断是否需要登录
+    if LOGIN_MARK in content and PASSWORD_MARK in content:
+        return False
+    return True
+
+
+def parse_douyin_render_data(render_data, url):
+    """解析RENDER_DATA脚本块中的视频信息，render_data为URL编码的JSON文本"""
+    # 解码URL编码的JSON
+    decoded_data = urllib.parse.unquote(render_data)
+    data = json.loads(decoded_data)
+
+    # 从解析的数据中提取视频信息
+    # 注意：这里的路径需要根据实际的数据结构调整
+    video_info = None
+    for key in data:
+        if 'aweme' in key and 'detail' in data[key]:
+            video_info = data[key]['detail']
+            break
+
+    if not video_info:
+        return None
+
+    return build_douyin_video_info(video_info, url)
+
+
+def build_douyin_video_info(video_info, url):
+    """将抖音接口中的单个作品数据（aweme）转换为统一的视频信息字典"""
+    # 提取有用的信息
+    result = {
+        'title': video_info.get('desc', ''),
+        'description': video_info.get('desc', ''),
+        'tags': [],
+        'stats': {
+            'likes': video_info.get('statistics', {}).get('digg_count', 0),
+            'comments': video_info.get('statistics', {}).get('comment_count', 0),
+            'favorites': video_info.get('statistics', {}).get('collect_count', 0),
+            'shares': video_info.get('statistics', {}).get('share_count', 0)
+        },
+        'author': {
+            'name': video_info.get('author', {}).get('nickname', ''),
+            'id': video_info.get('author', {}).get('unique_id', '')
+        },
+        'source_url': url,
+        'play_url': '',
+        'play_urls': [],
+        'audio_urls': []
+    }
+
+    # 提取标签
+    if 'text_extra' in video_info:
+        for tag_info in video_info['text_extra']:
+            if 'hashtag_name' in tag_info and tag_info['hashtag_name']:
+                result['tags'].append(tag_info['hashtag_name'])
+
+    # 提取视频播放地址，保留全部CDN镜像地址供下载时选择
+    if 'video' in video_info and 'play_addr' in video_info['video']:
+        play_addr_list = video_info['video']['play_addr'].get('url_list', [])
+        if play_addr_list:
+            result['play_url'] = play_addr_list[0]
+            result['play_urls'] = list(dict.fromkeys(play_addr_list))
+
+    # 提取单独的音频流地址（分离音视频的作品才有），只获取音频时不需要下载视频
+    for audio in video_info.get('video', {}).get('bit_rate_audio') or []:
+        url_list = (audio.get('audio_meta') or {}).get('url_list') or []
+        if isinstance(url_list, dict):
+            # 部分接口返回 {'main_url': ..., 'backup_url': ...}
+            url_list = list(url_list.values())
+        result['audio_urls'].extend(url for url in url_list if isinstance(url, str) and url)
+    result['audio_urls'] = list(dict.fromkeys(result['audio_urls']))
+
+    return result
+
+
+def parse_douyin_html(html_content, url):
+    """无法提取结构化数据时，使用BeautifulSoup解析页面"""
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    title = soup.select_one('title').text if soup.select_one('title') else ''
+    description = soup.select_one('meta[name="description"]')
+    description = description['content'] if description else ''
+
+    # 尝试从页面中找到视频播放地址
+    video_tag = soup.select_one('video')
+    play_url = video_tag['src'] if video_tag and 'src' in video_tag.attrs else ''
+
+    # 构建基本返回结果
+    return {
+        'title': title,
+        'description': description,
+        'tags': [],  # 需要更精确的解析方法提取标签
+        'stats': {
+            'likes': 0,
+            'comments': 0,
+            'favorites': 0,
+            'shares': 0
+        },
+        'author': {
+            'name': '',
+            'id': ''
+        },
+        'source_url': url,
+        'play_url': play_url,
+        'play_urls': [play_url] if play_url else [],
+        'audio_urls': []
+    }
+
+
+def parse_douyin_page(content, url, encoding='utf-8'):
+    """
+    从页面内容（bytes，可以只包含到RENDER_DATA结束的部分）解析视频信息
+
+    Returns:
+        视频信息字典；需要登录时返回{'login_required': True}
+    """
+    # 检查是否需要登录（只检查已读取的部分）
+    if not check_login_status(content):
+        return {'login_required': True}
+
+    start = content.find(RENDER_DATA_START)
+    if start >= 0:
+        start += len(RENDER_DATA_START)
+        end = content.find(SCRIPT_END, start)
+        if end >= 0:
+            # 只解码需要的数据块
+            result = parse_douyin_render_data(content[start:end].decode('utf-8'), url)
+            if result:
+                return result
+
+    # 如果无法提取结构化数据，尝试使用BeautifulSoup解析页面
+    return parse_douyin_html(content.decode(encoding or 'utf-8', errors='replace'), url)
+
+
+def attach_shared_memory(name):
+    """在解析进程中打开父进程创建的共享内存，由父进程负责释放"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python 3.13之前没有track参数；spawn启动的子进程与父进程共用资源跟踪进程，重复登记不影响释放
+        return shared_memory.SharedMemory(name=name)
+
+
+def parse_shared_page(name, size, url, encoding):
+    """解析进程的入口（core.parse_pool.ParsePool）：从共享内存读取页面内容并解析"""
+    shm = attach_shared_memory(name)
+    try:
+        with shm.buf[:size] as view:
+            content = bytes(view)
+    finally:
+        shm.close()
+    return parse_douyin_page(content, url, encoding)
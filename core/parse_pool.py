@@ -0,0 +1,162 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from utils.common import logger, get_worker_log_queue, init_worker_logging
+from core.batch_scheduler import OperationCancelled
+from core.page_parser import parse_douyin_page, parse_shared_page
+
+
+class ParsePool:
+    def __init__(self, workers=None, min_size=256 * 1024, timeout=30):
+        """
+        在子进程中解析视频页面，多个抓取线程的解析不再受GIL限制，可以用满多个CPU核心
+
+        页面内容通过共享内存传给子进程，不需要序列化大段字节；只有解析结果（小字典）会被序列化传回。
+        小于min_size的页面进程间传递的开销大于解析本身，仍在调用线程中解析。
+        进程池在第一次遇到大页面时才启动，子进程异常退出时重建，无法使用时回退到线程内解析。
+        子进程解析超时时结束进程池中的进程并重建；调用方取消时立即返回，不再等待结果。
+
+        Args:
+            workers: 解析进程数，默认为CPU核心数（只有一个核心时为0）；0表示不使用子进程
+            min_size: 交给子进程解析的页面大小下限（字节）
+            timeout: 子进程解析单个页面的最长时间（秒）
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+            workers = workers if workers > 1 else 0
+        self.workers = workers
+        self.min_size = min_size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.executor = None
+        self.disabled = False
+        self.parsed_in_pool = 0
+        self.parsed_inline = 0
+        self.timed_out = 0
+
+    def set_workers(self, workers):
+        """修改解析进程数，已启动的进程池在当前任务完成后关闭"""
+        with self.lock:
+            executor, self.executor = self.executor, None
+            self.workers = workers
+            self.disabled = False
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                # spawn方式启动：父进程中有多个线程，fork可能复制到被其他线程持有的锁
+                # 子进程的日志经队列交给本进程写入，不各自打开日志文件
+                self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                    mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=init_worker_logging,
+                                                    initargs=(get_worker_log_queue(),))
+                logger.info(f"Started {self.workers} page parsing processes")
+            return self.executor
+
+    def _reset_executor(self, executor, terminate=False):
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        if terminate:
+            # 卡住的子进程不会自己结束，shutdown之前先结束进程；同时在池中解析的其他页面回退到线程内解析
+            for process in list((getattr(executor, '_processes', None) or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _wait(self, future, timeout, cancel_token):
+        """等待解析结果；超时抛出concurrent.futures.TimeoutError，取消时抛出OperationCancelled"""
+        if cancel_token is not None:
+            woken = threading.Event()
+            future.add_done_callback(lambda _: woken.set())
+            cancel_token.on_cancel(woken.set)
+            try:
+                woken.wait(timeout)
+            finally:
+                cancel_token.remove_callback(woken.set)
+            if not future.done():
+                cancel_token.raise_if_cancelled()
+        return future.result(timeout=0 if cancel_token is not None else timeout)
+
+    def parse(self, content, url, encoding='utf-8', cancel_token=None):
+        """
+        解析页面内容，结果与core.page_parser.parse_douyin_page相同
+
+        Args:
+            content: 页面内容（bytes或bytearray）
+            url: 视频页面地址
+            encoding: 页面编码
+            cancel_token: 取消时结束等待并抛出OperationCancelled
+
+        Returns:
+            解析结果；子进程超时时返回None
+        """
+        size = len(content)
+        if self.workers <= 0 or self.disabled or size < self.min_size:
+            self.parsed_inline += 1
+            return parse_douyin_page(content, url, encoding)
+
+        executor = self._get_executor()
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=size)
+        except OSError as e:
+            logger.warning(f"Shared memory unavailable, parsing in thread: {e}")
+            self.disabled = True
+            return self.parse(content, url, encoding, cancel_token)
+        try:
+            shm.buf[:size] = content
+            future = executor.submit(parse_shared_page, shm.name, size, url, encoding)
+            result = self._wait(future, self.timeout, cancel_token)
+            self.parsed_in_pool += 1
+            return result
+        except OperationCancelled:
+            # 不再等待结果；子进程中的解析如果卡住，由之后的超时结束
+            future.cancel()
+            raise
+        except FutureTimeoutError:
+            # Python 3.11之前concurrent.futures.TimeoutError不是内置TimeoutError的别名
+            logger.error(f"Parsing {url} in worker took over {self.timeout}s, restarting parse processes")
+            self.timed_out += 1
+            if not future.cancel():
+                self._reset_executor(executor, terminate=True)
+            return None
+        except BrokenProcessPool as e:
+            # 子进程异常退出（例如被系统杀掉），重建进程池，本页在当前线程中解析
+            logger.warning(f"Parse process pool broken, restarting: {e}")
+            self._reset_executor(executor)
+            self.parsed_inline += 1
+            return parse_douyin_page(content, url, encoding)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def get_stats(self):
+        return {
+            'workers': self.workers,
+            'parsed_in_pool': self.parsed_in_pool,
+            'parsed_inline': self.parsed_inline,
+            'timed_out': self.timed_out
+        }
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+def get_parse_pool():
+    """获取进程内共享的页面解析进程池"""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = ParsePool()
+        return _shared_pool
@@ -0,0 +1,401 @@
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+from utils.common import logger, log_stage
+from core.link_parser import LinkParser
+from core.content_fetcher import ContentFetcher
+from core.downloader import Downloader
+from core.subtitle import SubtitleExtractor
+from core.data_processor import DataProcessor
+from core.excel_exporter import ExcelExporter
+from core.record_store import RecordStore
+from core.author_crawler import AuthorCrawler
+from core.transcript_index import TranscriptIndex
+from core.batch_scheduler import BatchScheduler, OperationCancelled, parse_priority
+from core.single_flight import SingleFlight
+from auth.login import LoginManager
+
+# 批量处理时每收集这么多条结果写入一次Excel
+EXPORT_FLUSH_ITEMS = 200
+
+
+class VideoPipeline:
+    def __init__(self, log_callback=None, status_callback=None, login_handler=None):
+        """
+        初始化采集流程，串联解析、获取信息、下载、字幕、数据处理和导出各模块
+
+        界面和命令行共用这一流程，通过回调函数显示日志和状态。
+
+        Args:
+            log_callback: 日志回调，参数为一行文本，默认写入日志文件
+            status_callback: 状态回调，参数为当前阶段描述
+            login_handler: 需要登录时调用，参数为平台名称，返回是否已完成登录
+        """
+        self.log = log_callback or logger.info
+        self.update_status = status_callback or (lambda message: None)
+        self.login_handler = login_handler
+
+        # 初始化各模块
+        self.link_parser = LinkParser()
+        self.content_fetcher = ContentFetcher()
+        self.downloader = Downloader()
+        self.subtitle_extractor = SubtitleExtractor()
+        self.data_processor = DataProcessor()
+        self.excel_exporter = ExcelExporter()
+        self.login_manager = LoginManager()
+        self.record_store = RecordStore(self.get_db_path(self.excel_exporter.excel_path))
+        self.author_crawler = AuthorCrawler(self.content_fetcher, self.record_store)
+        self.transcript_index = TranscriptIndex(self.record_store)
+        self.batch_scheduler = BatchScheduler()
+        # 同一视频的多个链接（短链接、完整地址、分享文本）只处理一次
+        self.single_flight = SingleFlight()
+        self.profiler = None
+        # 批量处理期间等待写入Excel的结果
+        self.export_lock = threading.Lock()
+        self.export_buffer = []
+        self.export_scopes = 0
+
+    def get_db_path(self, excel_path):
+        """数据库文件与Excel文件放在一起，文件名相同"""
+        return os.path.splitext(excel_path)[0] + '.db'
+
+    def set_excel_path(self, excel_path):
+        """设置Excel文件路径，数据库路径随之变化"""
+        self.excel_exporter.set_excel_path(excel_path)
+        self.record_store.set_db_path(self.get_db_path(excel_path))
+
+    @contextmanager
+    def buffered_export(self):
+        """
+        在范围内（一个批次）只收集处理结果，每EXPORT_FLUSH_ITEMS条和范围结束时一次写入Excel
+
+        每次导出都要读取并重写已有文件，逐条导出时一个批次的总耗时随已有行数成倍增长。
+        结果已写入本地数据库，导出失败时可从数据库重新导出。
+        """
+        with self.export_lock:
+            self.export_scopes += 1
+        try:
+            yield
+        finally:
+            with self.export_lock:
+                self.export_scopes -= 1
+                last = self.export_scopes == 0
+            if last:
+                self.flush_exports()
+
+    def export_item(self, data):
+        """
+        导出一条结果，批量处理期间先放入缓冲区
+
+        Returns:
+            (是否成功, 是否只放入了缓冲区)
+        """
+        with self.export_lock:
+            if not self.export_scopes:
+                return self.excel_exporter.export_single_item(data), False
+            self.export_buffer.append(data)
+            full = len(self.export_buffer) >= EXPORT_FLUSH_ITEMS
+        if full:
+            return self.flush_exports(), False
+        return True, True
+
+    def flush_exports(self):
+        """把缓冲区中的结果一次写入Excel，返回是否成功"""
+        with self.export_lock:
+            items, self.export_buffer = self.export_buffer, []
+            if not items:
+                return True
+            exported = self.excel_exporter.export_batch(items)
+        if exported:
+            self.log(f"{len(items)} 条数据已导出到Excel: {self.excel_exporter.excel_path}")
+        else:
+            self.log(f"{len(items)} 条数据导出失败，数据仍保存在本地数据库中")
+        return exported
+
+    def set_profiler(self, profiler):
+        """设置性能分析器（core.profiler.Profiler），None表示关闭"""
+        self.profiler = profiler
+
+    def profile_item(self, item_id):
+        """按分析器的抽样比例分析一个条目，未开启分析时不做任何事"""
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.item(item_id)
+
+    @contextmanager
+    def stage(self, stage, item_id=None):
+        """一个处理阶段：记录耗时，条目被抽中分析时同时采集调用栈和内存分配"""
+        with log_stage(stage, item_id):
+            if self.profiler is None:
+                yield
+            else:
+                with self.profiler.stage(stage):
+                    yield
+
+    def dump_profile(self):
+        """写出性能分析结果"""
+        if self.profiler is not None:
+            output_dir = self.profiler.dump()
+            if output_dir:
+                self.log(f"性能分析结果已保存到: {output_dir}")
+
+    def process_link(self, link_text, extract_audio=True, cancel_token=None):
+        """处理单个链接，cancel_token被取消时抛出OperationCancelled"""
+        with self.profile_item(link_text):
+            return self._process_link(link_text, extract_audio, cancel_token)
+
+    def _process_link(self, link_text, extract_audio, cancel_token):
+        try:
+            # 解析链接
+            self.update_status("正在解析链接...")
+            with self.stage('parse'):
+                link_info = self.link_parser.parse_link(link_text, cancel_token)
+            if not link_info:
+                self.log(f"无法解析链接: {link_text}")
+                return None
+
+            platform = link_info.get('platform')
+            video_id = link_info.get('video_id')
+            original_url = link_info.get('original_url')
+
+            self.log(f"解析链接成功: 平台={platform}, 视频ID={video_id}")
+
+            return self.process_video_once(platform, video_id, original_url, extract_audio,
+                                           cancel_token=cancel_token)
+
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            self.log(f"处理链接时出错: {str(e)}")
+            logger.exception("处理链接异常")
+            return None
+
+    def check_cancelled(self, cancel_token):
+        """阶段之间检查是否已取消"""
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+
+    def process_video_once(self, platform, video_id, url, extract_audio=True, video_info=None, cancel_token=None):
+        """
+        处理视频，同一视频（平台和ID相同）正在处理或在当前批次中已处理成功时，直接使用那一次的结果，
+        不重复下载、提取和导出；参数和返回值同process_video
+        """
+        result, shared = self.single_flight.do(
+            (platform, video_id),
+            lambda: self.process_video(platform, video_id, url, extract_audio, video_info, cancel_token),
+            cancel_token)
+        if shared:
+            self.log(f"重复的视频 {platform} {video_id}，使用已有的处理结果")
+        return result
+
+    def process_video(self, platform, video_id, url, extract_audio=True, video_info=None, cancel_token=None):
+        """
+        处理一个已确定平台和ID的视频：获取信息、下载、提取字幕、保存数据
+
+        Args:
+            platform: 平台名称
+            video_id: 视频ID
+            url: 视频页面地址
+            extract_audio: 是否提取音频
+            video_info: 已获取的视频信息（例如作者作品列表中带有的数据），
+                        提供且包含播放地址时跳过获取视频信息
+            cancel_token: 取消标记（core.batch_scheduler.CancelToken），
+                          在阶段之间和下载的数据块之间检查
+
+        Returns:
+            处理后的数据字典，失败时返回None
+        """
+        try:
+            original_url = url
+            if not video_info or not video_info.get('play_url'):
+                # 获取视频信息
+                self.update_status("正在获取视频信息...")
+                with self.stage('fetch', video_id):
+                    video_info = self.content_fetcher.fetch_video_info(platform, video_id, original_url,
+                                                                       cancel_token=cancel_token)
+
+            # 检查是否需要登录
+            if video_info and video_info.get('login_required'):
+                self.log("需要登录才能获取此视频信息")
+                if not self.login_handler or not self.login_handler(platform):
+                    return None
+                # 登录后重新获取视频信息
+                cookies = self.login_manager.load_cookies(platform)
+                if cookies:
+                    self.content_fetcher.update_cookies(cookies)
+                    video_info = self.content_fetcher.fetch_video_info(platform, video_id, original_url,
+                                                                       cancel_token=cancel_token)
+                else:
+                    self.log("登录失败或取消")
+                    return None
+
+            if not video_info or not video_info.get('play_url'):
+                self.log(f"无法获取视频信息或播放地址")
+                return None
+
+            # 下载视频
+            self.check_cancelled(cancel_token)
+            self.update_status("正在下载视频...")
+            with self.stage('download', video_id):
+                download_info = self.downloader.download_video(video_info, extract_audio, cancel_token)
+
+            if not download_info:
+                self.log("视频下载失败")
+                return None
+
+            if download_info.get('video_path'):
+                self.log(f"视频下载成功: {download_info['video_path']}")
+            else:
+                self.log(f"音频获取成功: {download_info['audio_path']}")
+
+            # 提取字幕
+            self.check_cancelled(cancel_token)
+            self.update_status("正在提取字幕...")
+            subtitle_segments = None
+            subtitle_text = None
+            if download_info.get('video_path') or download_info.get('audio_path'):
+                with self.stage('subtitle', video_id):
+                    subtitle_segments = self.subtitle_extractor.get_subtitle_segments(
+                        download_info['video_path'],
+                        download_info.get('audio_path'),
+                        cancel_token
+                    )
+                subtitle_text = self.subtitle_extractor.segments_to_text(subtitle_segments)
+                if subtitle_text:
+                    self.log("字幕提取成功")
+                else:
+                    self.log("无法提取字幕")
+
+            # 处理数据
+            self.check_cancelled(cancel_token)
+            processed_data = self.data_processor.process_video_data(
+                video_info,
+                download_info,
+                subtitle_text
+            )
+
+            if not processed_data:
+                self.log("数据处理失败")
+                return None
+
+            # 写入本地数据库
+            with self.stage('store', video_id):
+                self.record_store.upsert(processed_data)
+                if subtitle_segments:
+                    self.transcript_index.add(platform, video_id, subtitle_segments)
+
+            # 导出到Excel
+            self.update_status("正在导出到Excel...")
+            with self.stage('export', video_id):
+                exported, buffered = self.export_item(processed_data)
+            if buffered:
+                self.log("数据将在本批次结束时导出到Excel")
+            elif exported:
+                self.log(f"数据已导出到Excel: {self.excel_exporter.excel_path}")
+            else:
+                self.log("数据导出失败")
+
+            return processed_data
+
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            self.log(f"处理视频时出错: {str(e)}")
+            logger.exception("处理视频异常")
+            return None
+
+    def process_links(self, links, extract_audio=True, on_item_done=None):
+        """
+        按优先级处理多个链接，以 ! 开头的链接优先处理
+
+        同一视频的多个链接只处理一次，其余链接使用它的结果；
+        每个链接有时间预算，超出预算的链接推迟到其余链接之后重试；
+        调用cancel_batch()可随时停止。
+
+        Args:
+            links: 链接列表
+            extract_audio: 是否提取音频
+            on_item_done: 每处理完一个链接调用，参数为(序号, 处理结果)
+
+        Returns:
+            成功处理的数量
+        """
+        reporter = self.downloader.progress_reporter
+        if reporter:
+            reporter.begin_batch(len(links))
+
+        items = []
+        for i, link in enumerate(links):
+            link, priority = parse_priority(link)
+            items.append(((i, link), priority))
+
+        def handle(item, cancel_token):
+            i, link = item
+            self.log(f"处理链接 {i+1}/{len(links)}: {link}")
+            return self.process_link(link, extract_audio, cancel_token)
+
+        def item_done(index, result):
+            if reporter:
+                reporter.item_done()
+            if on_item_done:
+                on_item_done(index, result)
+
+        coalesced = self.single_flight.get_stats()['coalesced']
+        with self.single_flight.scope(), self.buffered_export():
+            summary = self.batch_scheduler.run(items, handle, item_done)
+        coalesced = self.single_flight.get_stats()['coalesced'] - coalesced
+        if coalesced:
+            self.log(f"{coalesced} 个链接与其他链接是同一视频，未重复处理")
+        if summary['deferred']:
+            self.log(f"{summary['deferred']} 个链接超出时间预算，已推迟重试")
+        if summary['cancelled']:
+            self.log(f"已取消，{summary['cancelled']} 个链接未完成")
+        self.dump_profile()
+        return summary['success']
+
+    def cancel_batch(self):
+        """停止正在运行的批量处理"""
+        self.batch_scheduler.cancel()
+
+    def crawl_author(self, author_id, extract_audio=True, incremental=True):
+        """
+        采集作者的作品列表，作品数据直接进入下载流程
+
+        Args:
+            author_id: 作者ID（sec_user_id）
+            extract_audio: 是否提取音频
+            incremental: 是否只采集上次之后发布的新作品
+
+        Returns:
+            统计字典，见AuthorCrawler.crawl
+        """
+        return self.crawl_source('author', author_id, extract_audio, incremental)
+
+    def crawl_source(self, source_type, source_id, extract_audio=True, incremental=True, max_pages=None):
+        """
+        采集作者或话题的作品列表，作品数据直接进入下载流程
+
+        Args:
+            source_type: 'author' 或 'hashtag'
+            source_id: 作者ID（sec_user_id）或话题ID
+            extract_audio: 是否提取音频
+            incremental: 是否只采集上次之后发布的新作品
+            max_pages: 最多翻页数
+
+        Returns:
+            统计字典，见AuthorCrawler.crawl
+        """
+        name = '作者' if source_type == 'author' else '话题'
+        self.log(f"开始采集{name}作品: {source_id}")
+
+        def process(video_info):
+            self.log(f"处理作品: {video_info['video_id']} {video_info['title'][:30]}")
+            with self.profile_item(video_info['video_id']):
+                return self.process_video_once(video_info['platform'], video_info['video_id'],
+                                               video_info['source_url'], extract_audio, video_info=video_info)
+
+        with self.buffered_export():
+            summary = self.author_crawler.crawl(source_id, process, incremental, source_type, max_pages)
+        self.dump_profile()
+        self.log(f"{name} {source_id} 采集完成: 新作品 {summary['found']} 个, 成功 {summary['success']} 个")
+        return summary
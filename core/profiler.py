@@ -0,0 +1,265 @@
+import os
+import sys
+import time
+import random
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from utils.common import logger
+
+# 分析方式：sample 定时采样调用栈，cprofile 记录每次函数调用
+PROFILE_MODES = ('sample', 'cprofile')
+
+
+def frame_label(frame):
+    """调用栈中一帧的名称，格式为 函数名 (文件名:行号)"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+
+
+def collapse_stack(frame):
+    """将调用栈转换为从外到内的帧名称列表"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class Profiler:
+    def __init__(self, output_dir='profiles', mode='sample', sample_rate=1.0,
+                 interval=0.005, trace_memory=True, top_allocations=15):
+        """
+        按条目抽样的性能分析
+
+        只对按sample_rate抽中的条目分析各处理阶段：采样调用栈或用cProfile记录函数调用，
+        并可用tracemalloc比较阶段前后的内存分配。未抽中的条目只多一次随机数判断。
+
+        Args:
+            output_dir: 分析结果目录，每次运行写入其中一个以时间命名的子目录
+            mode: 'sample' 定时采样调用栈（开销小，输出折叠栈供火焰图使用），
+                  'cprofile' 记录全部函数调用（输出每个阶段的.prof文件）
+            sample_rate: 被分析条目的比例，0到1之间
+            interval: 采样间隔（秒）
+            trace_memory: 是否记录每个阶段的内存分配
+            top_allocations: 报告中每个阶段列出的分配位置数
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.output_dir = os.path.join(output_dir, time.strftime('%Y%m%d_%H%M%S'))
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.trace_memory = trace_memory
+        self.top_allocations = top_allocations
+
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.items_profiled = 0
+        self.stacks = Counter()
+        self.stage_stats = {}
+        self.allocations = {}
+        self.stage_summary = {}
+
+        # 采样线程只在有被分析的阶段运行时工作
+        self.active = {}
+        self.wakeup = threading.Event()
+        self.sampler = None
+        self.memory_users = 0
+        self.memory_started = False
+
+    @contextmanager
+    def item(self, item_id=None):
+        """分析一个条目；按比例抽样决定该条目的各阶段是否被分析"""
+        if random.random() >= self.sample_rate:
+            yield False
+            return
+        logger.info(f"Profiling item {item_id}")
+        self.local.stages = []
+        if self.trace_memory:
+            self._start_memory()
+        with self.lock:
+            self.items_profiled += 1
+        try:
+            yield True
+        finally:
+            self.local.stages = None
+            if self.trace_memory:
+                self._stop_memory()
+
+    def is_profiling(self):
+        """当前线程正在处理的条目是否被抽中"""
+        return getattr(self.local, 'stages', None) is not None
+
+    @contextmanager
+    def stage(self, stage):
+        """分析当前条目的一个处理阶段，条目未被抽中时不做任何事"""
+        if not self.is_profiling():
+            yield
+            return
+
+        stages = self.local.stages
+        stages.append(stage)
+        label = ';'.join(stages)
+        before = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+
+        profile = None
+        thread_id = threading.get_ident()
+        start = time.perf_counter()
+        if self.mode == 'cprofile' and len(stages) == 1:
+            # 嵌套阶段计入外层阶段的cProfile数据
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # 已有其他分析器在运行时跳过本阶段
+                logger.warning(f"Cannot start cProfile for stage {stage}: {e}")
+                profile = None
+        elif self.mode == 'sample':
+            self._register(thread_id, label)
+
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+            stages.pop()
+            if self.mode == 'sample':
+                if stages:
+                    self._register(thread_id, ';'.join(stages))
+                else:
+                    self._unregister(thread_id)
+            peak = None
+            if before is not None:
+                peak = tracemalloc.get_traced_memory()[1]
+                self._record_allocations(label, before, tracemalloc.take_snapshot())
+            self._record_stage(label, elapsed, peak, profile)
+
+    def _record_stage(self, label, elapsed, peak, profile):
+        with self.lock:
+            summary = self.stage_summary.setdefault(label, {'count': 0, 'seconds': 0.0, 'peak': 0})
+            summary['count'] += 1
+            summary['seconds'] += elapsed
+            if peak is not None:
+                summary['peak'] = max(summary['peak'], peak)
+            if profile is not None:
+                if label in self.stage_stats:
+                    self.stage_stats[label].add(profile)
+                else:
+                    self.stage_stats[label] = pstats.Stats(profile)
+
+    def _start_memory(self):
+        with self.lock:
+            if self.memory_users == 0:
+                # 已由其他代码开启时沿用，结束时也不关闭
+                self.memory_started = not tracemalloc.is_tracing()
+                if self.memory_started:
+                    tracemalloc.start()
+            self.memory_users += 1
+
+    def _stop_memory(self):
+        with self.lock:
+            self.memory_users -= 1
+            if self.memory_users == 0 and self.memory_started:
+                tracemalloc.stop()
+
+    def _record_allocations(self, label, before, after):
+        """累计阶段内新增的内存分配，按分配位置（文件和行号）汇总"""
+        snapshot_filter = (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        )
+        diffs = after.filter_traces(snapshot_filter).compare_to(before.filter_traces(snapshot_filter), 'lineno')
+        with self.lock:
+            totals = self.allocations.setdefault(label, {})
+            for diff in diffs:
+                if diff.size_diff <= 0:
+                    continue
+                frame = diff.traceback[0]
+                key = f"{frame.filename}:{frame.lineno}"
+                size, count = totals.get(key, (0, 0))
+                totals[key] = (size + diff.size_diff, count + diff.count_diff)
+
+    def _register(self, thread_id, label):
+        with self.lock:
+            self.active[thread_id] = label
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self._sample_loop, name='profiler-sampler', daemon=True)
+                self.sampler.start()
+        self.wakeup.set()
+
+    def _unregister(self, thread_id):
+        with self.lock:
+            self.active.pop(thread_id, None)
+            if not self.active:
+                self.wakeup.clear()
+
+    def _sample_loop(self):
+        """后台采样线程：定时读取正在分析的线程的调用栈"""
+        while True:
+            self.wakeup.wait()
+            time.sleep(self.interval)
+            with self.lock:
+                active = dict(self.active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, label in active.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                # 以阶段名作为栈底，火焰图中各阶段分开显示
+                key = ';'.join([label] + collapse_stack(frame))
+                with self.lock:
+                    self.stacks[key] += 1
+
+    def dump(self):
+        """
+        写出目前为止的分析结果
+
+        - stacks.collapsed: 折叠调用栈（采样模式），可直接用flamegraph.pl或speedscope打开
+        - <阶段>.prof: 各阶段的cProfile数据（cprofile模式），可用pstats或snakeviz查看
+        - report.txt: 各阶段耗时、内存峰值和新增内存最多的分配位置
+
+        Returns:
+            结果目录，没有分析任何条目时返回None
+        """
+        with self.lock:
+            if not self.stage_summary:
+                return None
+            stacks = dict(self.stacks)
+            stage_stats = dict(self.stage_stats)
+            summary = {label: dict(values) for label, values in self.stage_summary.items()}
+            allocations = {label: dict(totals) for label, totals in self.allocations.items()}
+            items = self.items_profiled
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        if stacks:
+            with open(os.path.join(self.output_dir, 'stacks.collapsed'), 'w', encoding='utf-8') as f:
+                for key, count in sorted(stacks.items()):
+                    f.write(f"{key} {count}\n")
+        for label, stats in stage_stats.items():
+            stats.dump_stats(os.path.join(self.output_dir, label.replace(';', '.') + '.prof'))
+
+        lines = [f"Profiled items: {items} (mode={self.mode}, sample_rate={self.sample_rate})", ""]
+        for label, values in summary.items():
+            average = values['seconds'] / values['count']
+            lines.append(f"[{label}] runs={values['count']} total={values['seconds']:.3f}s "
+                         f"avg={average:.3f}s peak={values['peak'] / 1024:.1f}KB")
+            top = sorted(allocations.get(label, {}).items(), key=lambda entry: entry[1][0], reverse=True)
+            for location, (size, count) in top[:self.top_allocations]:
+                lines.append(f"    {size / 1024:>10.1f}KB {count:>8} blocks  {location}")
+            lines.append("")
+        with open(os.path.join(self.output_dir, 'report.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines))
+
+        logger.info(f"Profile written to {self.output_dir}")
+        return self.output_dir
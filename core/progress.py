@@ -0,0 +1,184 @@
+import time
+import threading
+
+
+class ProgressReporter:
+    """
+    下载进度报告器
+
+    回调函数接收一个进度事件字典：
+        kind: 'file' 表示单个文件，'batch' 表示整个批次
+        name: 文件路径（批次事件为None）
+        downloaded / total: 已下载字节数 / 总字节数（未知时为0）
+        rate: 两次报告之间的瞬时速率（字节/秒）
+        smoothed_rate: 指数平滑后的速率（字节/秒）
+        eta: 预计剩余秒数（无法估计时为None）
+        finished: 是否已完成
+    批次事件额外包含 items_done / items_total。
+
+    报告按时间间隔节流；下载循环每个数据块只需比较一次字节阈值。
+    """
+
+    def __init__(self, callback, interval=0.25, smoothing=0.3):
+        self.callback = callback
+        self.interval = interval
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.items_total = 0
+        self.items_done = 0
+        self.batch_bytes_done = 0
+        self.batch_bytes_total = 0
+        self.batch_started = time.monotonic()
+        self.batch_last_time = self.batch_started
+        self.batch_last_bytes = 0
+        self.batch_smoothed_rate = 0.0
+
+    def begin_batch(self, items_total):
+        """开始一个新批次"""
+        with self.lock:
+            self.items_total = items_total
+            self.items_done = 0
+            self.batch_bytes_done = 0
+            self.batch_bytes_total = 0
+            self.batch_started = time.monotonic()
+            self.batch_last_time = self.batch_started
+            self.batch_last_bytes = 0
+            self.batch_smoothed_rate = 0.0
+        self._emit_batch(force=True)
+
+    def item_done(self):
+        """批次中一个条目处理完成（无论成功与否）"""
+        with self.lock:
+            self.items_done += 1
+        self._emit_batch(force=True)
+
+    def start_file(self, name, total):
+        """开始一个文件的传输，返回该文件的进度跟踪对象"""
+        with self.lock:
+            self.batch_bytes_total += total
+        return FileTransfer(self, name, total)
+
+    def _add_bytes(self, delta):
+        with self.lock:
+            self.batch_bytes_done += delta
+
+    def _smooth(self, previous, current):
+        if previous <= 0:
+            return current
+        return self.smoothing * current + (1 - self.smoothing) * previous
+
+    def _emit_batch(self, force=False):
+        now = time.monotonic()
+        with self.lock:
+            elapsed = now - self.batch_last_time
+            if not force and elapsed < self.interval:
+                return
+            rate = (self.batch_bytes_done - self.batch_last_bytes) / elapsed if elapsed > 0 else 0.0
+            if elapsed > 0:
+                self.batch_smoothed_rate = self._smooth(self.batch_smoothed_rate, rate)
+            self.batch_last_time = now
+            self.batch_last_bytes = self.batch_bytes_done
+            remaining = self.batch_bytes_total - self.batch_bytes_done
+            eta = remaining / self.batch_smoothed_rate if self.batch_smoothed_rate > 0 and remaining > 0 else None
+            event = {
+                'kind': 'batch',
+                'name': None,
+                'downloaded': self.batch_bytes_done,
+                'total': self.batch_bytes_total,
+                'rate': rate,
+                'smoothed_rate': self.batch_smoothed_rate,
+                'eta': eta,
+                'finished': self.items_total > 0 and self.items_done >= self.items_total,
+                'items_done': self.items_done,
+                'items_total': self.items_total
+            }
+        self._dispatch(event)
+
+    def _dispatch(self, event):
+        try:
+            self.callback(event)
+        except Exception:
+            # 进度显示出错不能影响下载本身
+            pass
+
+
+class FileTransfer:
+    """单个文件的传输进度"""
+
+    def __init__(self, reporter, name, total):
+        self.reporter = reporter
+        self.name = name
+        self.total = total
+        self.started = time.monotonic()
+        self.last_time = self.started
+        self.last_bytes = 0
+        self.smoothed_rate = 0.0
+        # 第一次报告的字节阈值，之后根据速率动态估计
+        self.next_report = 64 * 1024
+
+    def update(self, downloaded):
+        """
+        报告当前已下载字节数
+
+        调用方只在 downloaded >= 返回值（下一次报告阈值）时才需要再次调用。
+        """
+        now = time.monotonic()
+        elapsed = now - self.last_time
+        if elapsed < self.reporter.interval:
+            # 还没到报告时间，按当前速率估算下一个时间点对应的字节数
+            rate = (downloaded - self.last_bytes) / elapsed if elapsed > 0 else 0.0
+            remaining_time = self.reporter.interval - elapsed
+            return downloaded + max(int(rate * remaining_time), 16 * 1024)
+
+        self._emit(downloaded, now, finished=False)
+        interval_bytes = int(self.smoothed_rate * self.reporter.interval)
+        return downloaded + max(interval_bytes, 16 * 1024)
+
+    def finish(self, downloaded, success=True):
+        """文件传输结束，发送最终进度"""
+        if not success:
+            # 失败的文件不计入批次总量
+            with self.reporter.lock:
+                self.reporter.batch_bytes_total -= self.total
+            self.reporter._add_bytes(-self.last_bytes)
+            return
+        self._emit(downloaded, time.monotonic(), finished=True)
+
+    def _emit(self, downloaded, now, finished):
+        elapsed = now - self.last_time
+        delta = downloaded - self.last_bytes
+        rate = delta / elapsed if elapsed > 0 else 0.0
+        if elapsed > 0:
+            self.smoothed_rate = self.reporter._smooth(self.smoothed_rate, rate)
+        self.last_time = now
+        self.last_bytes = downloaded
+        self.reporter._add_bytes(delta)
+
+        remaining = self.total - downloaded
+        eta = remaining / self.smoothed_rate if self.smoothed_rate > 0 and remaining > 0 else None
+        self.reporter._dispatch({
+            'kind': 'file',
+            'name': self.name,
+            'downloaded': downloaded,
+            'total': self.total,
+            'rate': rate,
+            'smoothed_rate': self.smoothed_rate,
+            'eta': 0 if finished else eta,
+            'finished': finished
+        })
+        self.reporter._emit_batch(force=finished)
+
+
+def format_progress(event):
+    """将进度事件格式化为一行可读文本"""
+    downloaded_mb = event['downloaded'] / 1024 / 1024
+    rate_mb = event['smoothed_rate'] / 1024 / 1024
+    if event['total']:
+        size_text = f"{downloaded_mb:.1f}/{event['total'] / 1024 / 1024:.1f} MB"
+    else:
+        size_text = f"{downloaded_mb:.1f} MB"
+    eta_text = f", 剩余 {event['eta']:.0f} 秒" if event.get('eta') else ""
+    prefix = ""
+    if event['kind'] == 'batch':
+        prefix = f"[{event['items_done']}/{event['items_total']}] "
+    return f"{prefix}{size_text}, {rate_mb:.2f} MB/s{eta_text}"
@@ -0,0 +1,555 @@
+import os
+import csv
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from utils.common import logger
+
+# 与Excel导出一致的数据列
+RECORD_COLUMNS = [
+    'title', 'description', 'tags', 'transcript',
+    'likes', 'comments', 'favorites', 'shares',
+    'author_name', 'author_id', 'source_url',
+    'platform', 'video_id', 'local_video_path', 'local_audio_path'
+]
+
+# 可用于排序和聚合的计数列
+METRIC_COLUMNS = ['likes', 'comments', 'favorites', 'shares']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY,
+    platform TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    title TEXT,
+    description TEXT,
+    tags TEXT,
+    transcript TEXT,
+    likes INTEGER DEFAULT 0,
+    comments INTEGER DEFAULT 0,
+    favorites INTEGER DEFAULT 0,
+    shares INTEGER DEFAULT 0,
+    author_name TEXT,
+    author_id TEXT,
+    source_url TEXT,
+    local_video_path TEXT,
+    local_audio_path TEXT,
+    collected_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (platform, video_id)
+);
+CREATE INDEX IF NOT EXISTS idx_videos_author ON videos (author_id, likes);
+CREATE INDEX IF NOT EXISTS idx_videos_likes ON videos (likes);
+CREATE INDEX IF NOT EXISTS idx_videos_collected ON videos (collected_at);
+CREATE TABLE IF NOT EXISTS author_stats (
+    author_id TEXT PRIMARY KEY,
+    author_name TEXT,
+    video_count INTEGER NOT NULL,
+    total_likes INTEGER NOT NULL,
+    max_likes INTEGER NOT NULL,
+    total_comments INTEGER NOT NULL,
+    total_favorites INTEGER NOT NULL,
+    total_shares INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_author_stats_count ON author_stats (video_count);
+CREATE INDEX IF NOT EXISTS idx_author_stats_total ON author_stats (total_likes);
+CREATE INDEX IF NOT EXISTS idx_author_stats_avg ON author_stats (CAST(total_likes AS REAL) / video_count);
+CREATE INDEX IF NOT EXISTS idx_author_stats_max ON author_stats (max_likes);
+CREATE TRIGGER IF NOT EXISTS trg_author_stats_insert AFTER INSERT ON videos
+WHEN NEW.author_id IS NOT NULL AND NEW.author_id != ''
+BEGIN
+    INSERT INTO author_stats VALUES (NEW.author_id, NEW.author_name, 1, NEW.likes, NEW.likes,
+                                     NEW.comments, NEW.favorites, NEW.shares)
+    ON CONFLICT (author_id) DO UPDATE SET
+        author_name = COALESCE(excluded.author_name, author_name),
+        video_count = video_count + 1,
+        total_likes = total_likes + excluded.total_likes,
+        max_likes = MAX(max_likes, excluded.max_likes),
+        total_comments = total_comments + excluded.total_comments,
+        total_favorites = total_favorites + excluded.total_favorites,
+        total_shares = total_shares + excluded.total_shares;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_author_stats_update
+AFTER UPDATE OF author_id, author_name, likes, comments, favorites, shares ON videos
+BEGIN
+    UPDATE author_stats SET
+        video_count = video_count - 1,
+        total_likes = total_likes - OLD.likes,
+        total_comments = total_comments - OLD.comments,
+        total_favorites = total_favorites - OLD.favorites,
+        total_shares = total_shares - OLD.shares
+    WHERE author_id = OLD.author_id;
+    INSERT INTO author_stats
+    SELECT NEW.author_id, NEW.author_name, 1, NEW.likes, NEW.likes, NEW.comments, NEW.favorites, NEW.shares
+    WHERE NEW.author_id IS NOT NULL AND NEW.author_id != ''
+    ON CONFLICT (author_id) DO UPDATE SET
+        author_name = COALESCE(excluded.author_name, author_name),
+        video_count = video_count + 1,
+        total_likes = total_likes + excluded.total_likes,
+        total_comments = total_comments + excluded.total_comments,
+        total_favorites = total_favorites + excluded.total_favorites,
+        total_shares = total_shares + excluded.total_shares;
+    DELETE FROM author_stats WHERE author_id = OLD.author_id AND video_count <= 0;
+    -- 点赞数可能减少，最大值通过idx_videos_author重新查找
+    UPDATE author_stats SET max_likes = (SELECT MAX(likes) FROM videos WHERE videos.author_id = author_stats.author_id)
+    WHERE author_id IN (OLD.author_id, NEW.author_id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_author_stats_delete AFTER DELETE ON videos
+BEGIN
+    UPDATE author_stats SET
+        video_count = video_count - 1,
+        total_likes = total_likes - OLD.likes,
+        total_comments = total_comments - OLD.comments,
+        total_favorites = total_favorites - OLD.favorites,
+        total_shares = total_shares - OLD.shares,
+        max_likes = COALESCE((SELECT MAX(likes) FROM videos WHERE videos.author_id = OLD.author_id), 0)
+    WHERE author_id = OLD.author_id;
+    DELETE FROM author_stats WHERE author_id = OLD.author_id AND video_count <= 0;
+END;
+CREATE TABLE IF NOT EXISTS transcript_segments (
+    id INTEGER PRIMARY KEY,
+    platform TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_segments_video ON transcript_segments (platform, video_id);
+CREATE TABLE IF NOT EXISTS transcript_postings (
+    term TEXT NOT NULL,
+    segment_id INTEGER NOT NULL,
+    PRIMARY KEY (term, segment_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS transcript_terms (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS crawl_state (
+    source_type TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    high_water TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (source_type, source_id)
+);
+CREATE TABLE IF NOT EXISTS watch_state (
+    source_type TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    interval REAL NOT NULL,
+    next_poll REAL NOT NULL,
+    last_change_at REAL,
+    polls INTEGER DEFAULT 0,
+    changes INTEGER DEFAULT 0,
+    PRIMARY KEY (source_type, source_id)
+);
+"""
+
+
+class RecordStore:
+    def __init__(self, db_path=None):
+        """
+        初始化本地数据库（SQLite，WAL模式）
+
+        Args:
+            db_path: 数据库文件路径，如果不提供则使用默认路径
+        """
+        if db_path:
+            self.db_path = db_path
+        else:
+            # 默认与Excel文件保存在同一目录下
+            self.db_path = os.path.join('downloads', 'video_data.db')
+        self.local = threading.local()
+        self.write_lock = threading.Lock()
+
+    def set_db_path(self, db_path):
+        """设置数据库文件路径，各线程下次访问时重新连接"""
+        self.db_path = db_path
+
+    def connection(self):
+        """获取当前线程的数据库连接，SQLite连接不能跨线程共享"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None and self.local.path == self.db_path:
+            return connection
+        if connection is not None:
+            connection.close()
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        # WAL模式下读写互不阻塞
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        created = not connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'author_stats'").fetchone()
+        connection.executescript(SCHEMA)
+        if created:
+            # 之前版本创建的数据库没有作者汇总表，根据已有记录生成一次，之后由触发器维护
+            self._rebuild_author_stats(connection)
+        self.local.connection = connection
+        self.local.path = self.db_path
+        return connection
+
+    def _rebuild_author_stats(self, connection):
+        """根据videos表重新生成作者汇总表（在一个事务中完成，与其他连接的写入互不干扰）"""
+        with connection:
+            connection.execute("DELETE FROM author_stats")
+            connection.execute(
+                "INSERT INTO author_stats "
+                "SELECT author_id, (SELECT author_name FROM videos AS latest "
+                "                   WHERE latest.author_id = grouped.author_id AND author_name IS NOT NULL "
+                "                   ORDER BY id DESC LIMIT 1), "
+                "COUNT(*), SUM(likes), MAX(likes), SUM(comments), SUM(favorites), SUM(shares) "
+                "FROM videos AS grouped WHERE author_id IS NOT NULL AND author_id != '' GROUP BY author_id")
+
+    def close(self):
+        """关闭当前线程的数据库连接"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+    def upsert_many(self, records):
+        """
+        写入多条记录，同一(platform, video_id)已存在时更新，保留首次采集时间
+
+        Args:
+            records: DataProcessor处理后的数据字典列表
+
+        Returns:
+            写入的记录数
+        """
+        now = time.time()
+        rows = []
+        for record in records:
+            if not record or not record.get('video_id'):
+                continue
+            row = {column: record.get(column) for column in RECORD_COLUMNS}
+            row['platform'] = row['platform'] or 'unknown'
+            row['video_id'] = str(row['video_id'])
+            for column in METRIC_COLUMNS:
+                row[column] = _to_int(row[column])
+            row['collected_at'] = now
+            row['updated_at'] = now
+            rows.append(row)
+        if not rows:
+            return 0
+
+        columns = RECORD_COLUMNS + ['collected_at', 'updated_at']
+        updates = ', '.join(f"{column} = excluded.{column}" for column in RECORD_COLUMNS + ['updated_at']
+                            if column not in ('platform', 'video_id'))
+        sql = (f"INSERT INTO videos ({', '.join(columns)}) "
+               f"VALUES ({', '.join(':' + column for column in columns)}) "
+               f"ON CONFLICT (platform, video_id) DO UPDATE SET {updates}")
+        with self.write_lock:
+            connection = self.connection()
+            with connection:
+                connection.executemany(sql, rows)
+        return len(rows)
+
+    def upsert(self, record):
+        """写入单条记录"""
+        return self.upsert_many([record]) == 1
+
+    def update_stats(self, platform, video_id, stats):
+        """只更新互动数据，返回记录是否存在"""
+        assignments = ', '.join(f"{column} = ?" for column in METRIC_COLUMNS)
+        values = [_to_int(stats.get(column)) for column in METRIC_COLUMNS]
+        with self.write_lock:
+            connection = self.connection()
+            with connection:
+                cursor = connection.execute(
+                    f"UPDATE videos SET {assignments}, updated_at = ? WHERE platform = ? AND video_id = ?",
+                    values + [time.time(), platform, str(video_id)])
+        return cursor.rowcount > 0
+
+    def get_high_water(self, source_type, source_id):
+        """获取作者或话题上次采集到的最新视频ID，没有记录时返回None"""
+        row = self.connection().execute(
+            "SELECT high_water FROM crawl_state WHERE source_type = ? AND source_id = ?",
+            (source_type, source_id)).fetchone()
+        return row['high_water'] if row else None
+
+    def set_high_water(self, source_type, source_id, video_id):
+        """记录作者或话题本次采集到的最新视频ID"""
+        with self.write_lock:
+            connection = self.connection()
+            with connection:
+                connection.execute(
+                    "INSERT INTO crawl_state (source_type, source_id, high_water, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (source_type, source_id) DO UPDATE SET "
+                    "high_water = excluded.high_water, updated_at = excluded.updated_at",
+                    (source_type, source_id, str(video_id), time.time()))
+
+    def get_watch_state(self, source_type, source_id):
+        """获取监视来源的轮询状态，没有记录时返回None"""
+        row = self.connection().execute(
+            "SELECT * FROM watch_state WHERE source_type = ? AND source_id = ?",
+            (source_type, source_id)).fetchone()
+        return dict(row) if row else None
+
+    def set_watch_state(self, source_type, source_id, interval, next_poll, changed=False):
+        """记录一次轮询后的间隔和下次轮询时间"""
+        now = time.time()
+        with self.write_lock:
+            connection = self.connection()
+            with connection:
+                connection.execute(
+                    "INSERT INTO watch_state (source_type, source_id, interval, next_poll, last_change_at, polls, changes) "
+                    "VALUES (?, ?, ?, ?, ?, 1, ?) "
+                    "ON CONFLICT (source_type, source_id) DO UPDATE SET "
+                    "interval = excluded.interval, next_poll = excluded.next_poll, "
+                    "last_change_at = COALESCE(excluded.last_change_at, last_change_at), "
+                    "polls = polls + 1, changes = changes + excluded.changes",
+                    (source_type, source_id, interval, next_poll, now if changed else None, int(changed)))
+
+    def get(self, platform, video_id):
+        """按平台和视频ID获取一条记录"""
+        row = self.connection().execute(
+            "SELECT * FROM videos WHERE platform = ? AND video_id = ?", (platform, str(video_id))).fetchone()
+        return dict(row) if row else None
+
+    def exists(self, platform, video_id):
+        """是否已有该视频的记录"""
+        return self.connection().execute(
+            "SELECT 1 FROM videos WHERE platform = ? AND video_id = ?", (platform, str(video_id))).fetchone() is not None
+
+    def count(self):
+        """记录总数"""
+        return self.connection().execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def top_n(self, metric='likes', limit=100, since=None, until=None, platform=None):
+        """
+        按计数列排序获取前N条记录
+
+        Args:
+            metric: 排序列，likes/comments/favorites/shares之一
+            limit: 返回条数
+            since / until: 采集时间范围（datetime或时间戳）
+            platform: 只查询指定平台
+
+        Returns:
+            记录字典列表
+        """
+        if metric not in METRIC_COLUMNS:
+            raise ValueError(f"Unknown metric: {metric}")
+        where, params = self._time_filter(since, until, platform)
+        sql = f"SELECT * FROM videos {where} ORDER BY {metric} DESC LIMIT ?"
+        return [dict(row) for row in self.connection().execute(sql, params + [limit])]
+
+    def find_by_author(self, author_id, limit=None):
+        """获取指定作者的全部视频，按点赞数从高到低"""
+        sql = "SELECT * FROM videos WHERE author_id = ? ORDER BY likes DESC"
+        params = [author_id]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.connection().execute(sql, params)]
+
+    def find_by_time(self, since=None, until=None, platform=None, limit=None):
+        """按采集时间范围查询记录，按采集时间从新到旧"""
+        where, params = self._time_filter(since, until, platform)
+        sql = f"SELECT * FROM videos {where} ORDER BY collected_at DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self.connection().execute(sql, params)]
+
+    def author_summary(self, author_id=None, order_by='total_likes', limit=100):
+        """
+        按作者汇总视频数和互动数据
+
+        汇总数据保存在author_stats表中，写入记录时由触发器增量更新，查询不需要扫描全部记录。
+        作者名为该作者最近写入的记录中的名字。
+
+        Args:
+            author_id: 只汇总指定作者，不提供时汇总所有作者
+            order_by: 排序字段，video_count/total_likes/avg_likes/max_likes之一
+            limit: 返回的作者数
+
+        Returns:
+            汇总字典列表
+        """
+        # 排序表达式与author_stats上的索引一致，按索引顺序读取前limit个作者
+        orders = {
+            'video_count': 'video_count',
+            'total_likes': 'total_likes',
+            'avg_likes': 'CAST(total_likes AS REAL) / video_count',
+            'max_likes': 'max_likes'
+        }
+        if order_by not in orders:
+            raise ValueError(f"Unknown order: {order_by}")
+        where = "WHERE author_id = ?" if author_id else ""
+        params = [author_id] if author_id else []
+        sql = (
+            "SELECT author_id, author_name, video_count, total_likes, "
+            "CAST(total_likes AS REAL) / video_count AS avg_likes, max_likes, "
+            "total_comments, total_favorites, total_shares "
+            f"FROM author_stats {where} ORDER BY {orders[order_by]} DESC LIMIT ?"
+        )
+        return [dict(row) for row in self.connection().execute(sql, params + [limit])]
+
+    def iter_records(self, batch_size=1000):
+        """按插入顺序分批读取全部记录，内存占用与总记录数无关"""
+        cursor = self.connection().execute(
+            f"SELECT {', '.join(RECORD_COLUMNS)}, collected_at FROM videos ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+
+    def load_columns(self, columns=None, batch_size=10000):
+        """
+        按列读取全部记录
+
+        Args:
+            columns: 要读取的列，默认为全部数据列和采集时间
+
+        Returns:
+            列名到值列表的字典
+        """
+        columns = columns or RECORD_COLUMNS + ['collected_at']
+        unknown = set(columns) - set(RECORD_COLUMNS + ['collected_at', 'updated_at'])
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        connection = self.connection()
+        # 按元组读取，避免为每行创建Row对象
+        cursor = connection.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"SELECT {', '.join(columns)} FROM videos ORDER BY id")
+        values = {column: [] for column in columns}
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for column, batch in zip(columns, zip(*rows)):
+                values[column].extend(batch)
+        return values
+
+    def export(self, path, enrich=False):
+        """
+        从数据库导出全部记录，格式由扩展名决定（.xlsx/.csv/.jsonl）
+
+        Args:
+            path: 导出文件路径
+            enrich: 是否附加派生指标列和按作者、标签的汇总；
+                    .xlsx写入authors和tags工作表，其他格式写入同目录的<文件名>_authors/_tags文件
+
+        Returns:
+            导出的记录数，失败时返回None
+        """
+        ext = os.path.splitext(path)[1].lower()
+        try:
+            count = 0
+            if enrich:
+                count = self._export_enriched(path, ext)
+                if count is None:
+                    return None
+            elif ext == '.xlsx':
+                # 逐行写入，超过工作表行数上限时自动换到新的工作表
+                from core.excel_exporter import StreamingExcelWriter
+                with StreamingExcelWriter(path, RECORD_COLUMNS + ['collected_at']) as writer:
+                    for record in self.iter_records():
+                        record['collected_at'] = datetime.fromtimestamp(record['collected_at'])
+                        writer.write(record)
+                count = writer.rows
+            elif ext == '.csv':
+                with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+                    writer = csv.DictWriter(f, fieldnames=RECORD_COLUMNS + ['collected_at'])
+                    writer.writeheader()
+                    for record in self.iter_records():
+                        writer.writerow(record)
+                        count += 1
+            elif ext == '.jsonl':
+                with open(path, 'w', encoding='utf-8') as f:
+                    for record in self.iter_records():
+                        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                        count += 1
+            else:
+                logger.error(f"Unsupported export format: {ext}")
+                return None
+            logger.info(f"Exported {count} records to {path}")
+            return count
+        except Exception as e:
+            logger.error(f"Error exporting records: {e}")
+            return None
+
+    def _export_enriched(self, path, ext):
+        """导出全部记录及派生指标，返回记录数，格式不支持时返回None"""
+        import pandas as pd
+        from core.data_processor import DataProcessor
+
+        if ext not in ('.xlsx', '.csv', '.jsonl'):
+            logger.error(f"Unsupported export format: {ext}")
+            return None
+        processor = DataProcessor()
+        df = processor.enrich(self.load_columns())
+        df['collected_at'] = pd.to_datetime(df['collected_at'], unit='s')
+        sheets = {
+            'videos': df,
+            'authors': processor.author_aggregates(df),
+            'tags': processor.tag_aggregates(df)
+        }
+        if ext == '.xlsx':
+            # 记录逐行写入，与不计算指标的导出一样处理控制字符、超长单元格和行数上限；
+            # 汇总表只有每个作者或标签一行，写入同一文件的单独工作表
+            from core.excel_exporter import StreamingExcelWriter
+            with StreamingExcelWriter(path, list(df.columns)) as writer:
+                for record in _iter_frame_records(df):
+                    writer.write(record)
+                for name in ('authors', 'tags'):
+                    writer.append_sheet(name, list(sheets[name].columns), _iter_frame_records(sheets[name]))
+            return len(df)
+
+        stem = os.path.splitext(path)[0]
+        for name, sheet in sheets.items():
+            sheet_path = path if name == 'videos' else f"{stem}_{name}{ext}"
+            if ext == '.csv':
+                sheet.to_csv(sheet_path, index=False, encoding='utf-8-sig')
+            else:
+                sheet.to_json(sheet_path, orient='records', lines=True, force_ascii=False, date_format='iso')
+        return len(df)
+
+    def _time_filter(self, since, until, platform):
+        conditions = []
+        params = []
+        if since is not None:
+            conditions.append("collected_at >= ?")
+            params.append(_to_timestamp(since))
+        if until is not None:
+            conditions.append("collected_at < ?")
+            params.append(_to_timestamp(until))
+        if platform:
+            conditions.append("platform = ?")
+            params.append(platform)
+        where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+        return where, params
+
+
+def _iter_frame_records(df, chunk_size=10000):
+    """分块把DataFrame转换为字典，缺失值为None，不一次复制整个表"""
+    columns = list(df.columns)
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for values in chunk.itertuples(index=False, name=None):
+            yield dict(zip(columns, values))
+
+
+def _to_timestamp(value):
+    """将datetime或时间戳统一为时间戳"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+def _to_int(value):
+    """将计数转换为整数，无法转换时返回0"""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
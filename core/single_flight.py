@@ -0,0 +1,124 @@
+import threading
+from contextlib import contextmanager
+from utils.common import logger
+from core.batch_scheduler import OperationCancelled
+
+
+class _Call:
+    def __init__(self):
+        self.done = False
+        self.result = None
+        self.failed = False
+        self.error = None
+        self.waiters = []
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        合并同一个键的重复处理：同一视频在处理中时，后来的请求等待并共用它的结果
+
+        在scope()范围内，成功的结果保留到范围结束，之后出现的同一视频直接使用已有结果；
+        范围之外只合并同时进行的处理。
+        失败（返回None）的结果和处理中抛出的异常只交给正在等待的请求，不保留；
+        处理被取消（OperationCancelled，例如超出该请求的时间预算）时，等待的请求中的一个重新处理。
+        """
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.scopes = 0
+        self.coalesced = 0
+
+    @contextmanager
+    def scope(self):
+        """在范围内保留成功的结果（例如一个批次），所有范围结束后清除"""
+        with self.lock:
+            self.scopes += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.scopes -= 1
+                if self.scopes == 0:
+                    self.calls = {key: call for key, call in self.calls.items() if not call.done}
+
+    def do(self, key, func, cancel_token=None):
+        """
+        执行func()，同一个key已在处理中或已有结果时不再执行
+
+        Args:
+            key: 键，例如(平台, 视频ID)
+            func: 处理函数，无参数
+            cancel_token: 等待其他请求的结果时，取消后抛出OperationCancelled
+
+        Returns:
+            (结果, 是否使用了其他请求的结果)；等待的处理抛出异常时在本请求中抛出同一异常
+        """
+        while True:
+            with self.lock:
+                call = self.calls.get(key)
+                if call is None:
+                    call = self.calls[key] = _Call()
+                    break
+                if call.done:
+                    self.coalesced += 1
+                    return call.result, True
+                woken = threading.Event()
+                call.waiters.append(woken)
+            if cancel_token:
+                cancel_token.on_cancel(woken.set)
+            try:
+                woken.wait()
+            finally:
+                if cancel_token:
+                    cancel_token.remove_callback(woken.set)
+                    cancel_token.raise_if_cancelled()
+            with self.lock:
+                if call.done:
+                    self.coalesced += 1
+                    return call.result, True
+                if call.failed:
+                    # 只交给已在等待的请求，之后的请求重新处理
+                    self.coalesced += 1
+                    if call.error is not None:
+                        raise call.error
+                    return None, True
+            # 处理被取消，重新检查，必要时由本请求处理
+            logger.debug(f"Retrying {key} after the in-flight call was abandoned")
+
+        try:
+            result = func()
+        except OperationCancelled:
+            # 只是本请求被取消，等待的请求重新处理
+            self._finish(key, call, None, failed=False)
+            raise
+        except Exception as e:
+            self._finish(key, call, None, failed=True, error=e)
+            raise
+        except BaseException:
+            self._finish(key, call, None, failed=False)
+            raise
+        self._finish(key, call, result, failed=not result)
+        return result, False
+
+    def _finish(self, key, call, result, failed, error=None):
+        with self.lock:
+            call.error = error
+            if result:
+                call.done = True
+                call.result = result
+                if self.scopes == 0:
+                    del self.calls[key]
+            else:
+                call.failed = failed
+                del self.calls[key]
+            waiters, call.waiters = call.waiters, []
+        for woken in waiters:
+            woken.set()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'in_flight': sum(1 for call in self.calls.values() if not call.done),
+                'completed': sum(1 for call in self.calls.values() if call.done),
+                'coalesced': self.coalesced
+            }
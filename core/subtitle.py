@@ -1,11 +1,23 @@
 import os
+import re
 import subprocess
 import tempfile
 from utils.common import logger
+from core.media_jobs import get_media_scheduler, PRIORITY_HIGH
+from core.batch_scheduler import OperationCancelled
+from core.downloader import temp_media_path
+
+# SRT时间行，例如 00:00:01,000 --> 00:00:03,500
+SRT_TIME_PATTERN = re.compile(
+    r'(\d{1,2}):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d{1,2}):(\d{2}):(\d{2})[,.](\d{3})')
+
+def _srt_seconds(hours, minutes, seconds, millis):
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
 
 class SubtitleExtractor:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, media_scheduler=None):
         self.api_key = api_key
+        self.media_scheduler = media_scheduler or get_media_scheduler()
         # 检查ffmpeg是否可用
         try:
             subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -14,38 +26,53 @@ class SubtitleExtractor:
             logger.warning("ffmpeg not found. Some subtitle extraction features may be unavailable.")
             self.ffmpeg_available = False
     
-    def extract_embedded_subtitle(self, video_path):
-        """提取视频中嵌入的字幕"""
+    def extract_embedded_subtitle(self, video_path, cancel_token=None):
+        """提取视频中嵌入的字幕，cancel_token取消时结束ffmpeg进程并抛出OperationCancelled"""
         if not self.ffmpeg_available:
             logger.error("Cannot extract subtitle: ffmpeg not available")
             return None
         
+        temp_path = None
         try:
             subtitle_path = os.path.splitext(video_path)[0] + ".srt"
+            # 先写入临时文件，ffmpeg超时或被结束时留下的不完整字幕不会被当作结果
+            temp_path = temp_media_path(subtitle_path)
             cmd = [
                 'ffmpeg',
                 '-i', video_path,
                 '-map', '0:s:0',  # 选择第一个字幕流
                 '-y',              # 覆盖已存在的文件
-                subtitle_path
+                temp_path
             ]
             
-            process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            # 检查字幕文件是否生成
-            if os.path.exists(subtitle_path) and os.path.getsize(subtitle_path) > 0:
+            # 字幕流很小，优先执行，避免排在音频转码后面
+            result = self.media_scheduler.run(cmd, priority=PRIORITY_HIGH, timeout=120, cancel_token=cancel_token)
+            if cancel_token and cancel_token.cancelled:
+                raise OperationCancelled(cancel_token.reason)
+            if result['timed_out']:
+                logger.warning(f"Subtitle extraction timed out: {video_path}")
+                return None
+            # 检查字幕文件是否生成（没有字幕流时ffmpeg返回非零）
+            if result['returncode'] == 0 and os.path.getsize(temp_path) > 0:
+                os.replace(temp_path, subtitle_path)
                 logger.info(f"Successfully extracted subtitle: {subtitle_path}")
                 return subtitle_path
             else:
                 logger.warning("No embedded subtitle found in video")
                 return None
+        except OperationCancelled:
+            raise
         except Exception as e:
             logger.error(f"Error extracting embedded subtitle: {e}")
             return None
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
     
     def extract_audio_to_text(self, audio_path):
         """
         使用语音识别API将音频转换为文本
-        注意：这需要外部API支持，这里只是一个占位实现
+        注意：这需要外部API支持，这里只是一个占位实现，返回None（没有识别结果，不会写入表格和字幕索引）
         """
         logger.info("Audio to text conversion requires an external API")
         logger.info("Please implement integration with a speech recognition service")
@@ -53,29 +80,63 @@ class SubtitleExtractor:
         # 实际实现需要调用语音识别API
         # 例如百度AI、讯飞等
         
-        return "This is a placeholder for speech recognition result."
+        return None
     
-    def get_subtitle(self, video_path, audio_path=None):
+    def parse_srt(self, content):
         """
-        尝试获取字幕，优先从视频中提取，如果没有则尝试语音识别
+        解析SRT字幕内容为带时间的片段列表
+        
+        Returns:
+            [{'start': 开始秒数, 'end': 结束秒数, 'text': 文本}, ...]，多行字幕的文本保留原来的换行
+        """
+        segments = []
+        for block in re.split(r'\r?\n\s*\r?\n', content.strip()):
+            match = SRT_TIME_PATTERN.search(block)
+            if not match:
+                continue
+            text = block[match.end():].strip()
+            if not text:
+                continue
+            segments.append({
+                'start': _srt_seconds(*match.group(1, 2, 3, 4)),
+                'end': _srt_seconds(*match.group(5, 6, 7, 8)),
+                'text': '\n'.join(text.splitlines())
+            })
+        return segments
+    
+    def get_subtitle_segments(self, video_path, audio_path=None, cancel_token=None):
+        """
+        获取带时间的字幕片段，优先从视频中提取，如果没有则尝试语音识别
+        
+        只获取音频时video_path为None，直接使用语音识别
         """
         # 先尝试提取嵌入字幕
-        subtitle_path = self.extract_embedded_subtitle(video_path)
+        subtitle_path = self.extract_embedded_subtitle(video_path, cancel_token) if video_path else None
         if subtitle_path:
-            # 读取字幕文件并返回纯文本
             try:
                 with open(subtitle_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                # 移除时间戳和序号，保留文本
-                import re
-                text_only = re.sub(r'\d+\n\d{2}:\d{2}:\d{2},\d{3} --> \d{2}:\d{2}:\d{2},\d{3}\n', '', content)
-                text_only = re.sub(r'\n\n+', '\n', text_only).strip()
-                return text_only
+                    segments = self.parse_srt(f.read())
+                if segments:
+                    return segments
             except Exception as e:
                 logger.error(f"Error reading subtitle file: {e}")
         
         # 如果没有嵌入字幕且提供了音频路径，尝试语音识别
         if audio_path:
-            return self.extract_audio_to_text(audio_path)
+            text = self.extract_audio_to_text(audio_path)
+            if text:
+                return [{'start': 0.0, 'end': 0.0, 'text': text}]
         
-        return None
\ No newline at end of file
+        return None
+    
+    def segments_to_text(self, segments):
+        """将字幕片段合并为纯文本（去掉序号和时间行，与原来写入表格的内容相同）"""
+        if not segments:
+            return None
+        return '\n'.join(segment['text'] for segment in segments)
+    
+    def get_subtitle(self, video_path, audio_path=None):
+        """
+        尝试获取字幕，优先从视频中提取，如果没有则尝试语音识别
+        """
+        return self.segments_to_text(self.get_subtitle_segments(video_path, audio_path))
\ No newline at end of file
@@ -0,0 +1,176 @@
+import re
+from utils.common import logger
+
+# 中文字符连续段或英文/数字单词
+TOKEN_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-z]+')
+
+
+def tokenize(text):
+    """
+    将文本切分为索引词
+
+    中文按相邻两个字切分（二元组），不依赖分词词典；英文和数字按单词切分。
+    单独出现的一个汉字作为一个词。
+    """
+    terms = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        run = match.group()
+        if run.isascii() or len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def normalize_text(text):
+    """去掉空白并转为小写，用于确认短语是否真正出现"""
+    return re.sub(r'\s+', '', text).lower()
+
+
+def format_timestamp(seconds):
+    """将秒数格式化为 分:秒 或 时:分:秒"""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+class TranscriptIndex:
+    def __init__(self, record_store):
+        """
+        字幕全文索引，保存在RecordStore的数据库中
+
+        字幕按带时间的片段保存，倒排表记录每个词出现在哪些片段中，
+        另有词频表用于查询时先读最短的倒排列表。
+
+        Args:
+            record_store: RecordStore实例
+        """
+        self.record_store = record_store
+
+    def add(self, platform, video_id, segments):
+        """
+        写入或替换一个视频的字幕片段，同时更新倒排索引
+
+        Args:
+            platform: 平台名称
+            video_id: 视频ID
+            segments: [{'start': 秒, 'end': 秒, 'text': 文本}, ...]
+
+        Returns:
+            写入的片段数
+        """
+        video_id = str(video_id)
+        store = self.record_store
+        with store.write_lock:
+            connection = store.connection()
+            with connection:
+                self._remove(connection, platform, video_id)
+                term_counts = {}
+                postings = []
+                for segment in segments or []:
+                    text = segment.get('text', '').strip()
+                    if not text:
+                        continue
+                    cursor = connection.execute(
+                        "INSERT INTO transcript_segments (platform, video_id, start_ms, end_ms, text) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (platform, video_id, int(segment.get('start', 0) * 1000),
+                         int(segment.get('end', 0) * 1000), text))
+                    for term in set(tokenize(text)):
+                        postings.append((term, cursor.lastrowid))
+                        term_counts[term] = term_counts.get(term, 0) + 1
+                connection.executemany(
+                    "INSERT INTO transcript_postings (term, segment_id) VALUES (?, ?)", postings)
+                connection.executemany(
+                    "INSERT INTO transcript_terms (term, df) VALUES (?, ?) "
+                    "ON CONFLICT (term) DO UPDATE SET df = df + excluded.df", term_counts.items())
+        return len(segments or [])
+
+    def _remove(self, connection, platform, video_id):
+        """删除一个视频已有的字幕片段和对应的倒排记录"""
+        rows = connection.execute(
+            "SELECT id, text FROM transcript_segments WHERE platform = ? AND video_id = ?",
+            (platform, video_id)).fetchall()
+        if not rows:
+            return
+        removed = []
+        term_counts = {}
+        for segment_id, text in rows:
+            for term in set(tokenize(text)):
+                removed.append((term, segment_id))
+                term_counts[term] = term_counts.get(term, 0) + 1
+        connection.executemany("DELETE FROM transcript_postings WHERE term = ? AND segment_id = ?", removed)
+        connection.executemany("UPDATE transcript_terms SET df = df - ? WHERE term = ?",
+                               [(count, term) for term, count in term_counts.items()])
+        connection.execute("DELETE FROM transcript_terms WHERE df <= 0")
+        connection.executemany("DELETE FROM transcript_segments WHERE id = ?", [(row[0],) for row in rows])
+
+    def search(self, phrase, limit=100):
+        """
+        查找包含短语的字幕片段
+
+        Args:
+            phrase: 要查找的短语
+            limit: 最多返回的片段数
+
+        Returns:
+            [{'platform', 'video_id', 'title', 'start', 'end', 'text'}, ...]，按视频和时间排序
+        """
+        needle = normalize_text(phrase)
+        if not needle:
+            return []
+        connection = self.record_store.connection()
+        # 单个汉字等无法组成二元组的词不参与索引查找，由最后的短语确认覆盖
+        terms = sorted({term for term in tokenize(phrase)
+                        if term.isascii() or len(term) > 1})
+
+        if terms:
+            placeholders = ', '.join('?' for _ in terms)
+            frequencies = dict(connection.execute(
+                f"SELECT term, df FROM transcript_terms WHERE term IN ({placeholders})", terms).fetchall())
+            if len(frequencies) < len(terms):
+                # 有词从未出现过，不可能匹配
+                return []
+            # 从最短的倒排列表开始，其余词用主键查找确认
+            terms.sort(key=lambda term: frequencies[term])
+            conditions = ' '.join(
+                f"AND EXISTS (SELECT 1 FROM transcript_postings p{i} WHERE p{i}.term = ? AND p{i}.segment_id = p.segment_id)"
+                for i in range(1, len(terms)))
+            candidates = connection.execute(
+                "SELECT s.id, s.platform, s.video_id, s.start_ms, s.end_ms, s.text "
+                f"FROM transcript_postings p JOIN transcript_segments s ON s.id = p.segment_id "
+                f"WHERE p.term = ? {conditions}", terms)
+        else:
+            logger.info(f"Phrase '{phrase}' has no index terms, scanning segments")
+            candidates = connection.execute(
+                "SELECT id, platform, video_id, start_ms, end_ms, text FROM transcript_segments "
+                "WHERE text LIKE ?", (f"%{phrase.strip()}%",))
+
+        hits = []
+        for row in candidates:
+            if needle in normalize_text(row[5]):
+                hits.append(row)
+                if len(hits) >= limit:
+                    break
+        hits.sort(key=lambda row: (row[1], row[2], row[3]))
+
+        titles = {}
+        results = []
+        for _, platform, video_id, start_ms, end_ms, text in hits:
+            key = (platform, video_id)
+            if key not in titles:
+                record = self.record_store.get(platform, video_id)
+                titles[key] = record['title'] if record else ''
+            results.append({
+                'platform': platform,
+                'video_id': video_id,
+                'title': titles[key],
+                'start': start_ms / 1000,
+                'end': end_ms / 1000,
+                # 多行字幕合并为一行显示
+                'text': ' '.join(text.split())
+            })
+        return results
@@ -0,0 +1,115 @@
+import time
+import heapq
+import random
+import itertools
+import threading
+from utils.common import logger
+from core.author_crawler import SOURCE_TYPES
+
+
+class Watcher:
+    def __init__(self, pipeline, sources, min_interval=300, max_interval=6 * 3600,
+                 initial_pages=1, extract_audio=True, jitter=0.1, on_poll=None):
+        """
+        持续监视作者和话题，发现新作品时送入下载流程
+
+        每个来源有自己的轮询间隔：发现新作品后间隔减半，没有新作品时放大1.5倍，请求失败时加倍，
+        始终限制在min_interval和max_interval之间。间隔和下次轮询时间保存在数据库中，重启后继续使用。
+        每次轮询从作品列表第一页开始，遇到上次记录的最新作品（high-water）即停止，
+        没有新作品的来源只请求一页，轮询开销与新作品数成正比，与来源的作品总数无关。
+
+        Args:
+            pipeline: VideoPipeline实例
+            sources: [(来源类型, 来源ID), ...]，来源类型为'author'或'hashtag'
+            min_interval: 最短轮询间隔（秒）
+            max_interval: 最长轮询间隔（秒）
+            initial_pages: 还没有采集记录的来源第一次轮询时最多读取的页数，之前的作品不再采集
+            extract_audio: 是否提取音频
+            jitter: 间隔的随机浮动比例，避免多个来源同时轮询
+            on_poll: 每次轮询后调用，参数为(来源类型, 来源ID, 统计字典, 下次轮询的间隔)
+        """
+        for source_type, _ in sources:
+            if source_type not in SOURCE_TYPES:
+                raise ValueError(f"Unknown source type: {source_type}")
+        self.pipeline = pipeline
+        self.record_store = pipeline.record_store
+        self.sources = list(dict.fromkeys(sources))
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_pages = initial_pages
+        self.extract_audio = extract_audio
+        self.jitter = jitter
+        self.on_poll = on_poll
+        self.stop_event = threading.Event()
+        self.counter = itertools.count()
+
+    def stop(self):
+        """停止监视，正在进行的轮询完成后退出"""
+        self.stop_event.set()
+
+    def next_interval(self, interval, summary):
+        """根据本次轮询结果计算下次轮询间隔"""
+        if summary.get('error'):
+            interval *= 2
+        elif summary['found']:
+            interval /= 2
+        else:
+            interval *= 1.5
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def poll(self, source_type, source_id, interval):
+        """
+        轮询一个来源
+
+        Returns:
+            (统计字典, 新的轮询间隔, 加上随机浮动后到下次轮询的秒数)
+        """
+        known = self.record_store.get_high_water(source_type, source_id) is not None
+        summary = self.pipeline.crawl_source(source_type, source_id, self.extract_audio, incremental=True,
+                                             max_pages=None if known else self.initial_pages)
+        interval = self.next_interval(interval, summary)
+        delay = interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.record_store.set_watch_state(source_type, source_id, interval, time.time() + delay,
+                                          changed=summary['found'] > 0)
+        return summary, interval, delay
+
+    def run(self, max_polls=None):
+        """
+        按各来源的下次轮询时间依次轮询，直到stop()被调用
+
+        Args:
+            max_polls: 最多轮询次数，用于测试或只运行一轮
+
+        Returns:
+            统计字典：polls 轮询次数，found 发现的新作品数，success 处理成功数
+        """
+        now = time.time()
+        schedule = []
+        for source_type, source_id in self.sources:
+            state = self.record_store.get_watch_state(source_type, source_id)
+            interval = state['interval'] if state else self.min_interval
+            next_poll = state['next_poll'] if state else now
+            heapq.heappush(schedule, (next_poll, next(self.counter), source_type, source_id, interval))
+        logger.info(f"Watching {len(schedule)} sources")
+
+        totals = {'polls': 0, 'found': 0, 'success': 0}
+        while schedule and not self.stop_event.is_set():
+            next_poll, _, source_type, source_id, interval = schedule[0]
+            wait = next_poll - time.time()
+            if wait > 0:
+                # 等待下一个来源到期，stop()时立即返回
+                self.stop_event.wait(wait)
+                continue
+            heapq.heappop(schedule)
+
+            summary, interval, delay = self.poll(source_type, source_id, interval)
+            totals['polls'] += 1
+            totals['found'] += summary['found']
+            totals['success'] += summary['success']
+            logger.info(f"Polled {source_type} {source_id}: {summary['found']} new, next poll in {delay:.0f}s")
+            if self.on_poll:
+                self.on_poll(source_type, source_id, summary, delay)
+            heapq.heappush(schedule, (time.time() + delay, next(self.counter), source_type, source_id, interval))
+            if max_polls and totals['polls'] >= max_polls:
+                break
+        return totals
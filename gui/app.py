@@ -2,17 +2,16 @@ import os
 import sys
 import threading
 import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
+from tkinter import filedialog, messagebox, scrolledtext, simpledialog
 from tkinter import ttk
 import time
 from utils.common import logger, create_directory
-from core.link_parser import LinkParser
-from core.content_fetcher import ContentFetcher
-from core.downloader import Downloader
-from core.subtitle import SubtitleExtractor
-from core.data_processor import DataProcessor
-from core.excel_exporter import ExcelExporter
-from auth.login import LoginManager
+from core.pipeline import VideoPipeline
+from core.progress import ProgressReporter, format_progress
+from core.transcript_index import format_timestamp
+from core.metrics_refresher import MetricsRefresher
+from core.http_cache import ResponseCache
+from core.profiler import Profiler
 
 class VideoDownloaderApp:
     def __init__(self, root):
@@ -20,14 +19,24 @@ class VideoDownloaderApp:
         self.root.title("短视频内容采集系统")
         self.root.geometry("800x600")
         
-        # 初始化各模块
-        self.link_parser = LinkParser()
-        self.content_fetcher = ContentFetcher()
-        self.downloader = Downloader()
-        self.subtitle_extractor = SubtitleExtractor()
-        self.data_processor = DataProcessor()
-        self.excel_exporter = ExcelExporter()
-        self.login_manager = LoginManager()
+        # 初始化采集流程及各模块
+        self.pipeline = VideoPipeline(
+            log_callback=self.log,
+            status_callback=self.update_status,
+            login_handler=self.handle_login_required
+        )
+        self.link_parser = self.pipeline.link_parser
+        self.content_fetcher = self.pipeline.content_fetcher
+        self.downloader = self.pipeline.downloader
+        self.subtitle_extractor = self.pipeline.subtitle_extractor
+        self.data_processor = self.pipeline.data_processor
+        self.excel_exporter = self.pipeline.excel_exporter
+        self.login_manager = self.pipeline.login_manager
+        self.record_store = self.pipeline.record_store
+        self.metrics_refresher = MetricsRefresher(self.content_fetcher, self.link_parser, self.record_store)
+        
+        # 已完成的条目数，用于计算进度条位置
+        self.items_done = 0
         
         # 设置默认下载目录
         self.download_dir = os.path.join(os.path.expanduser("~"), "Downloads", "video_crawler")
@@ -36,7 +45,7 @@ class VideoDownloaderApp:
         
         # 设置默认Excel文件路径
         self.excel_path = os.path.join(self.download_dir, "video_data.xlsx")
-        self.excel_exporter.set_excel_path(self.excel_path)
+        self.pipeline.set_excel_path(self.excel_path)
         
         # 创建UI组件
         self.create_widgets()
@@ -54,15 +63,20 @@ class VideoDownloaderApp:
         ttk.Label(input_frame, text="请输入视频链接:").pack(anchor=tk.W)
         self.link_text = scrolledtext.ScrolledText(input_frame, height=5)
         self.link_text.pack(fill=tk.X, pady=5)
-        self.link_text.insert(tk.END, "粘贴链接，每行一个...")
+        self.link_text.insert(tk.END, "粘贴链接，每行一个，以 ! 开头的链接优先处理...")
         
         # 按钮区域
         button_frame = ttk.Frame(input_frame)
         button_frame.pack(fill=tk.X, pady=5)
         
         ttk.Button(button_frame, text="下载视频", command=self.start_download).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="停止", command=self.stop_download).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="选择下载目录", command=self.select_download_dir).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="选择Excel文件", command=self.select_excel_file).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="刷新互动数据", command=self.start_refresh).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="采集作者作品", command=self.start_author_crawl).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="导出数据", command=self.export_records).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="搜索字幕", command=self.search_transcripts).pack(side=tk.LEFT, padx=5)
         
         # 设置区域
         settings_frame = ttk.LabelFrame(main_frame, text="设置", padding="5")
@@ -72,6 +86,35 @@ class VideoDownloaderApp:
         self.extract_audio_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(settings_frame, text="提取音频", variable=self.extract_audio_var).pack(anchor=tk.W)
         
+        # 只获取音频选项：只需要字幕和元数据时不下载视频文件
+        self.audio_only_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="只获取音频（不保存视频）", variable=self.audio_only_var,
+                        command=lambda: self.downloader.set_audio_only(self.audio_only_var.get())).pack(anchor=tk.W)
+        
+        # 页面缓存选项：重复采集或调试时不重复请求视频页面
+        self.use_cache_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="缓存视频页面", variable=self.use_cache_var,
+                        command=self.apply_cache_setting).pack(anchor=tk.W)
+        
+        # 性能分析选项：分析每个条目各阶段的耗时和内存分配，结果保存在下载目录的profiles子目录中
+        self.profile_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="性能分析", variable=self.profile_var,
+                        command=self.apply_profile_setting).pack(anchor=tk.W)
+        
+        # 导出选项：附加互动率等派生指标，以及按作者、标签汇总的工作表
+        self.enrich_export_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="导出时计算汇总指标", variable=self.enrich_export_var).pack(anchor=tk.W)
+        
+        # 限速设置：下载过程中修改立即生效
+        rate_frame = ttk.Frame(settings_frame)
+        rate_frame.pack(fill=tk.X, pady=2)
+        ttk.Label(rate_frame, text="限速 (MB/s，0为不限):").pack(side=tk.LEFT)
+        self.rate_var = tk.StringVar(value="0")
+        rate_entry = ttk.Entry(rate_frame, textvariable=self.rate_var, width=8)
+        rate_entry.pack(side=tk.LEFT, padx=5)
+        rate_entry.bind('<Return>', lambda event: self.apply_rate_limit())
+        ttk.Button(rate_frame, text="应用", command=self.apply_rate_limit).pack(side=tk.LEFT)
+        
         # 显示路径
         path_frame = ttk.Frame(settings_frame)
         path_frame.pack(fill=tk.X, pady=5)
@@ -96,6 +139,11 @@ class VideoDownloaderApp:
         self.progress = ttk.Progressbar(main_frame, orient=tk.HORIZONTAL, length=100, mode='determinate')
         self.progress.pack(fill=tk.X, pady=5)
         
+        # 当前文件的传输进度
+        self.transfer_var = tk.StringVar(value="")
+        ttk.Label(main_frame, textvariable=self.transfer_var, anchor=tk.W).pack(fill=tk.X)
+        self.downloader.set_progress_reporter(ProgressReporter(self.on_transfer_progress))
+        
         # 状态栏
         self.status_var = tk.StringVar(value="就绪")
         status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
@@ -124,9 +172,10 @@ class VideoDownloaderApp:
             
             # 更新默认Excel路径
             self.excel_path = os.path.join(directory, "video_data.xlsx")
-            self.excel_exporter.set_excel_path(self.excel_path)
+            self.pipeline.set_excel_path(self.excel_path)
             self.excel_path_label.config(text=self.excel_path)
             
+            self.apply_cache_setting()
             self.log(f"下载目录已设置为: {directory}")
     
     def select_excel_file(self):
@@ -139,104 +188,69 @@ class VideoDownloaderApp:
         )
         if file_path:
             self.excel_path = file_path
-            self.excel_exporter.set_excel_path(file_path)
+            self.pipeline.set_excel_path(file_path)
             self.excel_path_label.config(text=file_path)
             self.log(f"Excel文件已设置为: {file_path}")
     
+    def apply_cache_setting(self):
+        """根据设置开启或关闭页面缓存，缓存保存在下载目录的cache子目录中"""
+        if self.use_cache_var.get():
+            cache_dir = os.path.join(self.download_dir, "cache")
+            if not self.content_fetcher.cache or self.content_fetcher.cache.cache_dir != cache_dir:
+                self.content_fetcher.set_cache(ResponseCache(cache_dir))
+        else:
+            self.content_fetcher.set_cache(None)
+    
+    def apply_rate_limit(self):
+        """设置全局限速，正在进行的下载立即按新速率执行"""
+        try:
+            rate = float(self.rate_var.get() or 0)
+        except ValueError:
+            messagebox.showerror("错误", "请输入数字")
+            return
+        self.downloader.bandwidth.set_rate(int(max(0.0, rate) * 1024 * 1024))
+        self.log(f"限速已设置为: {rate:g} MB/s" if rate > 0 else "已取消限速")
+    
+    def apply_profile_setting(self):
+        """根据设置开启或关闭性能分析"""
+        if self.profile_var.get():
+            self.pipeline.set_profiler(Profiler(os.path.join(self.download_dir, "profiles")))
+        else:
+            self.pipeline.dump_profile()
+            self.pipeline.set_profiler(None)
+    
     def process_link(self, link_text):
         """处理单个链接"""
-        try:
-            # 解析链接
-            self.update_status("正在解析链接...")
-            link_info = self.link_parser.parse_link(link_text)
-            if not link_info:
-                self.log(f"无法解析链接: {link_text}")
-                return None
-            
-            platform = link_info.get('platform')
-            video_id = link_info.get('video_id')
-            original_url = link_info.get('original_url')
-            
-            self.log(f"解析链接成功: 平台={platform}, 视频ID={video_id}")
-            
-            # 获取视频信息
-            self.update_status("正在获取视频信息...")
-            video_info = self.content_fetcher.fetch_video_info(platform, video_id, original_url)
-            
-            # 检查是否需要登录
-            if video_info and video_info.get('login_required'):
-                self.log("需要登录才能获取此视频信息")
-                # 弹窗提示登录
-                if messagebox.askyesno("登录提示", "需要登录才能继续。是否要登录？"):
-                    self.show_login_dialog(platform)
-                    # 登录后重新获取视频信息
-                    cookies = self.login_manager.load_cookies(platform)
-                    if cookies:
-                        self.content_fetcher.update_cookies(cookies)
-                        video_info = self.content_fetcher.fetch_video_info(platform, video_id, original_url)
-                    else:
-                        self.log("登录失败或取消")
-                        return None
-                else:
-                    return None
-            
-            if not video_info or not video_info.get('play_url'):
-                self.log(f"无法获取视频信息或播放地址")
-                return None
-            
-            # 下载视频
-            self.update_status("正在下载视频...")
-            extract_audio = self.extract_audio_var.get()
-            download_info = self.downloader.download_video(video_info, extract_audio)
-            
-            if not download_info:
-                self.log("视频下载失败")
-                return None
-            
-            self.log(f"视频下载成功: {download_info['video_path']}")
-            
-            # 提取字幕
-            self.update_status("正在提取字幕...")
-            subtitle_text = None
-            if download_info.get('video_path'):
-                subtitle_text = self.subtitle_extractor.get_subtitle(
-                    download_info['video_path'],
-                    download_info.get('audio_path')
-                )
-                if subtitle_text:
-                    self.log("字幕提取成功")
-                else:
-                    self.log("无法提取字幕")
-            
-            # 处理数据
-            processed_data = self.data_processor.process_video_data(
-                video_info,
-                download_info,
-                subtitle_text
-            )
-            
-            if not processed_data:
-                self.log("数据处理失败")
-                return None
-            
-            # 导出到Excel
-            self.update_status("正在导出到Excel...")
-            if self.excel_exporter.export_single_item(processed_data):
-                self.log(f"数据已导出到Excel: {self.excel_path}")
-            else:
-                self.log("数据导出失败")
-            
-            return processed_data
-        
-        except Exception as e:
-            self.log(f"处理链接时出错: {str(e)}")
-            logger.exception("处理链接异常")
-            return None
+        return self.pipeline.process_link(link_text, self.extract_audio_var.get())
+    
+    def handle_login_required(self, platform):
+        """弹窗提示登录，返回用户是否进行了登录"""
+        if messagebox.askyesno("登录提示", "需要登录才能继续。是否要登录？"):
+            self.show_login_dialog(platform)
+            return True
+        return False
+    
+    def on_transfer_progress(self, event):
+        """下载进度回调（在下载线程中调用），转交给界面线程更新"""
+        self.root.after(0, self.apply_transfer_progress, event)
+    
+    def apply_transfer_progress(self, event):
+        """根据进度事件更新进度条和传输信息"""
+        if event['kind'] == 'file':
+            self.transfer_var.set(f"当前文件: {format_progress(event)}")
+            # 进度条按条目计数，当前文件按已下载比例计入
+            if event['total'] and not event['finished']:
+                self.progress['value'] = self.items_done + event['downloaded'] / event['total']
+        else:
+            self.items_done = event['items_done']
+            self.progress['value'] = self.items_done
+            if event['downloaded']:
+                self.status_var.set(f"总进度: {format_progress(event)}")
     
     def start_download(self):
         """开始下载处理"""
         links_text = self.link_text.get("1.0", tk.END).strip()
-        if not links_text or links_text == "粘贴链接，每行一个...":
+        if not links_text or links_text == "粘贴链接，每行一个，以 ! 开头的链接优先处理...":
             messagebox.showinfo("提示", "请输入视频链接")
             return
         
@@ -260,28 +274,21 @@ class VideoDownloaderApp:
         # 设置进度条
         self.progress['maximum'] = len(links)
         self.progress['value'] = 0
+        self.items_done = 0
         
         # 在新线程中处理下载，避免界面卡顿
         threading.Thread(target=self.download_thread, args=(links,), daemon=True).start()
     
+    def stop_download(self):
+        """停止正在进行的批量下载，当前链接在一秒内中断"""
+        if self.pipeline.batch_scheduler.is_running():
+            self.pipeline.cancel_batch()
+            self.update_status("正在停止...")
+    
     def download_thread(self, links):
         """在线程中处理下载"""
         try:
-            processed_count = 0
-            success_count = 0
-            
-            for i, link in enumerate(links):
-                self.log(f"处理链接 {i+1}/{len(links)}: {link}")
-                
-                result = self.process_link(link)
-                processed_count += 1
-                
-                if result:
-                    success_count += 1
-                
-                # 更新进度条
-                self.progress['value'] = processed_count
-                self.root.update_idletasks()
+            success_count = self.pipeline.process_links(links, self.extract_audio_var.get())
             
             # 完成处理
             self.update_status(f"处理完成: {success_count}/{len(links)} 成功")
@@ -298,6 +305,72 @@ class VideoDownloaderApp:
                 if isinstance(widget, ttk.Button):
                     widget.config(state=tk.NORMAL)
     
+    def start_author_crawl(self):
+        """输入作者ID，采集该作者的作品"""
+        author_id = simpledialog.askstring("采集作者作品", "请输入作者ID (sec_user_id):", parent=self.root)
+        if not author_id or not author_id.strip():
+            return
+        threading.Thread(target=self.author_crawl_thread, args=(author_id.strip(),), daemon=True).start()
+    
+    def author_crawl_thread(self, author_id):
+        """在线程中采集作者作品"""
+        summary = self.pipeline.crawl_author(author_id, self.extract_audio_var.get())
+        self.update_status(f"作者采集完成: 新作品 {summary['found']} 个, 成功 {summary['success']} 个")
+    
+    def search_transcripts(self):
+        """在已采集视频的字幕中搜索短语，结果显示在日志区域"""
+        phrase = simpledialog.askstring("搜索字幕", "请输入要搜索的内容:", parent=self.root)
+        if not phrase or not phrase.strip():
+            return
+        results = self.pipeline.transcript_index.search(phrase)
+        self.log(f"字幕搜索 \"{phrase}\": 找到 {len(results)} 处")
+        for hit in results:
+            self.log(f"  [{hit['platform']}/{hit['video_id']}] {format_timestamp(hit['start'])} "
+                     f"{hit['title'][:20]}: {hit['text']}")
+    
+    def export_records(self):
+        """从本地数据库导出全部记录"""
+        file_path = filedialog.asksaveasfilename(
+            initialdir=self.download_dir,
+            initialfile="video_data_export.xlsx",
+            defaultextension=".xlsx",
+            filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv"), ("JSON Lines", "*.jsonl")]
+        )
+        if not file_path:
+            return
+        count = self.record_store.export(file_path, enrich=self.enrich_export_var.get())
+        if count is None:
+            messagebox.showerror("错误", "导出失败")
+        else:
+            self.log(f"已从数据库导出 {count} 条记录: {file_path}")
+    
+    def start_refresh(self):
+        """开始刷新已采集视频的互动数据"""
+        if not os.path.exists(self.excel_path):
+            messagebox.showinfo("提示", "Excel文件不存在，请先采集视频")
+            return
+        
+        self.progress['value'] = 0
+        threading.Thread(target=self.refresh_thread, daemon=True).start()
+    
+    def refresh_thread(self):
+        """在线程中刷新互动数据，只获取元数据，不重新下载视频"""
+        def on_progress(done, total):
+            self.progress['maximum'] = total
+            self.progress['value'] = done
+            self.status_var.set(f"正在刷新互动数据: {done}/{total}")
+        
+        self.log(f"开始刷新互动数据: {self.excel_path}")
+        summary = self.metrics_refresher.refresh(self.excel_path, on_progress)
+        if summary:
+            message = (f"刷新完成: {summary['fetched']}/{summary['total']} 成功, "
+                       f"{summary['changed_rows']} 行数据有变化")
+            self.log(message)
+            self.update_status(message)
+        else:
+            self.log("刷新互动数据失败")
+            self.update_status("刷新互动数据失败")
+    
     def show_login_dialog(self, platform):
         """显示登录对话框"""
         login_window = tk.Toplevel(self.root)
@@ -1,17 +1,284 @@
+import os
 import sys
-import tkinter as tk
-from gui.app import VideoDownloaderApp
+import time
+import argparse
 from utils.common import setup_logger
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="短视频内容采集系统")
+    parser.add_argument('links', nargs='*',
+                        help="要采集的视频链接；提供链接时以命令行模式运行，不打开界面")
+    parser.add_argument('--links-file', metavar='FILE',
+                        help="从文件读取链接，每行一个")
+    parser.add_argument('--download-dir', help="下载目录")
+    parser.add_argument('--excel', help="Excel文件路径")
+    parser.add_argument('--excel-streaming', action='store_true',
+                        help="逐行写入Excel，内存占用不随已有行数增长；超长字幕写入单独的文本文件")
+    parser.add_argument('--excel-max-rows', type=int, default=1048575,
+                        help="与--excel-streaming一起使用，每个工作表的数据行数上限")
+    parser.add_argument('--excel-rollover', choices=['sheet', 'file'], default='sheet',
+                        help="与--excel-streaming一起使用，超出行数后新建工作表或新建文件")
+    parser.add_argument('--no-audio', action='store_true', help="不提取音频")
+    parser.add_argument('--audio-only', action='store_true',
+                        help="只获取音频（优先下载单独的音频流，否则边下载边分离音频），不保存视频文件")
+    parser.add_argument('--urgent', action='append', metavar='LINK',
+                        help="优先处理的链接（可重复使用）；链接文件中以 ! 开头的行同样优先处理")
+    parser.add_argument('--item-budget', type=float, default=300,
+                        help="每个链接的处理时间预算（秒），超出后推迟到其余链接之后重试")
+    parser.add_argument('--batch-budget', type=float,
+                        help="整批的处理时间预算（秒），超出后取消剩余链接")
+    parser.add_argument('--author', action='append', metavar='SEC_USER_ID',
+                        help="采集作者的作品（可重复使用），默认只采集上次之后的新作品")
+    parser.add_argument('--listing-url', help="作者作品列表接口地址（可指向本地测试服务）")
+    parser.add_argument('--hashtag', action='append', metavar='CH_ID',
+                        help="采集话题下的作品（可重复使用），默认只采集上次之后的新作品")
+    parser.add_argument('--hashtag-url', help="话题作品列表接口地址（可指向本地测试服务）")
+    parser.add_argument('--full', action='store_true', help="与--author一起使用，重新遍历全部作品")
+    parser.add_argument('--watch', action='store_true',
+                        help="持续监视--author和--hashtag指定的来源，按各自的活跃程度调整轮询间隔，发现新作品时采集")
+    parser.add_argument('--watch-min-interval', type=float, default=300, help="监视时最短轮询间隔（秒）")
+    parser.add_argument('--watch-max-interval', type=float, default=6 * 3600, help="监视时最长轮询间隔（秒）")
+    parser.add_argument('--watch-initial-pages', type=int, default=1,
+                        help="监视新来源时第一次读取的页数，更早的作品不采集")
+    parser.add_argument('--cache-dir', help="开启视频页面缓存并指定缓存目录")
+    parser.add_argument('--cache-ttl', type=float, default=3600, help="页面缓存有效期（秒）")
+    parser.add_argument('--cache-max-mb', type=float, default=512, help="页面缓存容量上限（MB）")
+    parser.add_argument('--offline', action='store_true', help="与--cache-dir一起使用，只使用缓存，不访问网络")
+    parser.add_argument('--replay-cache', action='store_true',
+                        help="与--cache-dir一起使用，离线重新解析全部缓存页面，然后退出")
+    parser.add_argument('--refresh', metavar='EXCEL',
+                        help="只刷新已采集视频的互动数据（不重新下载视频），然后退出")
+    parser.add_argument('--db', help="本地数据库路径，默认与Excel文件同名")
+    parser.add_argument('--export', metavar='PATH',
+                        help="从本地数据库导出全部记录（.xlsx/.csv/.jsonl），然后退出")
+    parser.add_argument('--enrich', action='store_true',
+                        help="与--export一起使用，附加互动率等派生指标及按作者、标签的汇总")
+    parser.add_argument('--top', type=int, metavar='N',
+                        help="显示点赞数最高的N条记录，然后退出")
+    parser.add_argument('--search', metavar='PHRASE',
+                        help="在已采集视频的字幕中搜索短语，显示视频和时间点，然后退出")
+    parser.add_argument('--since-days', type=float,
+                        help="与--top一起使用，只统计最近若干天采集的记录")
+    parser.add_argument('--max-rate', type=float, metavar='MB_PER_SEC',
+                        help="所有下载和页面请求共用的总速率上限（MB/秒）")
+    parser.add_argument('--metadata-share', type=float, default=0.1,
+                        help="限速时为视频页面等元数据请求保留的带宽比例")
+    parser.add_argument('--workers', type=int, default=16,
+                        help="刷新互动数据时的并发数")
+    parser.add_argument('--parse-workers', type=int, metavar='N',
+                        help="解析大页面的子进程数，默认为CPU核心数，0表示在抓取线程中解析")
+    parser.add_argument('--log-json', action='store_true',
+                        help="日志文件使用JSON Lines格式（包含条目ID、阶段和耗时）")
+    parser.add_argument('--profile', choices=['sample', 'cprofile'],
+                        help="开启性能分析：sample 采样调用栈，cprofile 记录全部函数调用")
+    parser.add_argument('--profile-rate', type=float, default=1.0,
+                        help="被分析条目的比例（0到1）")
+    parser.add_argument('--profile-dir', default='profiles', help="性能分析结果目录")
+    parser.add_argument('--no-profile-memory', action='store_true',
+                        help="性能分析时不记录内存分配")
+    parser.add_argument('--log-rotation', choices=['size', 'daily'], default='size',
+                        help="日志轮转方式：按大小或按天")
+    return parser.parse_args(argv)
+
+def get_db_path(args, excel_path=None):
+    """确定本地数据库路径：优先使用--db，否则与Excel文件同名"""
+    if args.db:
+        return args.db
+    excel_path = excel_path or args.excel or os.path.join('downloads', 'video_data.xlsx')
+    return os.path.splitext(excel_path)[0] + '.db'
+
+def make_cache(args):
+    """根据命令行参数创建页面缓存，未开启时返回None"""
+    if not args.cache_dir:
+        return None
+    from core.http_cache import ResponseCache
+    return ResponseCache(args.cache_dir, ttl=args.cache_ttl, max_bytes=int(args.cache_max_mb * 1024 * 1024))
+
+def run_replay(args, logger):
+    """命令行模式：用当前解析代码离线重新解析全部缓存页面"""
+    from core.content_fetcher import ContentFetcher
+
+    cache = make_cache(args)
+    if not cache:
+        logger.error("--replay-cache requires --cache-dir")
+        return 1
+    fetcher = ContentFetcher()
+    fetcher.set_cache(cache, offline=True)
+    start = time.perf_counter()
+    parsed = 0
+    failed = 0
+    for url, result in fetcher.replay_cache():
+        if result and result.get('play_url'):
+            parsed += 1
+        else:
+            failed += 1
+            print(f"解析失败: {url}")
+    elapsed = time.perf_counter() - start
+    total = parsed + failed
+    print(f"重放完成: {parsed}/{total} 解析成功, 耗时 {elapsed:.2f} 秒"
+          f" ({total / elapsed if elapsed > 0 else 0:.0f} 页/秒)")
+    return 0 if failed == 0 else 1
+
+def run_refresh(args, logger):
+    """命令行模式：刷新Excel中已采集视频的互动数据"""
+    from core.content_fetcher import ContentFetcher
+    from core.metrics_refresher import MetricsRefresher
+    from core.record_store import RecordStore
+
+    excel_path = args.refresh
+    workers = args.workers
+    fetcher = ContentFetcher(pool_size=workers)
+    fetcher.set_cache(make_cache(args), offline=args.offline)
+    record_store = RecordStore(get_db_path(args, excel_path))
+    refresher = MetricsRefresher(fetcher, record_store=record_store, max_workers=workers)
+    summary = refresher.refresh(excel_path)
+    if not summary:
+        logger.error("Metrics refresh failed")
+        return 1
+    print(f"刷新完成: {summary['fetched']}/{summary['total']} 成功, "
+          f"{summary['changed_rows']} 行数据有变化, "
+          f"{summary['history_records']} 条时间序列记录")
+    return 0
+
+def run_query(args, logger):
+    """命令行模式：从本地数据库导出或查询"""
+    from core.record_store import RecordStore
+
+    record_store = RecordStore(get_db_path(args))
+    if args.search:
+        from core.transcript_index import TranscriptIndex, format_timestamp
+        results = TranscriptIndex(record_store).search(args.search)
+        for hit in results:
+            print(f"{hit['platform']}/{hit['video_id']} {format_timestamp(hit['start'])} "
+                  f"{(hit['title'] or '')[:30]}: {hit['text']}")
+        print(f"共找到 {len(results)} 处")
+        return 0
+    if args.export:
+        count = record_store.export(args.export, enrich=args.enrich)
+        if count is None:
+            return 1
+        print(f"已导出 {count} 条记录: {args.export}")
+        return 0
+
+    since = time.time() - args.since_days * 86400 if args.since_days else None
+    for rank, record in enumerate(record_store.top_n('likes', args.top, since=since), 1):
+        print(f"{rank:>4}. {record['likes']:>10} {record['platform']}/{record['video_id']} "
+              f"{record['author_name'] or ''} {(record['title'] or '')[:40]}")
+    return 0
+
+def run_download(args, logger):
+    """命令行模式：采集链接或作者作品，并在终端显示传输进度"""
+    from core.pipeline import VideoPipeline
+    from core.progress import ProgressReporter, format_progress
+
+    links = ['!' + link for link in args.urgent or []] + list(args.links)
+    if args.links_file:
+        with open(args.links_file, 'r', encoding='utf-8') as f:
+            links.extend(line.strip() for line in f if line.strip())
+    sources = [('author', author_id) for author_id in args.author or []]
+    sources += [('hashtag', hashtag_id) for hashtag_id in args.hashtag or []]
+    if not links and not sources:
+        logger.error("No links to process")
+        return 1
+
+    def on_progress(event):
+        if event['kind'] == 'batch':
+            sys.stderr.write(f"\r{format_progress(event)}\033[K")
+            sys.stderr.flush()
+
+    pipeline = VideoPipeline(log_callback=lambda message: print(f"\r{message}\033[K"))
+    if args.download_dir:
+        pipeline.downloader.download_dir = args.download_dir
+    if args.excel:
+        pipeline.set_excel_path(args.excel)
+    if args.excel_streaming:
+        pipeline.excel_exporter.set_streaming(True, args.excel_max_rows, args.excel_rollover)
+    if args.db:
+        pipeline.record_store.set_db_path(args.db)
+    if args.listing_url:
+        pipeline.author_crawler.listing_url = args.listing_url
+    if args.hashtag_url:
+        pipeline.author_crawler.hashtag_url = args.hashtag_url
+    pipeline.batch_scheduler.item_budget = args.item_budget
+    pipeline.batch_scheduler.batch_budget = args.batch_budget
+    pipeline.content_fetcher.set_cache(make_cache(args), offline=args.offline)
+    pipeline.downloader.set_progress_reporter(ProgressReporter(on_progress))
+    if args.audio_only:
+        pipeline.downloader.set_audio_only(True)
+    if args.profile:
+        from core.profiler import Profiler
+        pipeline.set_profiler(Profiler(args.profile_dir, mode=args.profile, sample_rate=args.profile_rate,
+                                       trace_memory=not args.no_profile_memory))
+
+    exit_code = 0
+    if links:
+        success_count = pipeline.process_links(links, extract_audio=not args.no_audio)
+        sys.stderr.write("\n")
+        print(f"处理完成: {success_count}/{len(links)} 成功")
+        if success_count != len(links):
+            exit_code = 1
+    if args.watch and sources:
+        return run_watch(pipeline, sources, args) or exit_code
+    for source_type, source_id in sources:
+        summary = pipeline.crawl_source(source_type, source_id, extract_audio=not args.no_audio,
+                                        incremental=not args.full)
+        if not summary['complete'] or summary['success'] != summary['found']:
+            exit_code = 1
+    return exit_code
+
+def run_watch(pipeline, sources, args):
+    """命令行模式：持续监视作者和话题，按Ctrl+C停止"""
+    from core.watcher import Watcher
+
+    def on_poll(source_type, source_id, summary, delay):
+        print(f"{source_type} {source_id}: 新作品 {summary['found']} 个, 成功 {summary['success']} 个, "
+              f"{delay / 60:.1f} 分钟后再次检查")
+
+    watcher = Watcher(pipeline, sources, min_interval=args.watch_min_interval,
+                      max_interval=args.watch_max_interval, initial_pages=args.watch_initial_pages,
+                      extract_audio=not args.no_audio, on_poll=on_poll)
+    print(f"开始监视 {len(sources)} 个来源，按Ctrl+C停止")
+    try:
+        totals = watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+        return 0
+    print(f"监视结束: 轮询 {totals['polls']} 次, 新作品 {totals['found']} 个")
+    return 0
+
+def main(argv=None):
+    args = parse_args(argv)
+
     # 设置日志
-    logger = setup_logger()
+    logger = setup_logger(json_records=args.log_json, rotation=args.log_rotation)
+
+    if args.max_rate:
+        from core.bandwidth import get_bandwidth_limiter
+        limiter = get_bandwidth_limiter()
+        limiter.metadata_share = args.metadata_share
+        limiter.set_rate(int(args.max_rate * 1024 * 1024))
+    if args.parse_workers is not None:
+        from core.parse_pool import get_parse_pool
+        get_parse_pool().set_workers(args.parse_workers)
+
+    if args.replay_cache:
+        return run_replay(args, logger)
+    if args.refresh:
+        return run_refresh(args, logger)
+    if args.export or args.top or args.search:
+        return run_query(args, logger)
+    if args.links or args.links_file or args.urgent or args.author or args.hashtag:
+        return run_download(args, logger)
+
+    import tkinter as tk
+    from gui.app import VideoDownloaderApp
+
     logger.info("Starting Video Crawler Application")
-    
+
     # 创建Tkinter根窗口
     root = tk.Tk()
     app = VideoDownloaderApp(root)
-    
+
     # 启动应用
     try:
         root.mainloop()
@@ -19,6 +286,7 @@ def main():
         logger.exception(f"Application crashed: {e}")
     finally:
         logger.info("Application closed")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
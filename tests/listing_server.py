@@ -0,0 +1,99 @@
+"""
+本地作品列表服务：按游标分页返回aweme_list，代替抖音的作者和话题作品列表接口
+
+作者接口使用sec_user_id和max_cursor参数，话题接口使用ch_id和cursor参数；游标即作品在列表中的位置。
+"""
+import json
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+
+def make_aweme(video_id, is_top=False):
+    return {
+        'aweme_id': str(video_id),
+        'desc': f"video {video_id}",
+        'is_top': int(is_top),
+        'statistics': {'digg_count': 1, 'comment_count': 0, 'collect_count': 0, 'share_count': 0},
+        'author': {'nickname': 'stand-in', 'unique_id': 'stand-in'},
+        'video': {'play_addr': {'url_list': [f"http://127.0.0.1/{video_id}.mp4"]}},
+    }
+
+
+class ListingHandler(BaseHTTPRequestHandler):
+    def __init__(self, server_state, *args, **kwargs):
+        self.state = server_state
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+        cursor = int(query.get('max_cursor', query.get('cursor', 0)))
+        count = int(query.get('count', 18))
+        self.state.record(parts.path, query, cursor)
+
+        video_ids = self.state.video_ids
+        items = [make_aweme(video_id) for video_id in video_ids[cursor:cursor + count]]
+        if cursor == 0:
+            # 置顶作品只出现在第一页最前面
+            items = [make_aweme(video_id, is_top=True) for video_id in self.state.top_ids] + items
+        next_cursor = cursor + count
+        body = json.dumps({
+            'aweme_list': items,
+            'has_more': int(next_cursor < len(video_ids)),
+            'max_cursor': next_cursor,
+            'cursor': next_cursor,
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ListingServer:
+    def __init__(self, video_ids, top_ids=()):
+        """
+        Args:
+            video_ids: 作品ID列表，从新到旧
+            top_ids: 置顶作品ID
+        """
+        self.video_ids = [str(video_id) for video_id in video_ids]
+        self.top_ids = [str(video_id) for video_id in top_ids]
+        self.requests = []
+        self.condition = threading.Condition()
+        self.server = None
+        self.thread = None
+
+    def record(self, path, query, cursor):
+        with self.condition:
+            self.requests.append({'path': path, 'query': query, 'cursor': cursor})
+            self.condition.notify_all()
+
+    def cursors(self):
+        with self.condition:
+            return [request['cursor'] for request in self.requests]
+
+    def wait_for_cursor(self, cursor, timeout=5):
+        """等待某一页被请求，返回是否在超时前请求到"""
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: any(request['cursor'] == cursor for request in self.requests), timeout)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), partial(ListingHandler, self))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
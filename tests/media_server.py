@@ -0,0 +1,86 @@
+"""
+本地媒体文件服务：模拟不同速度的CDN镜像
+
+每个服务只提供一个文件，可以设置返回响应头前的延迟、响应体的传输速率和错误状态码。
+"""
+import time
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    def __init__(self, media_server, *args, **kwargs):
+        self.media = media_server
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def respond(self, send_body):
+        media = self.media
+        with media.lock:
+            media.requests += 1
+        if media.header_delay:
+            time.sleep(media.header_delay)
+        if media.status != 200:
+            self.send_error(media.status)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(len(media.body)))
+        self.end_headers()
+        if not send_body:
+            return
+        view = memoryview(media.body)
+        block = 16 * 1024
+        try:
+            for offset in range(0, len(view), block):
+                self.wfile.write(view[offset:offset + block])
+                if media.rate:
+                    time.sleep(block / media.rate)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端选择了其他镜像后关闭连接
+            pass
+
+
+class MediaServer:
+    def __init__(self, body, header_delay=0.0, rate=None, status=200):
+        """
+        Args:
+            body: 文件内容
+            header_delay: 返回响应头前等待的秒数
+            rate: 响应体传输速率（字节/秒），None表示不限制
+            status: 响应状态码，非200时不返回内容
+        """
+        self.body = body
+        self.header_delay = header_delay
+        self.rate = rate
+        self.status = status
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}/video.mp4"
+
+    @property
+    def host(self):
+        return f"127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), partial(MediaHandler, self))
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
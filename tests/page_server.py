@@ -0,0 +1,79 @@
+"""
+本地视频页面服务：返回带RENDER_DATA脚本块的抖音视频页面，代替抖音的视频页
+
+页面带ETag，请求的If-None-Match与当前ETag相同时返回304；可以随时更换页面内容。
+"""
+import json
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import quote
+
+from core.page_parser import RENDER_DATA_START, SCRIPT_END
+
+
+def make_page(desc, likes=0):
+    render_data = {'app': {}, 'awemeDetail': {'detail': {
+        'desc': desc,
+        'statistics': {'digg_count': likes, 'comment_count': 0, 'collect_count': 0, 'share_count': 0},
+        'author': {'nickname': 'stand-in', 'unique_id': 'stand-in'},
+    }}}
+    return (b'<html><head><title>page</title></head><body>' + RENDER_DATA_START
+            + quote(json.dumps(render_data)).encode('ascii') + SCRIPT_END + b'</body></html>')
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def __init__(self, page_server, *args, **kwargs):
+        self.page = page_server
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        page = self.page
+        with page.lock:
+            page.requests.append({'path': self.path, 'if_none_match': self.headers.get('If-None-Match')})
+            body, etag = page.body, page.etag
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class PageServer:
+    def __init__(self, desc='video', likes=0):
+        self.lock = threading.Lock()
+        self.requests = []
+        self.version = 0
+        self.server = None
+        self.thread = None
+        self.set_page(desc, likes)
+
+    def set_page(self, desc, likes=0):
+        """更换页面内容，ETag随之变化"""
+        with self.lock:
+            self.version += 1
+            self.body = make_page(desc, likes)
+            self.etag = f'"v{self.version}"'
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}/video/1"
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), partial(PageHandler, self))
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from core.author_crawler import AuthorCrawler
+from core.content_fetcher import ContentFetcher
+from core.parse_pool import ParsePool
+from core.record_store import RecordStore
+from tests.listing_server import ListingServer
+
+PAGE_SIZE = 18
+
+
+def make_ids(first, count):
+    """从新到旧的作品ID"""
+    return [str(first - n) for n in range(count)]
+
+
+class AuthorCrawlerTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.record_store = RecordStore(os.path.join(self.temp_dir, 'records.db'))
+        self.fetcher = ContentFetcher(parse_pool=ParsePool(workers=0))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def make_crawler(self, server):
+        return AuthorCrawler(self.fetcher, self.record_store, listing_url=server.url + '/post/',
+                             page_size=PAGE_SIZE, hashtag_url=server.url + '/challenge/')
+
+    def test_full_crawl_follows_pagination(self):
+        ids = make_ids(7000, 45)
+        with ListingServer(ids) as server:
+            seen = []
+            summary = self.make_crawler(server).crawl('author-1', lambda info: seen.append(info['video_id']) or True)
+        self.assertEqual(seen, ids)
+        self.assertEqual(server.cursors(), [0, 18, 36])
+        self.assertEqual(summary, {'found': 45, 'success': 45, 'skipped': 0, 'complete': True, 'error': False})
+        self.assertEqual(self.record_store.get_high_water('author', 'author-1'), ids[0])
+
+    def test_next_page_is_prefetched_while_processing(self):
+        ids = make_ids(7000, 40)
+        with ListingServer(ids) as server:
+            prefetched = []
+
+            def process(info):
+                if info['video_id'] == ids[0]:
+                    # 处理第一页第一个作品时，第二页应已在后台请求
+                    prefetched.append(server.wait_for_cursor(PAGE_SIZE))
+                return True
+
+            self.make_crawler(server).crawl('author-1', process)
+        self.assertEqual(prefetched, [True])
+
+    def test_incremental_crawl_stops_at_known_video(self):
+        old_ids = make_ids(7000, 45)
+        with ListingServer(old_ids) as server:
+            self.make_crawler(server).crawl('author-1', lambda info: True)
+        new_ids = make_ids(7005, 5)
+        with ListingServer(new_ids + old_ids, top_ids=[old_ids[-1]]) as server:
+            seen = []
+            summary = self.make_crawler(server).crawl('author-1', lambda info: seen.append(info['video_id']) or True)
+        # 置顶的旧作品不作为停止依据；第一页已包含已知作品，不请求第二页
+        self.assertEqual(seen, [old_ids[-1]] + new_ids)
+        self.assertEqual(server.cursors(), [0])
+        self.assertTrue(summary['complete'])
+        self.assertEqual(self.record_store.get_high_water('author', 'author-1'), new_ids[0])
+
+    def test_failed_video_is_retried_on_next_crawl(self):
+        ids = make_ids(7000, 30)
+        failed = {ids[10]}
+        with ListingServer(ids) as server:
+            self.make_crawler(server).crawl('author-1', lambda info: info['video_id'] not in failed)
+            # 采集进度停在失败作品之前
+            self.assertEqual(self.record_store.get_high_water('author', 'author-1'), ids[11])
+            failed.clear()
+            seen = []
+            self.make_crawler(server).crawl('author-1', lambda info: seen.append(info['video_id']) or True)
+        self.assertEqual(seen, ids[:11])
+        self.assertEqual(self.record_store.get_high_water('author', 'author-1'), ids[0])
+
+    def test_retry_skips_videos_already_stored(self):
+        ids = make_ids(7000, 30)
+        failed = {ids[10]}
+        processed = []
+
+        def process(info):
+            # 与流水线相同：处理成功的作品写入record_store
+            processed.append(info['video_id'])
+            if info['video_id'] in failed:
+                return None
+            self.record_store.upsert_many([{'platform': info['platform'], 'video_id': info['video_id']}])
+            return True
+
+        with ListingServer(ids, top_ids=[ids[-1]]) as server:
+            self.make_crawler(server).crawl('author-1', process)
+            failed.clear()
+            processed.clear()
+            summary = self.make_crawler(server).crawl('author-1', process)
+            # 之前的作品只处理失败的一个，置顶作品也已保存
+            self.assertEqual(processed, [ids[10]])
+            self.assertEqual(summary, {'found': 1, 'success': 1, 'skipped': 11, 'complete': True, 'error': False})
+            self.assertEqual(self.record_store.get_high_water('author', 'author-1'), ids[0])
+
+            # 完整采集时重新处理全部作品
+            processed.clear()
+            self.make_crawler(server).crawl('author-1', process, incremental=False)
+        self.assertEqual(processed, [ids[-1]] + ids)
+
+    def test_hashtag_listing_uses_its_own_endpoint(self):
+        ids = make_ids(9000, 20)
+        with ListingServer(ids) as server:
+            summary = self.make_crawler(server).crawl('tag-1', lambda info: True, source_type='hashtag')
+        self.assertEqual(summary['found'], 20)
+        self.assertEqual({request['path'] for request in server.requests}, {'/challenge/'})
+        self.assertEqual(server.requests[0]['query']['ch_id'], 'tag-1')
+        self.assertEqual(self.record_store.get_high_water('hashtag', 'tag-1'), ids[0])
+        self.assertIsNone(self.record_store.get_high_water('author', 'tag-1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import time
+import threading
+import unittest
+
+from core.bandwidth import BandwidthLimiter
+
+RATE = 1024 * 1024
+CHUNK = 16 * 1024
+# 统计时间窗口；速率按窗口内通过的字节数计算，允许较宽的误差
+WINDOW = 1.5
+
+
+class BandwidthLimiterTest(unittest.TestCase):
+    def run_for(self, limiter, downloads, metadata=0, chunks=None):
+        """多个线程持续读取WINDOW秒，返回每个下载线程和元数据线程通过的字节数"""
+        stop = threading.Event()
+        chunks = chunks or [CHUNK] * downloads
+        passed = [0] * (downloads + metadata)
+
+        def download(index):
+            while not stop.is_set():
+                limiter.consume(chunks[index])
+                passed[index] += chunks[index]
+
+        def fetch_page(index):
+            while not stop.is_set():
+                limiter.consume_metadata(CHUNK)
+                passed[index] += CHUNK
+
+        threads = [threading.Thread(target=download, args=(i,)) for i in range(downloads)]
+        threads += [threading.Thread(target=fetch_page, args=(downloads + i,)) for i in range(metadata)]
+        for thread in threads:
+            thread.start()
+        time.sleep(WINDOW)
+        stop.set()
+        for thread in threads:
+            thread.join(5)
+        return passed[:downloads], passed[downloads:]
+
+    def assert_rate(self, total, limiter, threads):
+        # 令牌桶初始为空；上限加上桶容量和每个线程最后一次欠账
+        self.assertGreater(total, RATE * WINDOW * 0.7)
+        self.assertLess(total, RATE * WINDOW * 1.1 + limiter._capacity() + threads * 64 * 1024)
+
+    def test_total_rate_is_capped(self):
+        limiter = BandwidthLimiter(RATE)
+        downloads, _ = self.run_for(limiter, 4)
+        self.assert_rate(sum(downloads), limiter, 4)
+        self.assertEqual(limiter.get_stats()['bytes_total'], sum(downloads))
+
+    def test_downloads_share_evenly_with_different_chunk_sizes(self):
+        limiter = BandwidthLimiter(RATE)
+        (small, large), _ = self.run_for(limiter, 2, chunks=[8 * 1024, 64 * 1024])
+        self.assertGreater(small / large, 0.6)
+        self.assertLess(small / large, 1.6)
+
+    def test_metadata_share_is_not_starved_by_downloads(self):
+        limiter = BandwidthLimiter(RATE, metadata_share=0.1)
+        downloads, (metadata,) = self.run_for(limiter, 6, metadata=1)
+        # 元数据不排在下载后面，得到保留的份额
+        self.assertGreater(metadata, RATE * 0.1 * WINDOW * 0.6)
+        self.assertLess(metadata, RATE * 0.1 * WINDOW * 1.3 + limiter._capacity() * 0.1 + CHUNK)
+        # 元数据流量也计入总速率
+        self.assert_rate(sum(downloads) + metadata, limiter, 7)
+        self.assertEqual(limiter.get_stats()['bytes_metadata'], metadata)
+
+    def test_rate_change_applies_to_waiting_downloads(self):
+        limiter = BandwidthLimiter(64 * 1024)
+        limiter.consume(256 * 1024)
+        done = threading.Event()
+        threading.Thread(target=lambda: (limiter.consume(CHUNK), done.set()), daemon=True).start()
+        # 欠账需要数秒才能补足，取消限速后立即通过
+        self.assertFalse(done.wait(0.2))
+        limiter.set_rate(0)
+        self.assertTrue(done.wait(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import time
+import threading
+import unittest
+from contextlib import ExitStack
+
+from core.batch_scheduler import CancelToken, OperationCancelled
+from core.content_fetcher import ContentFetcher
+from core.link_parser import LinkParser
+from core.media_jobs import MediaJobScheduler
+from core.parse_pool import ParsePool
+from tests.media_server import MediaServer
+
+# 取消后应在这个时间内返回（各处网络超时为10秒）
+CANCEL_LATENCY = 1.0
+
+
+class CancellationTest(unittest.TestCase):
+    def setUp(self):
+        self.stack = ExitStack()
+
+    def tearDown(self):
+        self.stack.close()
+
+    def serve(self, **kwargs):
+        return self.stack.enter_context(MediaServer(os.urandom(1024 * 1024), **kwargs))
+
+    def assert_cancelled_quickly(self, func, delay=0.3):
+        token = CancelToken()
+        threading.Timer(delay, token.cancel, args=('stop',)).start()
+        start = time.monotonic()
+        with self.assertRaises(OperationCancelled):
+            func(token)
+        self.assertLess(time.monotonic() - start, delay + CANCEL_LATENCY)
+
+    def test_short_link_resolution(self):
+        server = self.serve(header_delay=5)
+        # 路径中包含t.cn，按短链接处理
+        link = server.url.replace('video.mp4', 't.cn/abc')
+        self.assert_cancelled_quickly(lambda token: LinkParser().parse_link(link, token))
+
+    def test_page_fetch_waiting_for_headers(self):
+        server = self.serve(header_delay=5)
+        fetcher = ContentFetcher(parse_pool=ParsePool(workers=0))
+        self.assert_cancelled_quickly(
+            lambda token: fetcher.fetch_video_info('douyin', '1', server.url, cancel_token=token))
+
+    def test_page_fetch_reading_body(self):
+        server = self.serve(rate=64 * 1024)
+        fetcher = ContentFetcher(parse_pool=ParsePool(workers=0))
+        self.assert_cancelled_quickly(
+            lambda token: fetcher.fetch_video_info('douyin', '1', server.url, cancel_token=token), delay=0.5)
+
+    def test_waiting_for_media_job_slot(self):
+        scheduler = MediaJobScheduler(max_slots=1)
+        scheduler._acquire_slot(0)
+        self.assert_cancelled_quickly(lambda token: scheduler._acquire_slot(0, token))
+        # 取消的任务离开队列，名额释放后后面的任务可以运行
+        acquired = threading.Event()
+        waiter = threading.Thread(target=lambda: (scheduler._acquire_slot(1), acquired.set()))
+        waiter.start()
+        scheduler._release_slot()
+        self.assertTrue(acquired.wait(CANCEL_LATENCY))
+        waiter.join()
+        self.assertEqual(scheduler.waiting, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
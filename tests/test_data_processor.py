@@ -0,0 +1,81 @@
+import unittest
+
+import pandas as pd
+
+from core.data_processor import DataProcessor
+
+
+def make_frame():
+    return pd.DataFrame([
+        {'author_id': 'a1', 'author_name': 'A1', 'likes': 100, 'comments': 10, 'favorites': 20, 'shares': 5,
+         'tags': 'x, y'},
+        {'author_id': 'a1', 'author_name': 'A1', 'likes': 0, 'comments': 4, 'favorites': 0, 'shares': 0,
+         'tags': 'x'},
+        {'author_id': 'a2', 'author_name': 'A2', 'likes': 50, 'comments': 0, 'favorites': 0, 'shares': 10,
+         'tags': ''},
+        # 没有作者ID的记录不进入作者汇总，但参与标签汇总；无法识别的计数按0处理
+        {'author_id': None, 'author_name': None, 'likes': 10, 'comments': 'n/a', 'favorites': None, 'shares': 0,
+         'tags': 'y'},
+    ])
+
+
+class EnrichTest(unittest.TestCase):
+    def setUp(self):
+        self.processor = DataProcessor()
+        self.enriched = self.processor.enrich(make_frame())
+
+    def column(self, name):
+        return self.enriched[name].tolist()
+
+    def test_derived_columns(self):
+        self.assertEqual(self.column('interactions'), [135, 4, 60, 10])
+        self.assertEqual(self.column('comments'), [10, 4, 0, 0])
+        self.assertEqual(self.column('comment_like_ratio'), [0.1, 0.0, 0.0, 0.0])
+        self.assertEqual(self.column('favorite_like_ratio'), [0.2, 0.0, 0.0, 0.0])
+        self.assertEqual(self.column('share_like_ratio'), [0.05, 0.0, 0.2, 0.0])
+        # 相对同一作者平均互动数（a1为69.5）的倍数
+        for actual, expected in zip(self.column('engagement_rate'), [135 / 69.5, 4 / 69.5, 1.0, 1.0]):
+            self.assertAlmostEqual(actual, expected)
+        self.assertEqual(self.column('author_likes_percentile'), [1.0, 0.5, 1.0, 1.0])
+        self.assertEqual(self.column('tag_count'), [2, 1, 0, 1])
+
+    def test_input_is_not_modified(self):
+        frame = make_frame()
+        self.processor.enrich(frame)
+        self.assertNotIn('interactions', frame)
+        self.assertEqual(frame['comments'].tolist(), [10, 4, 0, 'n/a'])
+
+    def test_author_aggregates(self):
+        authors = self.processor.author_aggregates(self.enriched)
+        self.assertEqual(authors['author_id'].tolist(), ['a1', 'a2'])
+        first = authors.iloc[0]
+        self.assertEqual(first['author_name'], 'A1')
+        self.assertEqual(first['video_count'], 2)
+        self.assertEqual(first['total_likes'], 100)
+        self.assertEqual(first['mean_likes'], 50)
+        self.assertEqual(first['median_likes'], 50)
+        self.assertAlmostEqual(first['p90_likes'], 90)
+        self.assertEqual(first['total_interactions'], 139)
+        self.assertEqual(first['mean_interactions'], 69.5)
+        self.assertAlmostEqual(first['mean_share_like_ratio'], 0.025)
+
+    def test_tag_aggregates(self):
+        tags = self.processor.tag_aggregates(self.enriched)
+        # 视频数相同时按点赞总数排序
+        self.assertEqual(tags['tag'].tolist(), ['y', 'x'])
+        y, x = tags.iloc[0], tags.iloc[1]
+        self.assertEqual((y['video_count'], y['author_count'], y['total_likes']), (2, 2, 110))
+        self.assertAlmostEqual(y['p90_likes'], 91)
+        self.assertEqual(y['mean_interactions'], 72.5)
+        self.assertEqual((x['video_count'], x['author_count'], x['total_likes']), (2, 1, 100))
+        self.assertEqual(x['median_likes'], 50)
+        self.assertAlmostEqual(x['mean_engagement_rate'], 1.0)
+
+    def test_empty_input(self):
+        enriched = self.processor.enrich(pd.DataFrame({'author_id': [], 'tags': []}))
+        self.assertEqual(len(self.processor.author_aggregates(enriched)), 0)
+        self.assertEqual(len(self.processor.tag_aggregates(enriched)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
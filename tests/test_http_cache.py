@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from requests.cookies import RequestsCookieJar
+
+from core.content_fetcher import ContentFetcher
+from core.http_cache import ResponseCache, normalize_url
+from core.parse_pool import ParsePool
+from tests.page_server import PageServer
+
+URL = 'https://www.douyin.com/video/1?b=2&a=1'
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = ResponseCache(os.path.join(self.temp_dir, 'cache'))
+
+    def tearDown(self):
+        self.cache.connection.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_key_normalization(self):
+        self.assertEqual(normalize_url('HTTPS://WWW.Douyin.com/video/1?b=2&a=1#comments'),
+                         'https://www.douyin.com/video/1?a=1&b=2')
+        self.assertEqual(normalize_url('https://www.douyin.com'), 'https://www.douyin.com/')
+        key = self.cache.make_key(URL)
+        self.assertEqual(self.cache.make_key('https://WWW.douyin.com/video/1?a=1&b=2#x'), key)
+        # 与登录身份无关的cookies不影响缓存键
+        self.assertEqual(self.cache.make_key(URL, {'ttwid': 'abc', 'sessionid': ''}), key)
+        logged_in = self.cache.make_key(URL, {'sessionid': 'one', 'ttwid': 'abc'})
+        self.assertNotEqual(logged_in, key)
+        self.assertNotEqual(self.cache.make_key(URL, {'sessionid': 'two'}), logged_in)
+
+        # 不同域名设置了同名cookie
+        jar = RequestsCookieJar()
+        jar.set('sessionid', 'one', domain='.douyin.com')
+        jar.set('sessionid', 'one', domain='www.douyin.com')
+        self.assertEqual(self.cache.make_key(URL, jar), logged_in)
+
+    def test_entries_are_kept_per_identity(self):
+        self.cache.put(URL, {'sessionid': 'one'}, b'logged in', 'utf-8', '"e1"', 'Mon, 01 Jan 2024 00:00:00 GMT')
+        self.assertIsNone(self.cache.get(URL))
+        cached = self.cache.get('https://www.douyin.com/video/1?a=1&b=2', {'sessionid': 'one'})
+        self.assertEqual(cached, {'body': b'logged in', 'encoding': 'utf-8', 'etag': '"e1"',
+                                  'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT', 'fresh': True})
+
+    def test_ttl_and_touch(self):
+        self.cache.put(URL, None, b'page')
+        self.assertTrue(self.cache.get(URL)['fresh'])
+        self.cache.ttl = 0
+        self.assertFalse(self.cache.get(URL)['fresh'])
+        # 过期的内容仍然可以读取，touch后重新开始计算有效期
+        self.cache.ttl = 60
+        self.cache.connection.execute("UPDATE entries SET stored_at = stored_at - 120")
+        self.assertFalse(self.cache.get(URL)['fresh'])
+        self.cache.touch(URL)
+        self.assertTrue(self.cache.get(URL)['fresh'])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        # 随机内容压缩后大小基本不变
+        self.cache.max_bytes = 2500
+        urls = [f'https://www.douyin.com/video/{i}' for i in range(3)]
+        self.cache.put(urls[0], None, os.urandom(1000))
+        self.cache.put(urls[1], None, os.urandom(1000))
+        self.assertIsNotNone(self.cache.get(urls[0]))
+        self.cache.put(urls[2], None, os.urandom(1000))
+        self.assertIsNone(self.cache.get(urls[1]))
+        self.assertIsNotNone(self.cache.get(urls[0]))
+        self.assertIsNotNone(self.cache.get(urls[2]))
+        self.assertLessEqual(self.cache.total_size(), 2500)
+        self.assertFalse(os.path.exists(self.cache._body_path(self.cache.make_key(urls[1]))))
+
+    def test_unreadable_entry_is_dropped(self):
+        self.cache.put(URL, None, b'page')
+        key = self.cache.make_key(URL)
+        with open(self.cache._body_path(key), 'wb') as f:
+            f.write(b'not zlib')
+        self.assertIsNone(self.cache.get(URL))
+        self.assertEqual(self.cache.total_size(), 0)
+
+
+class CachedFetchTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = ResponseCache(os.path.join(self.temp_dir, 'cache'))
+        self.fetcher = ContentFetcher(parse_pool=ParsePool(workers=0))
+        self.fetcher.set_cache(self.cache)
+        self.server = PageServer('first', likes=1).__enter__()
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        self.cache.connection.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def fetch(self, revalidate=False):
+        result = self.fetcher.fetch_douyin_video_info('1', self.server.url, revalidate)
+        return result['title'], result['stats']['likes']
+
+    def conditional_requests(self):
+        return [request['if_none_match'] for request in self.server.requests]
+
+    def test_fresh_page_is_served_from_cache(self):
+        self.assertEqual(self.fetch(), ('first', 1))
+        self.assertEqual(self.fetch(), ('first', 1))
+        self.assertEqual(self.conditional_requests(), [None])
+
+    def test_not_modified_page_is_parsed_from_cache_and_touched(self):
+        self.fetch()
+        self.cache.connection.execute("UPDATE entries SET stored_at = stored_at - 7200")
+        self.cache.connection.commit()
+        self.assertFalse(self.cache.get(self.server.url)['fresh'])
+
+        self.assertEqual(self.fetch(), ('first', 1))
+        self.assertEqual(self.conditional_requests(), [None, '"v1"'])
+        self.assertTrue(self.cache.get(self.server.url)['fresh'])
+        # 未过期但需要最新数据时也向服务器验证
+        self.assertEqual(self.fetch(revalidate=True), ('first', 1))
+        self.assertEqual(self.conditional_requests(), [None, '"v1"', '"v1"'])
+
+    def test_changed_page_replaces_the_cache(self):
+        self.fetch()
+        self.server.set_page('second', likes=5)
+        self.assertEqual(self.fetch(revalidate=True), ('second', 5))
+        self.assertEqual(self.cache.get(self.server.url)['etag'], '"v2"')
+        self.assertEqual(self.fetch(), ('second', 5))
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_offline_mode_uses_only_the_cache(self):
+        self.fetch()
+        self.cache.ttl = 0
+        self.fetcher.set_cache(self.cache, offline=True)
+        self.assertEqual(self.fetch(revalidate=True), ('first', 1))
+        self.assertIsNone(self.fetcher.fetch_douyin_video_info('2', self.server.url + '?other=1'))
+        self.assertEqual(len(self.server.requests), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
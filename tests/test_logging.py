@@ -0,0 +1,71 @@
+import sys
+import json
+import time
+import logging
+import unittest
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import utils.common
+from utils.common import JsonLineFormatter, NonBlockingQueueHandler, get_worker_log_queue, init_worker_logging
+
+
+class CollectingQueue(list):
+    def put_nowait(self, record):
+        self.append(record)
+
+
+class JsonLineFormatterTest(unittest.TestCase):
+    def make_exception_record(self):
+        logger = logging.getLogger('tests.logging')
+        try:
+            raise ValueError('bad page')
+        except ValueError:
+            return logger.makeRecord('tests.logging', logging.ERROR, __file__, 1, 'failed %s', ('item',),
+                                     sys.exc_info(), extra={'item_id': 'v1'})
+
+    def test_traceback_survives_the_queue(self):
+        # 与logger.exception经过NonBlockingQueueHandler后写入文件的过程相同
+        queue = CollectingQueue()
+        NonBlockingQueueHandler(queue).handle(self.make_exception_record())
+        payload = json.loads(JsonLineFormatter().format(queue[0]))
+        self.assertEqual(payload['message'], 'failed item')
+        self.assertEqual(payload['item_id'], 'v1')
+        self.assertIn('Traceback', payload['exc_text'])
+        self.assertIn('ValueError: bad page', payload['exc_text'])
+
+    def test_traceback_without_the_queue(self):
+        payload = json.loads(JsonLineFormatter().format(self.make_exception_record()))
+        self.assertIn('ValueError: bad page', payload['exc_text'])
+
+    def test_no_exception_field_for_plain_records(self):
+        record = logging.getLogger('tests.logging').makeRecord(
+            'tests.logging', logging.INFO, __file__, 1, 'done', (), None)
+        self.assertNotIn('exc_text', json.loads(JsonLineFormatter().format(record)))
+
+
+def log_in_worker():
+    """在子进程中记录一条日志，返回子进程的日志配置"""
+    logging.getLogger('tests.worker').warning('parsed in worker')
+    return {
+        'listener_started': utils.common._log_listener is not None,
+        'root_handlers': [type(handler).__name__ for handler in logging.getLogger().handlers]
+    }
+
+
+class WorkerLoggingTest(unittest.TestCase):
+    def test_worker_records_are_written_by_the_parent(self):
+        executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=init_worker_logging, initargs=(get_worker_log_queue(),))
+        with executor, self.assertLogs('tests.worker', level='WARNING') as logs:
+            config = executor.submit(log_in_worker).result(timeout=60)
+            deadline = time.monotonic() + 5
+            while not logs.records and time.monotonic() < deadline:
+                time.sleep(0.05)
+        # 子进程没有自己的后台线程和日志文件，只有通往主进程的队列
+        self.assertEqual(config, {'listener_started': False, 'root_handlers': ['NonBlockingQueueHandler']})
+        self.assertEqual([record.getMessage() for record in logs.records], ['parsed in worker'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from openpyxl import Workbook, load_workbook
+
+from core.excel_exporter import ExcelExporter, part_path
+from core.metrics_refresher import MetricsRefresher
+
+
+def make_record(index):
+    video_id = str(7000000000000000000 + index)
+    return {'title': f'video {index}', 'likes': index, 'comments': 0, 'favorites': 0, 'shares': 0,
+            'author_id': 'author', 'author_name': 'author', 'platform': 'douyin', 'video_id': video_id,
+            'source_url': f'https://www.douyin.com/video/{video_id}'}
+
+
+class StubFetcher:
+    """按视频ID返回固定计数，记录请求过的视频"""
+    def __init__(self):
+        self.requested = []
+
+    def fetch_video_info(self, platform, video_id, url, revalidate=False):
+        self.requested.append(video_id)
+        return {'stats': {'likes': 1000 + int(video_id[-3:]), 'comments': 1, 'favorites': 2, 'shares': 3}}
+
+
+class MetricsRefresherTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'video_data.xlsx')
+        self.fetcher = StubFetcher()
+        self.refresher = MetricsRefresher(self.fetcher, max_workers=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def likes(self, path):
+        workbook = load_workbook(path, read_only=True)
+        try:
+            values = {}
+            for sheet in workbook.worksheets:
+                rows = sheet.iter_rows(values_only=True)
+                header = list(next(rows))
+                for row in rows:
+                    values[row[header.index('video_id')]] = row[header.index('likes')]
+            return values
+        finally:
+            workbook.close()
+
+    def test_refreshes_every_rollover_file(self):
+        exporter = ExcelExporter(self.path, streaming=True, max_rows=4, rollover='file')
+        self.assertTrue(exporter.export_streaming([make_record(i) for i in range(10)]))
+        paths = [part_path(self.path, part) for part in (1, 2, 3)]
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+        summary = self.refresher.refresh(self.path)
+        self.assertEqual(summary['files'], 3)
+        self.assertEqual(summary['total'], 10)
+        self.assertEqual(summary['changed_rows'], 10)
+        self.assertEqual(len(self.fetcher.requested), 10)
+        for path in paths:
+            for video_id, likes in self.likes(path).items():
+                self.assertEqual(likes, 1000 + int(video_id[-3:]))
+
+    def test_reports_missing_columns_per_sheet(self):
+        workbook = Workbook()
+        workbook.active.title = 'notes'
+        workbook.active.append(['title', 'likes'])
+        other = workbook.create_sheet('videos')
+        other.append(['title', 'source_url', 'comments'])
+        workbook.save(self.path)
+
+        with self.assertLogs('utils.common', level='ERROR') as logs:
+            self.assertIsNone(self.refresher.refresh(self.path))
+        message = logs.output[0]
+        self.assertIn("'video_data.xlsx/notes': ['comments', 'favorites', 'shares', 'source_url']", message)
+        self.assertIn("'video_data.xlsx/videos': ['likes', 'favorites', 'shares']", message)
+
+
+if __name__ == '__main__':
+    unittest.main()
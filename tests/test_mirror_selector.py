@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import ExitStack
+
+from core.bandwidth import BandwidthLimiter
+from core.downloader import Downloader
+from tests.media_server import MediaServer
+
+BODY = os.urandom(1024 * 1024)
+
+
+class MirrorSelectionTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.downloader = Downloader(download_dir=self.temp_dir, bandwidth_limiter=BandwidthLimiter())
+        self.stack = ExitStack()
+
+    def tearDown(self):
+        self.stack.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def serve(self, **kwargs):
+        return self.stack.enter_context(MediaServer(BODY, **kwargs))
+
+    def download(self, servers, name='video.mp4'):
+        urls = [server.url for server in servers]
+        path = os.path.join(self.temp_dir, name)
+        result = self.downloader.download_file(urls[0], path, mirrors=urls)
+        if result:
+            with open(result, 'rb') as f:
+                self.assertEqual(f.read(), BODY)
+        return result
+
+    def stats(self, server):
+        return self.downloader.mirror_selector.get_stats().get(server.host)
+
+    def test_fast_body_beats_slow_body_with_quick_headers(self):
+        # 第一个镜像立即返回响应头但传输很慢，只比较响应头时它会胜出
+        slow = self.serve(rate=64 * 1024)
+        fast = self.serve(header_delay=0.05)
+        self.assertTrue(self.download([slow, fast]))
+        self.assertEqual(self.stats(fast)['wins'], 1)
+        self.assertEqual(self.stats(slow)['wins'], 0)
+
+    def test_ranking_persists_for_later_downloads(self):
+        slow = self.serve(header_delay=1.0)
+        fast = self.serve()
+        self.assertTrue(self.download([slow, fast], 'first.mp4'))
+        requests_before = slow.requests
+        # 之后的下载直接先请求较快的镜像，不再等待慢镜像
+        self.assertTrue(self.download([slow, fast], 'second.mp4'))
+        self.assertEqual(slow.requests, requests_before)
+        self.assertEqual(self.downloader.mirror_selector.rank([slow.url, fast.url])[0], fast.url)
+
+    def test_failing_mirror_is_skipped(self):
+        broken = self.serve(status=503)
+        fast = self.serve()
+        self.assertTrue(self.download([broken, fast]))
+        self.assertEqual(self.stats(broken)['requests'], 1)
+        self.assertGreater(self.stats(broken)['failure_rate'], 0)
+
+    def test_each_failure_is_recorded_once(self):
+        first = self.serve(status=503)
+        second = self.serve(status=404)
+        self.assertIsNone(self.download([first, second]))
+        self.assertEqual(self.stats(first)['requests'], 1)
+        self.assertEqual(self.stats(second)['requests'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from core.batch_scheduler import CancelToken
+from core.parse_pool import ParsePool
+
+
+class BusyPool(ParsePool):
+    """用被占满的线程池代替进程池，提交的解析一直排队到超时"""
+    def __init__(self, **kwargs):
+        super().__init__(workers=1, min_size=0, **kwargs)
+        self.release = threading.Event()
+        self.busy = ThreadPoolExecutor(max_workers=1)
+        self.busy.submit(self.release.wait, 10)
+
+    def _get_executor(self):
+        return self.busy
+
+
+class ParsePoolTimeoutTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = BusyPool(timeout=0.2)
+
+    def tearDown(self):
+        self.pool.release.set()
+        self.pool.busy.shutdown()
+
+    def test_timeout_returns_none(self):
+        self.assertIsNone(self.pool.parse(b'<html></html>', 'http://127.0.0.1/video/1'))
+        self.assertIsNone(self.pool.parse(b'<html></html>', 'http://127.0.0.1/video/2', cancel_token=CancelToken()))
+        self.assertEqual(self.pool.timed_out, 2)
+        self.assertEqual(self.pool.parsed_in_pool, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
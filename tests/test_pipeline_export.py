@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from core import pipeline as pipeline_module
+from core.pipeline import VideoPipeline
+
+
+class StubExporter:
+    """记录每次导出的条目数"""
+    excel_path = 'video_data.xlsx'
+
+    def __init__(self):
+        self.single = 0
+        self.batches = []
+
+    def export_single_item(self, data):
+        self.single += 1
+        return True
+
+    def export_batch(self, items):
+        self.batches.append(len(items))
+        return True
+
+
+class BufferedExportTest(unittest.TestCase):
+    def setUp(self):
+        # 各模块在当前目录下创建downloads等目录
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.mkdtemp()
+        os.chdir(self.temp_dir)
+        self.pipeline = VideoPipeline(log_callback=lambda message: None)
+        self.exporter = self.pipeline.excel_exporter = StubExporter()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_single_item_outside_a_batch_is_exported_immediately(self):
+        self.assertEqual(self.pipeline.export_item({'video_id': '1'}), (True, False))
+        self.assertEqual((self.exporter.single, self.exporter.batches), (1, []))
+
+    def test_batch_is_exported_in_chunks(self):
+        count = pipeline_module.EXPORT_FLUSH_ITEMS * 2 + 50
+        with self.pipeline.buffered_export():
+            with self.pipeline.buffered_export():
+                for i in range(count):
+                    self.pipeline.export_item({'video_id': str(i)})
+            # 内层范围结束时不写入
+            self.assertEqual(self.exporter.batches, [pipeline_module.EXPORT_FLUSH_ITEMS] * 2)
+        self.assertEqual(self.exporter.batches, [pipeline_module.EXPORT_FLUSH_ITEMS] * 2 + [50])
+        self.assertEqual(self.exporter.single, 0)
+
+    def test_buffer_is_flushed_when_the_batch_fails(self):
+        with self.assertRaises(RuntimeError):
+            with self.pipeline.buffered_export():
+                self.pipeline.export_item({'video_id': '1'})
+                raise RuntimeError('cancelled')
+        self.assertEqual(self.exporter.batches, [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from openpyxl import load_workbook
+
+from core.excel_exporter import EXCEL_MAX_CELL_CHARS
+from core.record_store import RecordStore
+
+SUMMARY_COLUMNS = ('video_count', 'total_likes', 'max_likes', 'total_comments', 'total_favorites', 'total_shares')
+
+
+def make_record(video_id, author_id, likes, comments=0):
+    return {'platform': 'douyin', 'video_id': video_id, 'author_id': author_id,
+            'author_name': f'name-{author_id}', 'likes': likes, 'comments': comments,
+            'favorites': 1, 'shares': 2}
+
+
+class AuthorSummaryTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'video_data.db')
+        self.store = RecordStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def expected(self):
+        # 与增量汇总对照：直接对全部记录分组汇总
+        rows = self.store.connection().execute(
+            "SELECT author_id, COUNT(*), SUM(likes), MAX(likes), SUM(comments), SUM(favorites), SUM(shares) "
+            "FROM videos WHERE author_id IS NOT NULL AND author_id != '' GROUP BY author_id")
+        return {row[0]: tuple(row)[1:] for row in rows}
+
+    def summary(self):
+        return {row['author_id']: tuple(row[column] for column in SUMMARY_COLUMNS)
+                for row in self.store.author_summary(limit=1000)}
+
+    def test_summary_follows_inserts_updates_and_deletes(self):
+        self.store.upsert_many([make_record(str(i), f'a{i % 3}', likes=i * 10, comments=i) for i in range(30)])
+        self.store.upsert_many([make_record('x', '', likes=999)])
+        self.assertEqual(self.summary(), self.expected())
+
+        # 点赞数减少时最大值重新计算
+        self.store.update_stats('douyin', '29', {'likes': 1})
+        # 重新写入已有视频，作者变化时从原作者移到新作者
+        self.store.upsert_many([make_record('28', 'a9', likes=5), make_record('27', 'a0', likes=7)])
+        connection = self.store.connection()
+        with connection:
+            connection.execute("DELETE FROM videos WHERE video_id = '26'")
+        self.assertEqual(self.summary(), self.expected())
+
+        summary = self.store.author_summary('a9')
+        self.assertEqual(len(summary), 1)
+        self.assertEqual(summary[0]['author_name'], 'name-a9')
+        self.assertEqual(summary[0]['avg_likes'], 5.0)
+
+    def test_orders(self):
+        self.store.upsert_many([make_record('1', 'many', likes=10), make_record('2', 'many', likes=10),
+                                make_record('3', 'many', likes=10), make_record('4', 'top', likes=50),
+                                make_record('5', 'top', likes=0), make_record('6', 'avg', likes=40)])
+        first = {order: self.store.author_summary(order_by=order, limit=1)[0]['author_id']
+                 for order in ('video_count', 'total_likes', 'avg_likes', 'max_likes')}
+        self.assertEqual(first, {'video_count': 'many', 'total_likes': 'top',
+                                 'avg_likes': 'avg', 'max_likes': 'top'})
+        with self.assertRaises(ValueError):
+            self.store.author_summary(order_by='likes')
+
+    def test_existing_database_is_summarised_on_open(self):
+        self.store.upsert_many([make_record(str(i), f'a{i % 4}', likes=i) for i in range(20)])
+        connection = self.store.connection()
+        with connection:
+            connection.execute("DROP TABLE author_stats")
+        self.store.close()
+
+        self.store = RecordStore(self.path)
+        self.assertEqual(self.summary(), self.expected())
+
+
+class EnrichedExportTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = RecordStore(os.path.join(self.temp_dir, 'video_data.db'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_xlsx_with_control_characters_and_long_transcripts(self):
+        records = [make_record(str(i), f'a{i % 2}', likes=i) for i in range(6)]
+        records[1]['transcript'] = 'bad\x01text'
+        records[2]['transcript'] = '长' * (EXCEL_MAX_CELL_CHARS + 100)
+        self.store.upsert_many(records)
+        path = os.path.join(self.temp_dir, 'export.xlsx')
+        self.assertEqual(self.store.export(path, enrich=True), 6)
+
+        workbook = load_workbook(path, read_only=True)
+        try:
+            sheets = {sheet.title: list(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets}
+        finally:
+            workbook.close()
+        self.assertEqual(list(sheets), ['videos', 'authors', 'tags'])
+        header = sheets['videos'][0]
+        transcripts = {row[header.index('video_id')]: row[header.index('transcript')] for row in sheets['videos'][1:]}
+        self.assertEqual(transcripts['1'], 'badtext')
+        # 超长文本写入单独文件，单元格中保留开头部分
+        self.assertLess(len(transcripts['2']), EXCEL_MAX_CELL_CHARS)
+        self.assertTrue(os.path.isdir(os.path.join(self.temp_dir, 'export_cells')))
+        self.assertIn('engagement_rate', header)
+        self.assertEqual(len(sheets['authors']), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import time
+import threading
+import unittest
+
+from core.batch_scheduler import CancelToken, OperationCancelled
+from core.single_flight import SingleFlight
+
+KEY = ('douyin', '1')
+WAITERS = 4
+
+
+class Leader:
+    """第一次调用时阻塞到release()，之后的调用立即返回"""
+    def __init__(self, result='done', error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.started = threading.Event()
+        self.released = threading.Event()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+            first = self.calls == 1
+        if first:
+            self.started.set()
+            self.released.wait(10)
+            if self.error:
+                raise self.error
+        return self.result
+
+
+class SingleFlightTest(unittest.TestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+
+    def run_concurrently(self, func, count=WAITERS + 1):
+        """第一个调用开始处理后再启动其余调用，等它们都在等待时放行，返回各调用的结果或异常"""
+        outcomes = [None] * count
+
+        def call(index):
+            try:
+                outcomes[index] = self.flight.do(KEY, func)
+            except BaseException as e:
+                outcomes[index] = e
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+        threads[0].start()
+        self.assertTrue(func.started.wait(5))
+        for thread in threads[1:]:
+            thread.start()
+        self.wait_for_waiters(count - 1)
+        func.released.set()
+        for thread in threads:
+            thread.join(10)
+        return outcomes
+
+    def wait_for_waiters(self, count):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with self.flight.lock:
+                call = self.flight.calls.get(KEY)
+                if call is not None and len(call.waiters) == count:
+                    return
+            time.sleep(0.01)
+        self.fail(f"expected {count} waiters")
+
+    def test_concurrent_calls_run_once_and_share_the_result(self):
+        leader = Leader()
+        outcomes = self.run_concurrently(leader)
+        self.assertEqual(leader.calls, 1)
+        self.assertEqual(outcomes[0], ('done', False))
+        self.assertEqual(outcomes[1:], [('done', True)] * WAITERS)
+        self.assertEqual(self.flight.get_stats(), {'in_flight': 0, 'completed': 0, 'coalesced': WAITERS})
+
+    def test_leader_exception_reaches_every_waiter(self):
+        error = ValueError('bad page')
+        leader = Leader(error=error)
+        outcomes = self.run_concurrently(leader)
+        self.assertEqual(leader.calls, 1)
+        self.assertTrue(all(outcome is error for outcome in outcomes))
+        # 异常不保留，之后的请求重新处理
+        self.assertEqual(self.flight.do(KEY, leader), ('done', False))
+
+    def test_failed_result_reaches_waiters_but_is_not_kept(self):
+        leader = Leader(result=None)
+        outcomes = self.run_concurrently(leader)
+        self.assertEqual(outcomes, [(None, False)] + [(None, True)] * WAITERS)
+        self.assertEqual(self.flight.do(KEY, leader), (None, False))
+        self.assertEqual(leader.calls, 2)
+
+    def test_leader_cancel_wakes_waiters_and_one_retries(self):
+        leader = Leader(error=OperationCancelled('timeout'))
+        # 在范围内重新处理的结果保留，被唤醒较晚的请求也能使用
+        with self.flight.scope():
+            outcomes = self.run_concurrently(leader)
+        self.assertIsInstance(outcomes[0], OperationCancelled)
+        # 所有等待的请求都被唤醒，一个重新处理，其余使用它的结果
+        self.assertEqual(leader.calls, 2)
+        self.assertEqual(sorted(outcomes[1:]), [('done', False)] + [('done', True)] * (WAITERS - 1))
+
+    def test_waiter_cancel_stops_waiting(self):
+        leader = Leader()
+        threading.Thread(target=lambda: self.flight.do(KEY, leader)).start()
+        self.assertTrue(leader.started.wait(5))
+        token = CancelToken()
+        threading.Timer(0.1, token.cancel, args=('stop',)).start()
+        try:
+            with self.assertRaises(OperationCancelled):
+                self.flight.do(KEY, leader, token)
+        finally:
+            leader.released.set()
+
+    def test_scope_keeps_results_until_it_ends(self):
+        leader = Leader()
+        leader.released.set()
+        with self.flight.scope():
+            self.assertEqual(self.flight.do(KEY, leader), ('done', False))
+            self.assertEqual(self.flight.do(KEY, leader), ('done', True))
+            self.assertEqual(self.flight.get_stats()['completed'], 1)
+        self.assertEqual(self.flight.get_stats()['completed'], 0)
+        self.assertEqual(self.flight.do(KEY, leader), ('done', False))
+        # 范围之外不保留结果
+        self.assertEqual(self.flight.do(KEY, leader), ('done', False))
+        self.assertEqual(leader.calls, 3)
+
+    def test_nested_scopes_clear_on_the_outermost_exit(self):
+        leader = Leader()
+        leader.released.set()
+        with self.flight.scope():
+            with self.flight.scope():
+                self.flight.do(KEY, leader)
+            self.assertEqual(self.flight.do(KEY, leader), ('done', True))
+        self.assertEqual(self.flight.calls, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from core.batch_scheduler import CancelToken, OperationCancelled
+from core.subtitle import SubtitleExtractor
+
+SRT = "1\n00:00:01,000 --> 00:00:02,000\n第一行\n第二行\n\n2\n00:00:03,000 --> 00:00:04,500\nhello\n"
+
+
+class StubScheduler:
+    """代替ffmpeg：向输出文件写入内容，返回指定的运行结果"""
+    def __init__(self, content=SRT, returncode=0, timed_out=False, error=None, cancel=None):
+        self.content = content
+        self.returncode = returncode
+        self.timed_out = timed_out
+        self.error = error
+        self.cancel = cancel
+
+    def run(self, cmd, priority=None, timeout=None, cancel_token=None):
+        if self.error:
+            raise self.error
+        with open(cmd[-1], 'w', encoding='utf-8') as f:
+            f.write(self.content)
+        if self.cancel:
+            self.cancel.cancel('stop')
+        return {'returncode': self.returncode, 'timed_out': self.timed_out, 'stdout': b'', 'stderr': b''}
+
+
+class EmbeddedSubtitleTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.video_path = os.path.join(self.temp_dir, 'video.mp4')
+        self.subtitle_path = os.path.join(self.temp_dir, 'video.srt')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def extract(self, scheduler, cancel_token=None):
+        extractor = SubtitleExtractor(media_scheduler=scheduler)
+        extractor.ffmpeg_available = True
+        return extractor.extract_embedded_subtitle(self.video_path, cancel_token)
+
+    def assert_no_files(self):
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    def test_successful_extraction(self):
+        self.assertEqual(self.extract(StubScheduler()), self.subtitle_path)
+        self.assertEqual(os.listdir(self.temp_dir), ['video.srt'])
+
+    def test_partial_file_after_timeout_is_discarded(self):
+        self.assertIsNone(self.extract(StubScheduler(content=SRT[:20], returncode=-9, timed_out=True)))
+        self.assert_no_files()
+
+    def test_partial_file_after_failure_is_discarded(self):
+        self.assertIsNone(self.extract(StubScheduler(content=SRT[:20], returncode=1)))
+        self.assert_no_files()
+
+    def test_cancel_while_running(self):
+        token = CancelToken()
+        with self.assertRaises(OperationCancelled):
+            self.extract(StubScheduler(returncode=-9, cancel=token), token)
+        self.assert_no_files()
+
+    def test_cancel_while_waiting_for_a_slot(self):
+        with self.assertRaises(OperationCancelled):
+            self.extract(StubScheduler(error=OperationCancelled('stop')))
+        self.assert_no_files()
+
+
+if __name__ == '__main__':
+    unittest.main()
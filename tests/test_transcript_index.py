@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from core.record_store import RecordStore
+from core.transcript_index import TranscriptIndex, tokenize
+
+
+def segments(*texts):
+    return [{'start': i * 2.5, 'end': i * 2.5 + 2, 'text': text} for i, text in enumerate(texts)]
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_chinese_bigrams_and_words(self):
+        self.assertEqual(tokenize('北京大学'), ['北京', '京大', '大学'])
+        self.assertEqual(tokenize('Hello, World 2024'), ['hello', 'world', '2024'])
+        # 单独的汉字作为一个词，中英文混排分别切分
+        self.assertEqual(tokenize('去 Python教程'), ['去', 'python', '教程'])
+        self.assertEqual(tokenize('，。！'), [])
+
+
+class TranscriptIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = RecordStore(os.path.join(self.temp_dir, 'video_data.db'))
+        self.index = TranscriptIndex(self.store)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def found(self, phrase):
+        return [(hit['video_id'], hit['start']) for hit in self.index.search(phrase)]
+
+    def check_term_counts(self):
+        # 词频表与倒排表一致
+        connection = self.store.connection()
+        expected = dict(connection.execute(
+            "SELECT term, COUNT(*) FROM transcript_postings GROUP BY term").fetchall())
+        self.assertEqual(dict(connection.execute("SELECT term, df FROM transcript_terms").fetchall()), expected)
+
+    def test_search_returns_segments_in_order(self):
+        self.store.upsert_many([{'platform': 'douyin', 'video_id': '2', 'title': '第二个'}])
+        self.assertEqual(self.index.add('douyin', 2, segments('今天去北京大学', '', '北京大学\n图书馆')), 3)
+        self.index.add('douyin', '1', segments('北京大学的校园'))
+        results = self.index.search('北京大学')
+        self.assertEqual([(hit['video_id'], hit['start']) for hit in results],
+                         [('1', 0.0), ('2', 0.0), ('2', 5.0)])
+        self.assertEqual(results[1]['title'], '第二个')
+        self.assertEqual(results[0]['title'], '')
+        self.assertEqual(results[2]['text'], '北京大学 图书馆')
+        self.assertEqual(results[2]['end'], 7.0)
+        self.assertEqual(len(self.index.search('北京大学', limit=2)), 2)
+        self.assertEqual(self.found('上海'), [])
+        self.assertEqual(self.found('  '), [])
+        self.check_term_counts()
+
+    def test_readding_a_video_replaces_its_segments(self):
+        self.index.add('douyin', '1', segments('第一版字幕', '北京大学'))
+        self.index.add('douyin', '2', segments('北京大学'))
+        self.index.add('douyin', '1', segments('第二版字幕'))
+        self.assertEqual(self.found('第一版'), [])
+        self.assertEqual(self.found('第二版'), [('1', 0.0)])
+        self.assertEqual(self.found('北京大学'), [('2', 0.0)])
+        self.check_term_counts()
+        connection = self.store.connection()
+        self.assertEqual(connection.execute("SELECT df FROM transcript_terms WHERE term = '字幕'").fetchone()[0], 1)
+        # 没有片段的词从词频表中删除
+        self.assertIsNone(connection.execute("SELECT df FROM transcript_terms WHERE term = '一版'").fetchone())
+
+        self.index.add('douyin', '1', [])
+        self.assertEqual(self.found('字幕'), [])
+        self.check_term_counts()
+
+    def test_single_character_scans_segments(self):
+        self.index.add('douyin', '1', segments('我去北京', '你好'))
+        self.index.add('kuaishou', '1', segments('去吧'))
+        self.assertEqual([(hit['platform'], hit['start']) for hit in self.index.search('去')],
+                         [('douyin', 0.0), ('kuaishou', 0.0)])
+        self.assertEqual(self.found('他'), [])
+
+    def test_phrase_must_appear_contiguously(self):
+        # 各个二元组都出现，但短语本身没有出现
+        self.index.add('douyin', '1', segments('北京 京大', '大学北京'))
+        self.index.add('douyin', '2', segments('Hello\nWorld', 'world hello'))
+        self.assertEqual(self.found('北京大'), [])
+        self.assertEqual(self.found('学北'), [('1', 2.5)])
+        # 忽略大小写和空白
+        self.assertEqual(self.found('HELLO world'), [('2', 0.0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
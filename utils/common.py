@@ -1,29 +1,167 @@
 import os
 import re
+import json
+import time
+import queue
+import atexit
 import logging
-from datetime import datetime
+import logging.handlers
+import multiprocessing
+from contextlib import contextmanager
+
+# 结构化日志记录中的附加字段
+STRUCTURED_FIELDS = ('item_id', 'stage', 'duration')
+
+# 日志后台写入线程，整个进程只有一个
+_log_listener = None
+# 子进程（解析进程池）的日志队列及转发线程，只在主进程中创建
+_worker_log_queue = None
+_worker_log_listener = None
+
+class JsonLineFormatter(logging.Formatter):
+    """将日志记录格式化为一行JSON，附带条目ID、阶段和耗时等字段"""
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        # 经过队列的记录中异常已转为exc_text（见NonBlockingQueueHandler.prepare）
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc_text'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """只在调用线程中合并消息参数和异常信息，格式化和写入都交给后台线程"""
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # 异常对象不能跨线程保留，先转为文本
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def _in_child_process():
+    """是否在multiprocessing启动的子进程中；spawn方式下导入发生在parent_process()可用之前，同时检查_inheriting"""
+    return (multiprocessing.parent_process() is not None
+            or getattr(multiprocessing.current_process(), '_inheriting', False))
 
 # 设置日志
-def setup_logger():
-    log_dir = "logs"
+def setup_logger(log_dir="logs", json_records=None, rotation=None,
+                 max_bytes=10 * 1024 * 1024, backup_count=10):
+    """
+    初始化日志：各线程只把记录放入队列，由后台线程写入文件和控制台
+    
+    第一次调用时完成初始化，之后不带参数的调用直接返回logger；
+    带参数调用时只替换后台线程使用的输出处理器。
+    
+    Args:
+        log_dir: 日志目录
+        json_records: 日志文件是否使用JSON Lines格式
+        rotation: 'size' 按大小轮转，'daily' 按天轮转
+        max_bytes: 按大小轮转时单个文件的最大字节数
+        backup_count: 保留的历史日志文件数
+    """
+    global _log_listener
+    module_logger = logging.getLogger(__name__)
+    if _log_listener is not None and json_records is None and rotation is None:
+        return module_logger
+    if _in_child_process():
+        # 子进程导入本模块时不打开日志文件：多个进程轮转同一个文件会丢失或重复记录，
+        # 子进程的日志由init_worker_logging交给主进程写入
+        return module_logger
+    
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
+    log_file = os.path.join(log_dir, "crawler.log")
     
-    log_file = os.path.join(log_dir, f"crawler_{datetime.now().strftime('%Y%m%d')}.log")
+    if rotation == 'daily':
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when='midnight', backupCount=backup_count, encoding='utf-8')
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    text_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    file_handler.setFormatter(JsonLineFormatter() if json_records else text_formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(text_formatter)
     
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
-    )
+    if _log_listener is not None:
+        # 重新配置：停止旧的后台线程（会先写完队列中剩余的记录）
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        log_queue = _log_listener.queue
+    else:
+        log_queue = queue.SimpleQueue()
+        root_logger = logging.getLogger()
+        root_logger.setLevel(logging.INFO)
+        root_logger.addHandler(NonBlockingQueueHandler(log_queue))
+        atexit.register(_stop_log_listener)
     
-    return logging.getLogger(__name__)
+    _log_listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler)
+    _log_listener.start()
+    return module_logger
+
+def _stop_log_listener():
+    """进程退出时写完队列中的日志"""
+    if _worker_log_listener is not None:
+        _worker_log_listener.stop()
+    if _log_listener is not None:
+        _log_listener.stop()
+
+class _ForwardHandler(logging.Handler):
+    """把子进程的日志记录交给主进程中同名的logger，与主进程的记录一起写入"""
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+def get_worker_log_queue():
+    """
+    获取子进程使用的日志队列（主进程中调用），用作进程池的initializer参数：
+    ProcessPoolExecutor(initializer=init_worker_logging, initargs=(get_worker_log_queue(),))
+    """
+    global _worker_log_queue, _worker_log_listener
+    if _worker_log_queue is None:
+        _worker_log_queue = multiprocessing.get_context('spawn').Queue()
+        _worker_log_listener = logging.handlers.QueueListener(_worker_log_queue, _ForwardHandler())
+        _worker_log_listener.start()
+    return _worker_log_queue
+
+def init_worker_logging(log_queue):
+    """子进程的initializer：日志只放入主进程的队列，不直接写文件"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_listener = None
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(NonBlockingQueueHandler(log_queue))
 
 logger = setup_logger()
 
+@contextmanager
+def log_stage(stage, item_id=None):
+    """记录一个处理阶段的耗时，结构化日志中包含item_id、stage和duration字段"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = round(time.perf_counter() - start, 4)
+        logger.info(f"Stage {stage} finished in {duration:.3f}s",
+                    extra={'item_id': item_id, 'stage': stage, 'duration': duration})
+
 # 创建保存目录
 def create_directory(directory):
     if not os.path.exists(directory):